@@ -7,6 +7,7 @@ Extracts product URLs from page listings and saves to database.
 
 import sys
 import os
+from functools import partial
 from pathlib import Path
 
 # Add parent directory to Python path for imports
@@ -15,8 +16,10 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from spider.utils.utils import Utils
 from spider.utils.optparse import SpiderOptions
 from spider.logger import get_logger
+from spider.engine import HtmlEngine
 from spider.models.page import Page
 from spider.models.product_url import ProductUrl
+from spider.downloader.pipeline import ParsePipeline, extract_product_urls
 
 # Load environment
 Utils.load_mongo(SpiderOptions['environment'])
@@ -62,7 +65,18 @@ def start_digg(page):
         page: Page model instance
     """
     digger = CurrentDigger(page)
-    for url in digger.product_list():
+    save_product_urls(page, {'product_urls': digger.product_list()})
+
+
+def save_product_urls(page, result):
+    """
+    Save dug product URLs and mark the page completed.
+
+    Args:
+        page: Page model instance
+        result: Dict with 'product_urls' from the digger
+    """
+    for url in result['product_urls']:
         product_url = ProductUrl(
             url=url,
             kind=SpiderOptions['name'],
@@ -73,6 +87,7 @@ def start_digg(page):
         # Check if saved successfully
         if product_url.id is not None:
             logger.info(f"Saved Product URL: {url}")
+            CurrentDownloader.metrics.written(product_url)
 
     # Mark page as completed
     page.completed = True
@@ -83,21 +98,31 @@ def start_digg(page):
         logger.info(f"Completed Page URL: {page.url}")
 
 
-# Get pages to process
-# Page.from_kind(kind).where(completed=false).limit(number)
 try:
-    pages = Page.from_kind(SpiderOptions['name']).filter(
-        completed=False
-    ).limit(SpiderOptions['number'])
+    CurrentDownloader.configure(SpiderOptions)
+    HtmlEngine.configure(SpiderOptions)
 
-    # Convert QuerySet to list for downloader
-    pages_list = list(pages)
+    # Get pages to process
+    # Page.from_kind(kind).where(completed=false).limit(number), skipping items waiting for a retry
+    # (-d replay selects every archived page instead)
+    pages = CurrentDownloader.select(Page.from_kind(SpiderOptions['name']), SpiderOptions['number'])
 
     # Run downloader with pages
-    downloader = CurrentDownloader(pages_list)
-    downloader.run(start_digg)
+    downloader = CurrentDownloader(pages)
+    if SpiderOptions.get('pipeline'):
+        # Dig in worker processes, save in this one
+        extract = partial(extract_product_urls, CurrentDigger)
+        with ParsePipeline(extract, save_product_urls, SpiderOptions.get('workers'), logger) as pipeline:
+            downloader.callback_workers = pipeline.workers
+            downloader.run(pipeline)
+    else:
+        downloader.run(start_digg)
 
     print(f"Digging completed for {spider_name}")
+    # Per-phase request timing percentiles of the run
+    timing_summary = CurrentDownloader.timings.summary()
+    if timing_summary:
+        print(timing_summary)
 
 except Exception as e:
     logger.error(f"Error during digging: {e}")
@@ -16,6 +16,7 @@ from spider.utils.utils import Utils
 from spider.utils.optparse import SpiderOptions
 from spider.logger import get_logger
 from spider.models.category import Category
+from spider.downloader import Downloader
 
 # Load environment
 Utils.load_mongo(SpiderOptions['environment'])
@@ -41,6 +42,7 @@ except (ImportError, AttributeError) as e:
     sys.exit(1)
 
 # Fetch and save categories
+Downloader.metrics.export(SpiderOptions.get('metrics_port'), SpiderOptions.get('metrics_file'))
 try:
     for category in ThisFetcher.category_list():
         # Create category with url, kind, and name
@@ -54,6 +56,7 @@ try:
         # Check if saved successfully (id is not None after save)
         if cat.id is not None:
             logger.info(f"Saved URL: {cat.url}")
+            Downloader.metrics.written(cat)
 
 except Exception as e:
     logger.error(f"Error during fetching: {e}")
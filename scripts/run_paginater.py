@@ -15,6 +15,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from spider.utils.utils import Utils
 from spider.utils.optparse import SpiderOptions
 from spider.logger import get_logger
+from spider.engine import HtmlEngine
 from spider.models.category import Category
 from spider.models.page import Page
 
@@ -73,6 +74,7 @@ def start_paginate(category):
         # Check if saved successfully
         if page.id is not None:
             logger.info(f"Saved Page URL: {url}")
+            CurrentDownloader.metrics.written(page)
 
     # Mark category as completed
     category.completed = True
@@ -88,14 +90,18 @@ def start_paginate(category):
 # In MongoEngine: Category.from_kind(kind) returns a queryset, then we need leaves
 # Note: Category.from_kind returns a QuerySet, leaves is a class method that needs to be chained
 try:
-    # Get all leaf categories (no children) of this kind that are not completed
+    CurrentDownloader.configure(SpiderOptions)
+    HtmlEngine.configure(SpiderOptions)
+
+    # Get all leaf categories (no children) of this kind
     all_categories = Category.from_kind(SpiderOptions['name'])
 
     # Filter for leaf nodes (categories with no children)
-    # We need to get leaf categories that are not completed
+    # We need to get leaf categories that are not completed and not waiting for a retry
+    # (-d replay selects every archived category instead)
     categories = []
     for cat in all_categories:
-        if cat.is_leaf and not cat.completed:
+        if cat.is_leaf and CurrentDownloader.selects(cat):
             categories.append(cat)
             if len(categories) >= SpiderOptions['number']:
                 break
@@ -105,6 +111,10 @@ try:
     downloader.run(start_paginate)
 
     print(f"Pagination completed for {spider_name}")
+    # Per-phase request timing percentiles of the run
+    timing_summary = CurrentDownloader.timings.summary()
+    if timing_summary:
+        print(timing_summary)
 
 except Exception as e:
     logger.error(f"Error during pagination: {e}")
@@ -7,6 +7,7 @@ Parses product pages and extracts product information, saving to database.
 
 import sys
 import os
+from functools import partial
 from pathlib import Path
 
 # Add parent directory to Python path for imports
@@ -15,9 +16,12 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from spider.utils.utils import Utils
 from spider.utils.optparse import SpiderOptions
 from spider.logger import get_logger
+from spider.engine import HtmlEngine
 from spider.models.category import Category
 from spider.models.product_url import ProductUrl
 from spider.models.product import Product
+from spider.parser import StreamingParse
+from spider.downloader.pipeline import ParsePipeline, extract_product
 
 # Load environment
 Utils.load_mongo(SpiderOptions['environment'])
@@ -69,24 +73,9 @@ def assoc_category(category_list, kind):
     """
     cate_list = []
     for name_and_url in category_list:
-        # Merge the dict with kind
-        category_data = {**name_and_url, 'kind': kind}
-
-        # Find or create category
         # In Ruby: Category.find_or_create_by(name_and_url.merge(:kind => kind))
-        # In Python/MongoEngine: Use get_or_create or similar pattern
-        existing = Category.objects(
-            url=category_data['url'],
-            kind=kind
-        ).first()
-
-        if existing:
-            cat = existing
-        else:
-            cat = Category(**category_data)
-            cat.save()
-
-        cate_list.append(cat)
+        fields = {key: value for key, value in name_and_url.items() if key != 'url'}
+        cate_list.append(Category.find_or_create(name_and_url['url'], kind, **fields))
 
     set_assoc(cate_list)
     return cate_list
@@ -118,44 +107,75 @@ def start_parse(product_url):
     """
     try:
         parser = CurrentParser(product_url)
+        save_product(product_url, {
+            'categories': parser.field('belongs_to_categories'),
+            'attributes': parser.attributes()
+        })
+    except Exception as e:
+        logger.error(f"Error parsing {product_url.url}: {e}")
+        # Don't mark as completed if parsing failed
 
-        # Associate categories from parser
-        assoc_category(parser.belongs_to_categories(), SpiderOptions['name'])
 
-        # Get product attributes from parser
-        product_attrs = parser.attributes()
+def save_product(product_url, result):
+    """
+    Save parsed product information and mark the product URL completed.
 
-        # Create product
-        product = Product(**product_attrs)
+    Args:
+        product_url: ProductUrl model instance
+        result: Dict with 'categories' and 'attributes' from the parser
+    """
+    try:
+        # Associate categories from parser
+        assoc_category(result['categories'], SpiderOptions['name'])
+
+        # Create product from parser attributes
+        product = Product(**result['attributes'])
         product.save()
 
         # Check if saved successfully (product.persisted? in Ruby)
         if product.id is not None:
             logger.info(f"Parsed Product URL: {product_url.url}")
+            CurrentDownloader.metrics.written(product, SpiderOptions['name'])
             # Mark product_url as completed
             product_url.completed = True
             product_url.save()
 
     except Exception as e:
         logger.error(f"Error parsing {product_url.url}: {e}")
-        # Don't mark as completed if parsing failed
+        # Don't mark as completed if saving failed
 
 
-# Get product URLs to process
-# ProductUrl.from_kind(kind).where(completed=false).limit(number)
 try:
-    product_urls = ProductUrl.from_kind(SpiderOptions['name']).filter(
-        completed=False
-    ).limit(SpiderOptions['number'])
+    CurrentDownloader.configure(SpiderOptions)
+    HtmlEngine.configure(SpiderOptions)
 
-    # Convert QuerySet to list for downloader
-    product_urls_list = list(product_urls)
+    # Get product URLs to process
+    # ProductUrl.from_kind(kind).where(completed=false).limit(number), skipping items waiting for a retry
+    # (-d replay selects every archived product URL instead)
+    product_urls = CurrentDownloader.select(ProductUrl.from_kind(SpiderOptions['name']), SpiderOptions['number'])
 
     # Run downloader with product URLs
-    downloader = CurrentDownloader(product_urls_list)
-    downloader.run(start_parse)
+    if SpiderOptions.get('stream') and not SpiderOptions.get('pipeline'):
+        # Parse pages as they download, stopping once every field is extracted with --stream-cancel
+        CurrentDownloader.streaming = StreamingParse.for_parser(CurrentParser)
+        CurrentDownloader.stream_cancel = SpiderOptions.get('stream_cancel', False)
+        if CurrentDownloader.streaming is None:
+            print(f"Streaming is off: {parser_class_name} does not parse with the lxml engine")
+    downloader = CurrentDownloader(product_urls)
+    if SpiderOptions.get('pipeline'):
+        # Parse in worker processes, save in this one
+        extract = partial(extract_product, CurrentParser)
+        with ParsePipeline(extract, save_product, SpiderOptions.get('workers'), logger) as pipeline:
+            downloader.callback_workers = pipeline.workers
+            downloader.run(pipeline)
+    else:
+        downloader.run(start_parse)
 
     print(f"Parsing completed for {spider_name}")
+    # Per-phase request timing percentiles of the run
+    timing_summary = CurrentDownloader.timings.summary()
+    if timing_summary:
+        print(timing_summary)
 
 except Exception as e:
     logger.error(f"Error during parsing: {e}")
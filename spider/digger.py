@@ -1,5 +1,5 @@
 # encoding: utf-8
-from bs4 import BeautifulSoup
+from spider.engine import HtmlEngine
 from spider.logger import LoggerMixin
 
 
@@ -9,15 +9,19 @@ class Digger(LoggerMixin):
     Subclasses must implement product_list() method.
     """
 
-    def __init__(self, page):
+    ENGINE = None           # HTML engine of the site (None = HtmlEngine.default)
+
+    def __init__(self, page, engine=None):
         """
         Initialize digger with a page object.
 
         Args:
-            page: Page object with 'url' and 'html' attributes
+            page: Page object with 'url' and 'html' (or 'raw_html' and
+                'encoding') attributes
+            engine: HTML engine name (default: the site's ENGINE)
         """
         self.url = page.url
-        self.doc = BeautifulSoup(page.html, 'lxml')
+        self.doc = HtmlEngine.parse(page, engine or self.ENGINE)
 
     def product_list(self):
         """
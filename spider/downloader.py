@@ -1,6 +1,16 @@
 # encoding: utf-8
+import asyncio
+import atexit
+import itertools
+import sqlite3
+import time
+import requests
+from urllib.parse import urlsplit
+from mongoengine.queryset import QuerySet
 from spider.encoding import Encoding
 from spider.logger import LoggerMixin
+from spider.downloader.metrics import Metrics
+from spider.downloader.timing import RequestTimer, Timings
 
 
 class Downloader(LoggerMixin):
@@ -9,6 +19,136 @@ class Downloader(LoggerMixin):
     Subclasses must implement run() method.
     """
 
+    # Per-site download settings, keyed by spider kind (like Encoding.Map)
+    #   host_concurrency: maximum in-flight requests against a single host
+    #   cache_max_age: seconds a cached page is served without revalidation
+    #   rate / max_rate: initial and highest requests per second (--rate-limit)
+    #   max_bytes: largest response body read before the download is aborted
+    SiteSettings = {
+        "dangdang": {"host_concurrency": 8, "cache_max_age": 3600, "rate": 10, "max_rate": 50, "max_bytes": 4194304},
+        "jingdong": {"host_concurrency": 4, "cache_max_age": 600, "rate": 4, "max_rate": 20, "max_bytes": 8388608},
+        "newegg": {"host_concurrency": 8, "cache_max_age": 3600, "rate": 10, "max_rate": 50, "max_bytes": 4194304},
+        "tmall": {"host_concurrency": 4, "cache_max_age": 600, "rate": 4, "max_rate": 20, "max_bytes": 8388608},
+        "suning": {"host_concurrency": 8, "cache_max_age": 3600, "rate": 10, "max_rate": 50, "max_bytes": 4194304},
+        "gome": {"host_concurrency": 8, "cache_max_age": 3600, "rate": 10, "max_rate": 50, "max_bytes": 4194304}
+    }
+
+    MAX_BYTES = 4194304     # max_bytes of sites without their own setting
+    CHUNK_SIZE = 65536      # Bytes read from a response body at a time
+    PEER_POLL = 0.1         # Seconds between cache checks while another run downloads a URL
+
+    # Run-wide settings, set from the command line via configure()
+    concurrency = None      # Download concurrency (None = downloader default)
+    callback_workers = 1    # Threads running callbacks (0 = inline)
+    callback_processes = False  # Run callbacks in a process pool instead of threads
+    response_cache = None   # ResponseCache shared by all downloaders (None = disabled)
+    page_archive = None     # PageArchive receiving every downloaded page (None = disabled)
+    rate_limiter = None     # RateLimiter pacing requests per host (None = unpaced)
+    retry_scheduler = None  # RetryScheduler recording failures on items (None = not recorded)
+    circuit_breakers = None  # CircuitBreakers failing fast for hosts that are down (None = off)
+    hedger = None           # Hedger sending duplicates of slow requests (None = off)
+    dns_cache = None        # DnsCache shared by all downloaders (None = system resolver)
+    prewarm = False         # Open connections to the first items' hosts before a batch
+    proxy_pool = None       # ProxyPool requests are routed through (None = direct)
+    timings = Timings()     # Phase histograms of every download (see Timings)
+    metrics = Metrics(timings)  # Counters and gauges of the run (see Metrics)
+    streaming = None        # Callable (item, headers) -> StreamingParse fed bodies as they arrive (None = off)
+    stream_cancel = False   # Stop reading a body once every field is extracted from it
+
+    @classmethod
+    def configure(cls, options):
+        """
+        Apply run-wide download settings from SpiderOptions.
+
+        Args:
+            options: Dict with optional 'concurrency', 'workers', 'executor',
+                'cache', 'archive', 'rate_limit', 'retries', 'breaker', 'hedge',
+                'dns_ttl', 'prewarm', 'proxies', 'metrics_port' and 'metrics_file' keys
+        """
+        if options.get('concurrency'):
+            cls.concurrency = options['concurrency']
+        if options.get('workers') is not None:
+            cls.callback_workers = options['workers']
+        if options.get('executor'):
+            cls.callback_processes = options['executor'] == 'process'
+        if options.get('cache'):
+            from spider.downloader.cache import ResponseCache
+            cls.response_cache = ResponseCache(options['cache'])
+        if options.get('archive'):
+            from spider.downloader.archive import PageArchive
+            cls.page_archive = PageArchive(options['archive'])
+            atexit.register(cls.page_archive.close)
+        if options.get('rate_limit'):
+            from spider.downloader.rate_limit import RateLimiter
+            cls.rate_limiter = RateLimiter(cls.SiteSettings)
+        if options.get('retries'):
+            from spider.downloader.retry import RetryScheduler
+            cls.retry_scheduler = RetryScheduler(options['retries'])
+        if options.get('breaker'):
+            from spider.downloader.circuit import CircuitBreakers
+            cls.circuit_breakers = CircuitBreakers(options['breaker'])
+        if options.get('hedge'):
+            from spider.downloader.hedging import Hedger
+            cls.hedger = Hedger(options['hedge'] / 100.0)
+        if options.get('dns_ttl'):
+            from spider.downloader.dns import DnsCache
+            from spider.downloader.session import SessionPool
+            cls.dns_cache = SessionPool.dns_cache = DnsCache(options['dns_ttl'])
+        if options.get('prewarm'):
+            cls.prewarm = True
+        if options.get('proxies'):
+            from spider.downloader.proxy import ProxyPool
+            cls.proxy_pool = ProxyPool.from_option(options['proxies'])
+        if options.get('metrics_port') or options.get('metrics_file'):
+            cls.metrics.export(options.get('metrics_port'), options.get('metrics_file'))
+
+    def callback_stage(self, callback):
+        """
+        Build the CallbackStage that runs callbacks for this downloader.
+
+        Args:
+            callback: Function to call for each successfully downloaded item
+
+        Returns:
+            CallbackStage configured from callback_workers/callback_processes
+        """
+        from spider.downloader.callback_stage import CallbackStage
+        stage = CallbackStage(callback, self.callback_workers, logger=self.logger,
+                              processes=self.callback_processes, timings=self.timings)
+        self.metrics.gauge('spider_queue_depth', stage.queue.qsize, queue='callback')
+        return stage
+
+    @classmethod
+    def select(cls, queryset, number=None):
+        """
+        Select the items of a stage to download.
+
+        Args:
+            queryset: QuerySet of the stage's Category/Page/ProductUrl documents
+            number: Maximum number of items (None = all)
+
+        Returns:
+            QuerySet of the items not completed, not dead-lettered and due for a
+            retry (downloaders read it as a cursor, see _iterate())
+        """
+        from spider.downloader.retry import RetryScheduler
+        queryset = queryset.filter(RetryScheduler.due(), completed=False)
+        return queryset.limit(number) if number else queryset
+
+    @classmethod
+    def selects(cls, item):
+        """
+        Check whether select() would pick an item, for stages filtering in Python.
+
+        Args:
+            item: Category, Page or ProductUrl
+
+        Returns:
+            bool: True if the item is not completed, not dead-lettered and due for a retry
+        """
+        from spider.downloader.retry import RetryScheduler
+        return not item.completed and RetryScheduler.is_due(item)
+
     def max_concurrency(self):
         """
         Maximum number of concurrent downloads.
@@ -16,7 +156,647 @@ class Downloader(LoggerMixin):
         Returns:
             int: Maximum concurrency level (default: 10)
         """
-        return 10
+        return self.concurrency or 10
+
+    def site_setting(self, kind, key, default=None):
+        """
+        Look up a per-site download setting.
+
+        Args:
+            kind: Spider kind of the item (e.g. 'tmall')
+            key: Setting name in SiteSettings
+            default: Value returned when the site does not define the setting
+
+        Returns:
+            The configured value or default
+        """
+        return self.SiteSettings.get(kind, {}).get(key, default)
+
+    def max_host_concurrency(self, kind):
+        """
+        Maximum number of concurrent downloads against a single host.
+
+        Args:
+            kind: Spider kind of the item
+
+        Returns:
+            int: Per-host concurrency, never above max_concurrency()
+        """
+        limit = self.max_concurrency()
+        return max(1, min(self.site_setting(kind, 'host_concurrency', limit), limit))
+
+    def body_limit(self, kind):
+        """
+        Build the limit applied to response bodies of a site.
+
+        Args:
+            kind: Spider kind of the item
+
+        Returns:
+            BodyLimit with the site's max_bytes
+        """
+        from spider.downloader.limits import BodyLimit
+        return BodyLimit(self.site_setting(kind, 'max_bytes', self.MAX_BYTES))
+
+    def _pace(self, item):
+        """
+        Clear a request with the circuit breaker and reserve a slot for the
+        item's host with the rate limiter.
+
+        Args:
+            item: Object with 'url' and 'kind' attributes
+
+        Returns:
+            float: Seconds to wait before sending the request (0 if unpaced)
+
+        Raises:
+            CircuitOpenError: If the host's circuit breaker is open
+        """
+        host = self.host_of(item.url)
+        if self.circuit_breakers is not None and not self.circuit_breakers.allow(host):
+            from spider.downloader.circuit import CircuitOpenError
+            raise CircuitOpenError(host)
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.reserve(host, item.kind)
+
+    def _choose_proxy(self, item):
+        """
+        Pick the proxy an item's request is sent through.
+
+        Args:
+            item: Object with 'url' attribute
+
+        Returns:
+            str: Proxy URL, or None to connect directly
+        """
+        if self.proxy_pool is None:
+            return None
+        return self.proxy_pool.choose(self.host_of(item.url))
+
+    @staticmethod
+    def _proxy_args(proxy):
+        """
+        Request arguments routing a requests call through a proxy.
+
+        Args:
+            proxy: Proxy URL or None
+
+        Returns:
+            dict: {'proxies': {...}} or {} for a direct request
+        """
+        return {'proxies': {'http': proxy, 'https': proxy}} if proxy is not None else {}
+
+    def _feedback(self, item, status=None, elapsed=None, proxy=None, hedge_elapsed=None):
+        """
+        Report the outcome of a request to the rate limiter, the circuit
+        breaker, the hedger's latency tracking and the proxy pool.
+
+        Args:
+            item: Object with 'url' attribute
+            status: HTTP status code, or None when the request or its body failed
+            elapsed: Seconds the request took
+            proxy: Proxy URL the request went through (None = direct)
+            hedge_elapsed: Seconds of the part of the request a hedge races
+                (default: elapsed)
+        """
+        if proxy is not None:
+            # Gateway errors, proxy auth failures and throttling count against the proxy
+            ok = status is not None and status < 500 and status not in (407, 429)
+            self.proxy_pool.feedback(proxy, self.host_of(item.url), ok, elapsed if ok else None)
+        if self.rate_limiter is not None:
+            self.rate_limiter.feedback(self.host_of(item.url), status, elapsed)
+        if self.circuit_breakers is not None:
+            self.circuit_breakers.feedback(self.host_of(item.url), status)
+        if hedge_elapsed is None:
+            hedge_elapsed = elapsed
+        if self.hedger is not None and status is not None and hedge_elapsed is not None:
+            self.hedger.record(self.host_of(item.url), hedge_elapsed)
+
+    def _get(self, session, item):
+        """
+        GET an item's URL with a requests session, through the response
+        cache, the circuit breaker and the rate limiter. The phases of the
+        request are recorded in timings.
+
+        Args:
+            session: requests.Session to download with
+            item: Object with 'url' and 'kind' attributes
+
+        Returns:
+            tuple: (status, body, headers, cached)
+        """
+        entry, cached = self._cache_lookup(item)
+        if cached:
+            return 200, entry.body, entry.headers, True
+        if not self._claim(item):
+            shared = self._await_peer(item)
+            if shared is not None:
+                return 200, shared.body, shared.headers, True
+
+        wait = self._pace(item)
+        if wait:
+            time.sleep(wait)
+        from spider.downloader.limits import ResponseRejected
+        proxy = self._choose_proxy(item)
+        request_args = dict(self._conditional(entry), **self._proxy_args(proxy))
+        started = time.monotonic()
+        with self.metrics.tracking('spider_requests_in_flight', site=item.kind), RequestTimer() as timer:
+            try:
+                response = self._send(session, item, request_args)
+                timer.headers_received()
+                body = self._read_body(item, response)
+                timer.body_received()
+            except requests.RequestException:
+                # Timeouts, refused connections and bodies broken off mid-transfer alike
+                self._feedback(item, proxy=proxy)
+                raise
+            except ResponseRejected:
+                self._feedback(item, response.status_code, time.monotonic() - started, proxy,
+                               timer.first_byte - timer.started)
+                raise
+        # A hedge only races the request up to its headers (the body is read afterwards)
+        self._feedback(item, response.status_code, time.monotonic() - started, proxy,
+                       timer.first_byte - timer.started)
+        self.timings.record_request(item, timer)
+        self._count_bytes(item, body)
+
+        status, body, cached = self._revalidated(entry, response.status_code, body)
+        return status, body, entry.headers if cached else response.headers, cached
+
+    def _read_body(self, item, response):
+        """
+        Stream a response body in, within the site's body limit, handing
+        it to the item's StreamingParse as it arrives.
+
+        The connection is released (or dropped, if the body was cut off)
+        before returning.
+
+        Args:
+            item: Object with 'kind' attribute
+            response: requests.Response sent with stream=True
+
+        Returns:
+            bytes: The body (empty for a 304 Not Modified, cut short once every
+                field is extracted with stream_cancel set)
+
+        Raises:
+            ResponseRejected: If the body is not HTML or over max_bytes
+        """
+        try:
+            if response.status_code == 304:
+                return b''
+            limit = self.body_limit(item.kind)
+            limit.check_headers(response.headers)
+            stream = self._stream(item, response.headers)
+            body = bytearray()
+            for chunk in response.iter_content(self.CHUNK_SIZE):
+                body += chunk
+                limit.check_size(len(body))
+                if stream is not None and stream.feed(chunk) and self.stream_cancel:
+                    stream.cancelled = True
+                    break
+            else:
+                if stream is not None:
+                    stream.close()
+            return bytes(body)
+        finally:
+            response.close()
+
+    def _stream(self, item, headers):
+        """
+        Start the StreamingParse of an item's body if streaming is on.
+
+        Args:
+            item: Object being downloaded
+            headers: Response headers
+
+        Returns:
+            StreamingParse (also set as item.stream), or None
+        """
+        if self.streaming is None:
+            return None
+        item.stream = self.streaming(item, headers)
+        return item.stream
+
+    def _cut_short(self, item):
+        """
+        Check whether an item's body was cut short by streaming.
+
+        Args:
+            item: Downloaded object
+
+        Returns:
+            bool: True if reading stopped once every field was extracted
+        """
+        stream = getattr(item, 'stream', None) if self.streaming is not None else None
+        return stream is not None and stream.cancelled
+
+    def _send(self, session, item, request_args):
+        """
+        Send the GET request for an item.
+
+        Args:
+            session: requests.Session to download with
+            item: Object with 'url' attribute
+            request_args: Extra request arguments (conditional headers, proxy)
+
+        Returns:
+            requests.Response with the body not yet read
+        """
+        return session.get(item.url, timeout=30, stream=True, **request_args)
+
+    def _count(self, item, outcome, **labels):
+        """
+        Count an item in the spider_items_<outcome>_total metric.
+
+        Args:
+            item: Object with 'kind' attribute
+            outcome: 'attempted', 'succeeded', 'failed' or 'skipped'
+            **labels: Extra labels ('reason' for failures and skips)
+        """
+        self.metrics.inc(f'spider_items_{outcome}_total', site=item.kind, stage=item.__class__.__name__, **labels)
+
+    def _count_bytes(self, item, body):
+        """
+        Count a response body read from the network.
+
+        Args:
+            item: Object with 'kind' attribute
+            body: Body bytes (None counts as empty)
+        """
+        if body:
+            self.metrics.inc('spider_bytes_downloaded_total', len(body), site=item.kind,
+                             stage=item.__class__.__name__)
+
+    def _succeeded(self, item, response):
+        """
+        Count a successful download.
+
+        Args:
+            item: Downloaded object
+            response: Its Response
+
+        Returns:
+            The response
+        """
+        self._count(item, 'succeeded')
+        return response
+
+    def _failed(self, item, failure):
+        """
+        Count a failed download and record it with the retry scheduler.
+
+        Args:
+            item: Object that failed to download
+            failure: Failure class (see RetryScheduler)
+        """
+        self._count(item, 'failed', reason=failure)
+        if self.retry_scheduler is None:
+            return
+        try:
+            self.retry_scheduler.record_failure(item, failure)
+        except Exception as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Retry Error: {e}")
+
+    def _cache_lookup(self, item):
+        """
+        Look up an item in the response cache.
+
+        Args:
+            item: Object with 'url' and 'kind' attributes
+
+        Returns:
+            tuple: (entry, fresh) where entry is the CacheEntry or None and
+                fresh is True if it may be served without a request
+        """
+        if self.response_cache is None:
+            return None, False
+        entry = self.response_cache.lookup(item.url)
+        if entry is None:
+            return None, False
+        return entry, entry.is_fresh(self.site_setting(item.kind, 'cache_max_age', 0))
+
+    def _claim(self, item):
+        """
+        Claim an item's URL in the response cache, so other runs sharing the
+        cache wait for this download instead of repeating it.
+
+        Args:
+            item: Object with 'url' attribute
+
+        Returns:
+            bool: True if this run should download the URL now
+        """
+        return self.response_cache is None or self.response_cache.claim(item.url)
+
+    def _poll_peer(self, item, since):
+        """
+        Check once on another run downloading an item's URL.
+
+        Args:
+            item: Object with 'url' attribute
+            since: time.time() when waiting began
+
+        Returns:
+            tuple: (entry, done) - the CacheEntry the other run stored since
+                waiting began, or None; done is True when waiting is over,
+                i.e. an entry arrived or this run took over the claim
+        """
+        entry = self.response_cache.lookup(item.url)
+        if entry is not None and entry.stored_at >= since:
+            return entry, True
+        return None, self.response_cache.claim(item.url)
+
+    def _await_peer(self, item):
+        """
+        Wait for another run's download of an item's URL.
+
+        Args:
+            item: Object with 'url' attribute
+
+        Returns:
+            CacheEntry: The page the other run stored, or None if this run
+                now holds the claim and has to download it
+
+        Raises:
+            ClaimHeld: If, after CLAIM_TTL, the claim is still held by another run
+        """
+        since = time.time()
+        deadline = time.monotonic() + self.response_cache.CLAIM_TTL
+        while time.monotonic() < deadline:
+            time.sleep(self.PEER_POLL)
+            entry, done = self._poll_peer(item, since)
+            if done:
+                return entry
+        return self._claim_after_wait(item)
+
+    def _claim_after_wait(self, item):
+        """
+        Take over the claim of an item's URL once CLAIM_TTL has passed
+        without the other run storing the page.
+
+        Args:
+            item: Object with 'url' attribute
+
+        Returns:
+            None: This run now holds the claim and has to download the URL
+
+        Raises:
+            ClaimHeld: If yet another run claimed the URL meanwhile
+        """
+        if self.response_cache.claim(item.url):
+            return None
+        from spider.downloader.cache import ClaimHeld
+        raise ClaimHeld(item.url)
+
+    def _release(self, item):
+        """
+        Release the claim on an item's URL once its download is over and
+        the page, if valid, is stored.
+
+        Args:
+            item: Object with 'url' attribute
+        """
+        if self.response_cache is not None:
+            self.response_cache.release(item.url)
+
+    def _fan_out(self, item, duplicates, response):
+        """
+        Hand the page downloaded for an item to the items with the same URL
+        that were coalesced into its download.
+
+        Args:
+            item: Downloaded object
+            duplicates: Objects with the same URL waiting for the download
+            response: Response of the download, or None if it failed
+
+        Returns:
+            list: (duplicate, response) tuples, empty if the download failed
+        """
+        if response is None:
+            for duplicate in duplicates:
+                self.logger.warning(f"{duplicate.__class__.__name__} {duplicate.kind} {duplicate.url} "
+                                    f"Coalesced download failed.")
+                self._count(duplicate, 'attempted')
+                self._count(duplicate, 'failed', reason='coalesced')
+            return []
+        raw_html = getattr(item, 'raw_html', None)
+        for duplicate in duplicates:
+            self._count(duplicate, 'attempted')
+            self._count(duplicate, 'succeeded')
+            if self.streaming is not None:
+                duplicate.stream = getattr(item, 'stream', None)
+            if isinstance(raw_html, bytes):
+                Encoding.set_utf8_html(duplicate, raw_html, encoding=item.encoding)
+            else:
+                duplicate.html = item.html
+        return [(duplicate, response) for duplicate in duplicates]
+
+    @staticmethod
+    def _conditional(entry):
+        """
+        Extra request arguments revalidating a cached entry.
+
+        Args:
+            entry: CacheEntry or None
+
+        Returns:
+            dict: {'headers': {...}} with the entry's validators, or {}
+        """
+        validators = entry.validators() if entry is not None else None
+        return {'headers': validators} if validators else {}
+
+    def _revalidated(self, entry, status, body):
+        """
+        Resolve a 304 Not Modified against the cached entry.
+
+        Args:
+            entry: CacheEntry the request was made for, or None
+            status: HTTP status code received
+            body: Response body received
+
+        Returns:
+            tuple: (status, body, cached) - the cached body with status 200
+                and cached=True on a 304, the inputs and False otherwise
+        """
+        if status == 304 and entry is not None:
+            self.response_cache.refresh(entry)
+            return 200, entry.body, True
+        return status, body, False
+
+    def _store_response(self, item, status, body, headers):
+        """
+        Keep a freshly downloaded, valid page in the response cache and the
+        page archive, if enabled.
+
+        Args:
+            item: Downloaded object with 'url' attribute
+            status: HTTP status code (only 200 responses are kept)
+            body: Raw response body (bytes)
+            headers: Response headers
+        """
+        if status != 200 or (self.response_cache is None and self.page_archive is None):
+            return
+        try:
+            if self.response_cache is not None:
+                self.response_cache.store(item.url, body, headers)
+            if self.page_archive is not None:
+                self.page_archive.append(item.url, body, encoding=getattr(item, 'encoding', None))
+        except (OSError, sqlite3.Error) as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Store Error: {e}")
+
+    def _prewarm(self, items, session=None):
+        """
+        Resolve the hosts of the first items of a batch and open pooled
+        connections to them before the batch starts.
+
+        Args:
+            items: Iterator of objects with 'url' and 'kind' attributes
+            session: requests.Session to open connections in (None = only
+                warm the DNS cache)
+
+        Returns:
+            Iterator over the same items (the first ones were peeked at)
+        """
+        if not self.prewarm:
+            return items
+        head = list(itertools.islice(items, self.max_concurrency()))
+        origins = {}
+        for item in head:
+            parts = urlsplit(item.url)
+            origins.setdefault(f"{parts.scheme}://{parts.netloc}/", item.kind)
+
+        for origin, kind in origins.items():
+            try:
+                if session is not None:
+                    from spider.downloader.session import SessionPool
+                    opened = SessionPool.prewarm(session, origin, self.max_host_concurrency(kind))
+                    self.logger.info(f"Prewarmed {opened} connections to {origin}")
+                elif self.dns_cache is not None:
+                    parts = urlsplit(origin)
+                    self.dns_cache.resolve(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+            except Exception as e:
+                self.logger.warning(f"Prewarm {origin} Error: {e}")
+        return itertools.chain(head, items)
+
+    def _iter_items(self):
+        """
+        Iterate lazily over the items to download.
+
+        Returns:
+            Iterator over self.items (empty if items is None)
+        """
+        return self._iterate(getattr(self, 'items', None))
+
+    @staticmethod
+    def _iterate(items):
+        """
+        Iterate over items exactly once.
+
+        A QuerySet is read as a cursor that keeps no documents (no_cache) and
+        does not time out while a slow batch is downloaded, so memory stays
+        flat however many items it selects. Since a QuerySet runs its query
+        again each time iter() is called on it, a cursor sliced into windows
+        or peeked at by _prewarm() would restart from its first item; the
+        generator resumes where the last read stopped.
+
+        Args:
+            items: Iterable of items (None = no items)
+
+        Yields:
+            The items, in order
+        """
+        if isinstance(items, QuerySet):
+            items = items.no_cache().timeout(False)
+        yield from (items if items is not None else [])
+
+    @staticmethod
+    def host_of(url):
+        """
+        Extract the host name from a URL.
+
+        Args:
+            url: URL string
+
+        Returns:
+            str: Lower-cased host name, or '' if the URL cannot be parsed
+        """
+        try:
+            return urlsplit(url).hostname or ''
+        except (TypeError, ValueError, AttributeError):
+            return ''
+
+    def iter_results(self, items=None):
+        """
+        Stream download results as they complete.
+
+        Items are pulled from the iterable only as download slots free up and
+        results are produced only as fast as the caller consumes them, so a
+        Mongo cursor can be streamed without materializing the batch.
+
+        Args:
+            items: Iterable of objects with 'url' attribute (default: self.items)
+
+        Returns:
+            Iterator of (item, Response) tuples for successful downloads
+        """
+        return self._results(self._iter_items() if items is None else self._iterate(items))
+
+    async def aiter_results(self, items=None):
+        """
+        Stream download results as they complete, for use with `async for`.
+
+        Thread-based downloaders run iter_results() in a helper thread, one
+        result at a time, so the event loop is never blocked.
+
+        Args:
+            items: Iterable or async iterable of items (default: self.items)
+
+        Yields:
+            (item, Response) tuples for successful downloads
+        """
+        loop = asyncio.get_running_loop()
+        if hasattr(items, '__aiter__'):
+            items = self._sync_items(items, loop)
+        results = self.iter_results(items)
+        done = object()
+        try:
+            while True:
+                result = await loop.run_in_executor(None, next, results, done)
+                if result is done:
+                    return
+                yield result
+        finally:
+            await loop.run_in_executor(None, results.close)
+
+    @staticmethod
+    def _sync_items(items, loop):
+        """
+        Iterate an async iterable from a helper thread.
+
+        Args:
+            items: Async iterable of items
+            loop: Running event loop that owns the async iterable
+
+        Yields:
+            Items, fetched one at a time on the event loop
+        """
+        iterator = items.__aiter__()
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(iterator.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+
+    def _results(self, items):
+        """
+        Download items and yield (item, Response) for each success.
+
+        Args:
+            items: Iterator of objects with 'url' attribute
+        """
+        raise NotImplementedError("Subclass must implement _results() method")
 
     def run(self, callback):
         """
@@ -13,5 +13,6 @@ Downloader = _module.Downloader
 from .normal_downloader import NormalDownloader
 from .em_downloader import EmDownloader
 from .ty_downloader import TyDownloader
+from .replay_downloader import ReplayDownloader
 
 del _module_path, _spec, _module
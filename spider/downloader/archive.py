@@ -0,0 +1,272 @@
+# encoding: utf-8
+"""
+Compressed, append-only archive of raw downloaded pages.
+"""
+import gzip
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # No flock on Windows: the single writer is not enforced there
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+
+class ArchiveLocked(OSError):
+    """
+    Raised when appending to an archive another process is writing to.
+    """
+
+
+class ArchiveRecord:
+    """
+    Location of one archived page.
+    """
+
+    def __init__(self, url, fetched_at, segment, offset, length, codec, encoding=None):
+        """
+        Initialize the record.
+
+        Args:
+            url: Page URL
+            fetched_at: Time the page was downloaded
+            segment: Number of the segment file holding the page
+            offset: Byte offset of the compressed page in the segment
+            length: Compressed length in bytes
+            codec: 'zstd' or 'gzip'
+            encoding: Charset the page was decoded with (None = unknown)
+        """
+        self.url = url
+        self.fetched_at = fetched_at
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.codec = codec
+        self.encoding = encoding
+
+
+class PageArchive:
+    """
+    Raw response bytes in append-only segment files, one compressed record
+    per page, with an SQLite index from (url, fetched_at) to the record.
+
+    Records are compressed independently (zstd when the zstandard package is
+    installed, gzip otherwise), so any page can be read back with one seek.
+    A segment is closed once it grows past segment_bytes and never written
+    again. Every download of a URL is kept; reads return the latest one,
+    along with the charset it was decoded with when downloaded.
+
+    An archive has a single writer: the first append takes an exclusive
+    lock on the directory (released when the process closes the archive or
+    exits), and appends from any other process raise ArchiveLocked. Any
+    number of processes may read.
+
+    Usage:
+        archive = PageArchive('tmp/archive')
+        archive.append(url, body, encoding='gb18030')
+        body = archive.read(url)
+    """
+
+    SEGMENT_BYTES = 256 * 1024 * 1024
+    COMMIT_EVERY = 100  # Index rows written before committing
+
+    def __init__(self, directory, codec=None, segment_bytes=None):
+        """
+        Initialize the archive, creating it if missing.
+
+        Args:
+            directory: Directory holding the segments and index
+            codec: 'zstd' or 'gzip' (default: zstd if available)
+            segment_bytes: Size after which a new segment is started
+        """
+        if codec is None:
+            codec = 'zstd' if zstandard is not None else 'gzip'
+        if codec == 'zstd' and zstandard is None:
+            raise ValueError("zstd archive codec requires the zstandard package")
+        self.directory = directory
+        self.codec = codec
+        self.segment_bytes = segment_bytes or self.SEGMENT_BYTES
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        self._writer = None     # Lock file held while this process writes
+        self._file = None       # Open segment, once writing
+        os.makedirs(directory, exist_ok=True)
+
+        self._index = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._index.execute(
+            "CREATE TABLE IF NOT EXISTS records (url TEXT, fetched_at REAL, segment INTEGER, "
+            "offset INTEGER, length INTEGER, codec TEXT, encoding TEXT)"
+        )
+        columns = [row[1] for row in self._index.execute("PRAGMA table_info(records)")]
+        if 'encoding' not in columns:
+            # Archive written before the charset was recorded
+            self._index.execute("ALTER TABLE records ADD COLUMN encoding TEXT")
+        self._index.execute("CREATE INDEX IF NOT EXISTS records_url ON records (url, fetched_at)")
+        self._index.commit()
+
+    def append(self, url, body, fetched_at=None, encoding=None):
+        """
+        Archive a downloaded page.
+
+        Args:
+            url: Page URL
+            body: Raw response body (bytes)
+            fetched_at: Download time (default: now)
+            encoding: Charset the page was decoded with
+
+        Returns:
+            ArchiveRecord for the stored page
+
+        Raises:
+            ArchiveLocked: If another process is writing to the archive
+        """
+        data = self._compress(body)
+        with self._lock:
+            if self._file is None:
+                self._open_writer()
+            if self._file.tell() and self._file.tell() + len(data) > self.segment_bytes:
+                self._file.close()
+                self._segment += 1
+                self._file = open(self._segment_path(self._segment), 'ab')
+            record = ArchiveRecord(url, fetched_at or time.time(), self._segment,
+                                   self._file.tell(), len(data), self.codec, encoding)
+            self._file.write(data)
+            self._file.flush()
+            self._index.execute(
+                "INSERT INTO records (url, fetched_at, segment, offset, length, codec, encoding) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (record.url, record.fetched_at, record.segment, record.offset, record.length, record.codec,
+                 record.encoding)
+            )
+            self._pending += 1
+            if self._pending >= self.COMMIT_EVERY:
+                self._index.commit()
+                self._pending = 0
+        return record
+
+    def lookup(self, url, before=None):
+        """
+        Find the latest archived record of a URL.
+
+        Args:
+            url: Page URL
+            before: Only consider downloads at or before this time
+
+        Returns:
+            ArchiveRecord, or None if the URL is not archived
+        """
+        query = "SELECT url, fetched_at, segment, offset, length, codec, encoding FROM records WHERE url = ?"
+        params = [url]
+        if before is not None:
+            query += " AND fetched_at <= ?"
+            params.append(before)
+        query += " ORDER BY fetched_at DESC LIMIT 1"
+        with self._lock:
+            row = self._index.execute(query, params).fetchone()
+        return ArchiveRecord(*row) if row else None
+
+    def read(self, url, before=None):
+        """
+        Read the latest archived body of a URL.
+
+        Args:
+            url: Page URL
+            before: Only consider downloads at or before this time
+
+        Returns:
+            bytes, or None if the URL is not archived
+        """
+        record = self.lookup(url, before)
+        return self.read_record(record) if record is not None else None
+
+    def read_record(self, record):
+        """
+        Read and decompress an archived page.
+
+        Args:
+            record: ArchiveRecord returned by lookup()
+
+        Returns:
+            bytes: Raw response body
+        """
+        with open(self._segment_path(record.segment), 'rb') as f:
+            f.seek(record.offset)
+            data = f.read(record.length)
+        if record.codec == 'zstd':
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def urls(self, batch=500):
+        """
+        List the archived URLs, each once.
+
+        Args:
+            batch: URLs read from the index at a time
+
+        Yields:
+            list of up to batch URLs
+        """
+        last = ''
+        while True:
+            # Resume after the last URL read, along the (url, fetched_at) index
+            with self._lock:
+                rows = self._index.execute(
+                    "SELECT DISTINCT url FROM records WHERE url > ? ORDER BY url LIMIT ?", (last, batch)
+                ).fetchall()
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+            last = rows[-1][0]
+
+    def __len__(self):
+        with self._lock:
+            return self._index.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        """Commit the index, close the open segment and release the writer lock (safe to call twice)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._index.commit()
+            self._index.close()
+            if self._file is not None:
+                self._file.close()
+                self._writer.close()
+
+    def _open_writer(self):
+        """
+        Take the writer lock and open the last segment for appending.
+
+        Raises:
+            ArchiveLocked: If another process holds the lock
+        """
+        writer = open(os.path.join(self.directory, 'writer.lock'), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(writer, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                writer.close()
+                raise ArchiveLocked(f"{self.directory} is being written by another process")
+        self._writer = writer
+        # Segments only grow under the lock, so the last one is looked up once it is held
+        segments = [int(name[len('segment-'):-len('.arc')]) for name in os.listdir(self.directory)
+                    if name.startswith('segment-') and name.endswith('.arc')]
+        self._segment = max(segments, default=1)
+        self._file = open(self._segment_path(self._segment), 'ab')
+
+    def _compress(self, body):
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor().compress(body)
+        return gzip.compress(body, compresslevel=6)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:05d}.arc")
@@ -0,0 +1,252 @@
+# encoding: utf-8
+"""
+On-disk HTTP response cache shared by all downloaders.
+"""
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+
+class ClaimHeld(Exception):
+    """Raised when another run still holds the claim of a URL after waiting CLAIM_TTL for it"""
+
+
+class CacheEntry:
+    """
+    A cached response body together with its validators.
+    """
+
+    # Response headers kept alongside the body
+    HEADERS = ('ETag', 'Last-Modified', 'Content-Type')
+
+    def __init__(self, url, body, headers, stored_at):
+        """
+        Initialize the entry.
+
+        Args:
+            url: Cached URL
+            body: Raw response body (bytes)
+            headers: Dict of the headers listed in HEADERS
+            stored_at: Time the entry was last downloaded or revalidated
+        """
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.stored_at = stored_at
+
+    def is_fresh(self, max_age):
+        """
+        Check whether the entry may be served without asking the server.
+
+        Args:
+            max_age: Maximum age in seconds (0 = always revalidate)
+
+        Returns:
+            bool: True if the entry is younger than max_age
+        """
+        return bool(max_age) and time.time() - self.stored_at < max_age
+
+    def validators(self):
+        """
+        Conditional request headers for revalidating the entry.
+
+        Returns:
+            dict: If-None-Match / If-Modified-Since headers (may be empty)
+        """
+        headers = {}
+        if self.headers.get('ETag'):
+            headers['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+
+class ResponseCache:
+    """
+    Response bodies and validators stored on disk, keyed by URL.
+
+    Each URL maps to a SHA-1 named `<key>.entry` file: a JSON line with the
+    URL, headers and store time, followed by the raw bytes. The file is
+    written through a temporary file and renamed, so concurrent downloader
+    threads and runs never see a half-written entry, nor the headers of one
+    download with the body of another.
+
+    A URL being downloaded is claimed with a `<key>.lock` file holding the
+    host and pid of the claiming run, so runs of the same stage sharing the
+    cache directory wait for each other's download instead of fetching the
+    page twice. release() only removes claims of this process; the claim of
+    a run that died is taken over at once when the run was on this host,
+    and after CLAIM_TTL seconds otherwise.
+
+    Usage:
+        cache = ResponseCache('tmp/cache')
+        entry = cache.lookup(url)
+        cache.store(url, body, response.headers)
+    """
+
+    CLAIM_TTL = 60          # Seconds after which the claim of a crashed run is taken over
+
+    def __init__(self, directory):
+        """
+        Initialize the cache.
+
+        Args:
+            directory: Directory holding the cache files (created if missing)
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._claims = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, url):
+        """
+        Find the cached entry for a URL.
+
+        Args:
+            url: URL string
+
+        Returns:
+            CacheEntry, or None if the URL is not cached
+        """
+        try:
+            with open(self._path(url) + '.entry', 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if not isinstance(meta, dict) or meta.get('url') != url:
+            return None
+        return CacheEntry(url, body, meta.get('headers', {}), meta.get('stored_at', 0))
+
+    def store(self, url, body, headers=None):
+        """
+        Store a downloaded response.
+
+        Args:
+            url: URL string
+            body: Raw response body (bytes)
+            headers: Response headers (case-insensitive mapping or dict)
+
+        Returns:
+            CacheEntry that was stored
+        """
+        kept = {}
+        for name in CacheEntry.HEADERS:
+            value = headers.get(name) if headers is not None else None
+            if isinstance(value, str):
+                kept[name] = value
+        entry = CacheEntry(url, body, kept, time.time())
+        self._write_entry(entry)
+        return entry
+
+    def refresh(self, entry):
+        """
+        Mark an entry as just revalidated (after a 304 Not Modified).
+
+        Args:
+            entry: CacheEntry returned by lookup()
+        """
+        entry.stored_at = time.time()
+        self._write_entry(entry)
+
+    def claim(self, url):
+        """
+        Claim a URL for download.
+
+        Args:
+            url: URL string
+
+        Returns:
+            bool: True if this process now holds the claim, False if another
+                run (or thread) is downloading the URL
+        """
+        path = self._path(url) + '.lock'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if not self._abandoned(path):
+                        return False
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(f"{socket.gethostname()} {os.getpid()}")
+            with self._lock:
+                self._claims.add(url)
+            return True
+        return False
+
+    def release(self, url):
+        """
+        Release a URL claimed by this process (a no-op otherwise: the
+        claims of other runs are left to expire, see claim()).
+
+        Args:
+            url: URL string
+        """
+        with self._lock:
+            if url not in self._claims:
+                return
+            self._claims.discard(url)
+        try:
+            os.unlink(self._path(url) + '.lock')
+        except FileNotFoundError:
+            pass
+
+    def _abandoned(self, path):
+        """
+        Check whether a claim's run is gone.
+
+        Args:
+            path: Path of the .lock file
+
+        Returns:
+            bool: True if the claim is older than CLAIM_TTL, or was made by
+                a process of this host that is no longer running
+        """
+        if time.time() - os.path.getmtime(path) >= self.CLAIM_TTL:
+            return True
+        try:
+            with open(path, encoding='utf-8') as f:
+                host, pid = f.read().split()
+            pid = int(pid)
+        except (OSError, ValueError):
+            return False    # Still being written, or not ours to judge
+        if os.name != 'posix' or host != socket.gethostname() or pid == os.getpid():
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass            # Running under another user
+        return False
+
+    def _write_entry(self, entry):
+        meta = {'url': entry.url, 'headers': entry.headers, 'stored_at': entry.stored_at}
+        self._write(self._path(entry.url) + '.entry', json.dumps(meta).encode('utf-8') + b'\n' + entry.body)
+
+    def _path(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key)
+
+    @staticmethod
+    def _write(path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -0,0 +1,195 @@
+# encoding: utf-8
+"""
+Callback stage that runs download callbacks on its own worker pool.
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from mongoengine import connect, disconnect_all
+from spider.encoding import Encoding
+from spider.utils.utils import Utils
+from spider.downloader.pipeline import PageSnapshot
+
+
+def _init_process(mongo_settings):
+    """
+    Open the MongoDB connection of a callback worker process.
+
+    pymongo clients are not fork-safe, so the client a forked worker
+    inherits from the stage's process is dropped and a new one opened.
+
+    Args:
+        mongo_settings: connect() arguments of the stage's process (None = not connected)
+    """
+    disconnect_all()
+    if mongo_settings is not None:
+        connect(**mongo_settings)
+
+
+def _call_in_process(callback, item, snapshot):
+    """
+    Run a callback in a worker process on an item sent from the stage.
+
+    A mongoengine Document pickles only its fields, so the downloaded page
+    (html, raw_html, encoding) travels in a PageSnapshot and is set back
+    on the item here.
+
+    Args:
+        callback: Function called with the item
+        item: Downloaded item, as unpickled in the worker
+        snapshot: PageSnapshot of the item's page (None if it has none)
+    """
+    if snapshot is not None:
+        Encoding.set_utf8_html(item, snapshot.raw_html, encoding=snapshot.encoding)
+    callback(item)
+
+
+class CallbackStage:
+    """
+    Runs callbacks (parse + save) on a pool of worker threads fed through a
+    bounded handoff queue, so processing concurrency is tuned independently
+    from download concurrency.
+
+    put() blocks while the queue is full, which pushes back on the
+    downloader instead of buffering an unbounded number of pages; async
+    downloaders use put_async() so the event loop keeps running meanwhile.
+    With workers=0 callbacks run inline in the calling thread.
+
+    With processes=True each worker thread hands its item to a process pool
+    of the same size, so CPU-bound callbacks scale past the GIL. Callback and
+    item must then be picklable; the page itself is sent along as a
+    PageSnapshot, since models do not pickle their html. Changes the
+    callback makes to the item stay in the worker process (persist them
+    from the callback itself). Each worker process opens its own MongoDB
+    connection with the settings of Utils.load_mongo() (or mongo_settings).
+
+    With timings (a Timings registry) the time of each callback is
+    recorded as the item's 'callback' phase.
+
+    Usage:
+        with CallbackStage(callback, workers=4, logger=logger) as stage:
+            stage.put(item)
+    """
+
+    _STOP = object()
+
+    def __init__(self, callback, workers=1, queue_size=None, logger=None, processes=False, timings=None,
+                 mongo_settings=None):
+        """
+        Initialize the stage.
+
+        Args:
+            callback: Function called with each downloaded item
+            workers: Number of callback worker threads (0 = run inline)
+            queue_size: Maximum items waiting for a worker (default: 2 * workers)
+            logger: Logger used to report callback errors
+            processes: Run callbacks in a process pool instead of threads
+            timings: Timings recording callback durations (None = not recorded)
+            mongo_settings: connect() arguments of the worker processes' MongoDB
+                connection (default: Utils.mongo_settings)
+        """
+        self.callback = callback
+        self.workers = max(0, int(workers or 0))
+        self.queue = queue.Queue(maxsize=queue_size or 2 * self.workers)
+        self.logger = logger
+        self.processes = processes and self.workers > 0
+        self.timings = timings
+        self.mongo_settings = mongo_settings
+        self._threads = []
+        self._pool = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def start(self):
+        """Start the worker threads (and process pool)"""
+        if self.processes:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_process,
+                                             initargs=(self.mongo_settings or Utils.mongo_settings,))
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"callback-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item):
+        """
+        Hand a downloaded item to the stage, blocking while the queue is full.
+
+        Args:
+            item: Downloaded item to pass to the callback
+        """
+        if self.workers:
+            self.queue.put(item)
+        else:
+            self._call(item)
+
+    async def put_async(self, item):
+        """
+        Hand a downloaded item to the stage without blocking the event loop.
+
+        Waits in a helper thread while the queue is full, so the calling
+        coroutine is suspended but other downloads keep running.
+
+        Args:
+            item: Downloaded item to pass to the callback
+        """
+        if self.workers:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+        await asyncio.get_running_loop().run_in_executor(None, self.put, item)
+
+    def close(self):
+        """Wait for queued items to be processed and stop the workers"""
+        for _ in self._threads:
+            self.queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            self._call(item)
+
+    def _call(self, item):
+        started = time.perf_counter()
+        try:
+            if self._pool is not None:
+                self._pool.submit(_call_in_process, self.callback, item, self._snapshot(item)).result()
+            else:
+                self.callback(item)
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.error(f"Error processing {getattr(item, 'url', item)}: {e}")
+        if self.timings is not None:
+            self.timings.record_item(item, 'callback', time.perf_counter() - started)
+
+    @staticmethod
+    def _snapshot(item):
+        """
+        Get the PageSnapshot of a downloaded item for a worker process.
+
+        Args:
+            item: Item handed to the stage
+
+        Returns:
+            PageSnapshot, or None if the item carries no page
+        """
+        if isinstance(getattr(item, 'raw_html', None), bytes) or isinstance(getattr(item, 'html', None), str):
+            return PageSnapshot(item)
+        return None
@@ -0,0 +1,140 @@
+# encoding: utf-8
+"""
+Per-host circuit breakers that fail fast while a site is down.
+"""
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host whose breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a single host.
+
+    Closed: requests flow and consecutive failures are counted. After
+    `threshold` failures in a row the breaker opens and every request fails
+    fast for `cooldown` seconds. Then one probe request is let through
+    (half-open): success closes the breaker, failure opens it again. A probe
+    that never reports back is replaced after another cooldown.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        """
+        Initialize the breaker.
+
+        Args:
+            threshold: Consecutive failures that open the breaker
+            cooldown: Seconds to fail fast before probing the host
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check whether a request may be sent now.
+
+        Returns:
+            bool: True when closed, or for the single half-open probe
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            # Cool-down over: let one probe through and hold the rest back
+            self.state = self.HALF_OPEN
+            self._opened_at = time.monotonic()
+            return True
+
+    def success(self):
+        """Record a healthy response and close the breaker"""
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def failure(self):
+        """Record a timeout, connection error or 5xx"""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class CircuitBreakers:
+    """
+    Registry of CircuitBreaker objects, one per host.
+
+    Usage:
+        if not breakers.allow(host):
+            raise CircuitOpenError(host)
+        ...
+        breakers.feedback(host, status)
+    """
+
+    COOLDOWN = 30.0
+
+    def __init__(self, threshold=5, cooldown=None):
+        """
+        Initialize the registry.
+
+        Args:
+            threshold: Consecutive failures that open a host's breaker
+            cooldown: Seconds an open breaker fails fast
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown or self.COOLDOWN
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        """
+        Get the breaker of a host, creating it on first use.
+
+        Args:
+            host: Host name
+
+        Returns:
+            CircuitBreaker
+        """
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.threshold, self.cooldown)
+            return breaker
+
+    def allow(self, host):
+        """
+        Check whether a request to a host may be sent now.
+
+        Args:
+            host: Host name
+
+        Returns:
+            bool: False while the host's breaker is open
+        """
+        return self.breaker(host).allow()
+
+    def feedback(self, host, status=None):
+        """
+        Record the outcome of a request.
+
+        Args:
+            host: Host name
+            status: HTTP status code, or None for a timeout/connection error
+        """
+        if status is None or status >= 500:
+            self.breaker(host).failure()
+        else:
+            self.breaker(host).success()
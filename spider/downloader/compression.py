@@ -0,0 +1,21 @@
+# encoding: utf-8
+"""
+Content-Encoding negotiation.
+
+requests (urllib3) and aiohttp both decode gzip, deflate and - when a brotli
+binding is installed - br chunk by chunk as the body is read. This module
+keeps the Accept-Encoding header every downloader sends in step with what
+those decoders can actually handle.
+"""
+
+try:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        import brotli
+except ImportError:  # brotli is optional, gzip and deflate are always available
+    brotli = None
+
+
+ENCODINGS = ('gzip', 'deflate', 'br') if brotli is not None else ('gzip', 'deflate')
+ACCEPT_ENCODING = ', '.join(ENCODINGS)
@@ -0,0 +1,171 @@
+# encoding: utf-8
+"""
+In-process DNS cache shared by all downloaders.
+"""
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+from aiohttp.abc import AbstractResolver
+
+
+class DnsCache:
+    """
+    Caches getaddrinfo() results per (host, port, family).
+
+    A run only talks to a handful of hosts, so every connection after the
+    first one is opened without a DNS round trip. Entries are kept for at
+    most `ttl` seconds (the system resolver does not expose record TTLs, so
+    this is an upper bound kept below the sites' usual record TTLs) and
+    dropped early when a connection to the cached address fails.
+
+    Usage:
+        infos = dns_cache.resolve(host, port)   # getaddrinfo() results
+        ...
+        dns_cache.invalidate(host)              # address no longer reachable
+    """
+
+    TTL = 300
+
+    def __init__(self, ttl=None):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds a resolved address is reused
+        """
+        self.ttl = ttl or self.TTL
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, host, port, family=socket.AF_UNSPEC):
+        """
+        Get cached addresses without resolving.
+
+        Args:
+            host: Host name
+            port: Port number
+            family: Address family (AF_UNSPEC for any)
+
+        Returns:
+            list: getaddrinfo() results, or None if not cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get((host, port, family))
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        """
+        Get the addresses of a host, resolving it on a miss.
+
+        Args:
+            host: Host name
+            port: Port number
+            family: Address family (AF_UNSPEC for any)
+
+        Returns:
+            list: getaddrinfo() results (family, type, proto, canonname, sockaddr)
+
+        Raises:
+            socket.gaierror: If the host cannot be resolved
+        """
+        infos = self.lookup(host, port, family)
+        if infos is not None:
+            return infos
+        # Concurrent misses for a host wait for a single lookup
+        with self._lock:
+            pending = self._pending.setdefault((host, port, family), threading.Lock())
+        with pending:
+            infos = self.lookup(host, port, family)
+            if infos is not None:
+                return infos
+            infos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+            with self._lock:
+                self.misses += 1
+                self._entries[(host, port, family)] = (time.monotonic() + self.ttl, infos)
+        return infos
+
+    def invalidate(self, host):
+        """
+        Drop every cached address of a host.
+
+        Args:
+            host: Host name
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == host]:
+                del self._entries[key]
+
+    @staticmethod
+    def is_ip(host):
+        """
+        Check whether a host is an IP literal (never looked up).
+
+        Args:
+            host: Host name or address
+
+        Returns:
+            bool
+        """
+        try:
+            ipaddress.ip_address(host.strip('[]'))
+            return True
+        except ValueError:
+            return False
+
+
+class CachedResolver(AbstractResolver):
+    """
+    aiohttp resolver backed by a DnsCache, so EmDownloader shares the cache
+    with the requests-based downloaders.
+    """
+
+    def __init__(self, dns_cache):
+        """
+        Initialize the resolver.
+
+        Args:
+            dns_cache: DnsCache to resolve through
+        """
+        self.dns_cache = dns_cache
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        """
+        Resolve a host, off the event loop on a cache miss.
+
+        Args:
+            host: Host name
+            port: Port number
+            family: Address family
+
+        Returns:
+            list: aiohttp ResolveResult dicts
+        """
+        infos = self.dns_cache.lookup(host, port, family)
+        if infos is None:
+            loop = asyncio.get_running_loop()
+            try:
+                infos = await loop.run_in_executor(None, self.dns_cache.resolve, host, port, family)
+            except socket.gaierror as e:
+                raise OSError(e.errno, f"Could not resolve {host}: {e}") from e
+        return [
+            {
+                'hostname': host,
+                'host': sockaddr[0],
+                'port': sockaddr[1],
+                'family': info_family,
+                'proto': proto,
+                'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            }
+            for info_family, _, proto, _, sockaddr in infos
+        ]
+
+    async def close(self):
+        """Nothing to release: the DnsCache outlives the session"""
@@ -1,7 +1,17 @@
 # encoding: utf-8
 import asyncio
+import threading
+import time
 import aiohttp
 from spider.downloader import Downloader
+from spider.downloader.cache import ClaimHeld
+from spider.downloader.circuit import CircuitOpenError
+from spider.downloader.compression import ACCEPT_ENCODING
+from spider.downloader.dns import CachedResolver
+from spider.downloader.limits import ResponseRejected
+from spider.downloader.response import Response
+from spider.downloader.retry import RetryScheduler
+from spider.downloader.timing import RequestTimer
 from spider.encoding import Encoding
 from spider.utils.utils import Utils
 
@@ -9,9 +19,13 @@ from spider.utils.utils import Utils
 class EmDownloader(Downloader):
     """
     Asynchronous event-driven downloader using asyncio and aiohttp.
-    Downloads all items concurrently using async/await.
+    Downloads items concurrently using async/await, bounded globally by
+    max_concurrency() and per host by max_host_concurrency(). Callbacks run
+    on a CallbackStage so parsing never stalls the event loop.
     """
 
+    _END = object()
+
     def __init__(self, items):
         """
         Initialize downloader with list of items to download.
@@ -38,41 +52,477 @@ class EmDownloader(Downloader):
         Args:
             callback: Function to call for each successfully downloaded item
         """
-        async with aiohttp.ClientSession() as session:
-            # Create all download tasks
-            tasks = [self._fetch(session, item, callback) for item in self.items]
-            # Wait for all to complete
-            await asyncio.gather(*tasks, return_exceptions=True)
+        with self.callback_stage(callback) as stage:
+            async def sink(item, response):
+                await stage.put_async(item)
+
+            await self._download_all(self._iter_items(), sink)
+
+    async def aiter_results(self, items=None):
+        """
+        Stream download results as they complete, for use with `async for`.
+
+        Results wait in a queue of max_concurrency() entries; while it is full
+        the download workers pause, so a slow consumer throttles the crawl.
+
+        Args:
+            items: Iterable or async iterable of items (default: self.items)
+
+        Yields:
+            (item, Response) tuples for successful downloads
+        """
+        results = asyncio.Queue(maxsize=self.max_concurrency())
+
+        async def produce():
+            try:
+                await self._download_all(self._iter_items() if items is None else items, sink)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error streaming results: {e}")
+            await results.put(self._END)
+
+        async def sink(item, response):
+            await results.put((item, response))
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                result = await results.get()
+                if result is self._END:
+                    break
+                yield result
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+
+    def iter_results(self, items=None):
+        """
+        Stream download results as they complete.
+
+        Runs aiter_results() on an event loop in a helper thread and hands
+        results over one at a time.
+
+        Args:
+            items: Iterable of objects with 'url' attribute (default: self.items)
+
+        Yields:
+            (item, Response) tuples for successful downloads
+        """
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        results = self.aiter_results(items)
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(results.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            asyncio.run_coroutine_threadsafe(results.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def _download_all(self, items, sink):
+        """
+        Download items and pass each success to sink.
+
+        A fixed number of workers (max_concurrency()) pull items lazily from
+        the item iterable, so at most that many requests are in flight and no
+        task is built ahead of time. Each host is additionally capped by
+        max_host_concurrency() for the item's site.
+
+        Args:
+            items: Iterable or async iterable of objects with 'url' attribute
+            sink: Coroutine function called with (item, Response)
+        """
+        limit = self.max_concurrency()
+        if not hasattr(items, '__aiter__'):
+            items = self._iterate(items)
+        if self.prewarm and not hasattr(items, '__aiter__'):
+            # aiohttp has no idle-connection API: warm the DNS cache only
+            items = await asyncio.get_running_loop().run_in_executor(None, self._prewarm, items)
+        next_item = self._item_source(items)
+        host_slots = {}
+        duplicates = {}     # URL in flight -> items coalesced into its download
+
+        async def worker(session):
+            while True:
+                item = await next_item()
+                if item is self._END:
+                    return
+                if item.url in duplicates:
+                    # Same URL already in flight: take its page instead of fetching again
+                    duplicates[item.url].append(item)
+                    continue
+                duplicates[item.url] = []
+                try:
+                    async with self._host_slot(host_slots, item):
+                        await self._fetch(session, item, sink, duplicates)
+                except Exception as e:
+                    # A failing sink or callback must not take the worker down with the item
+                    self.logger.error(f"Error processing {item.url}: {e}")
+
+        # Hedged requests may need a second connection per worker
+        resolver = CachedResolver(self.dns_cache) if self.dns_cache is not None else None
+        connector = aiohttp.TCPConnector(limit=limit * (2 if self.hedger is not None else 1),
+                                         resolver=resolver, use_dns_cache=resolver is None)
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        async with aiohttp.ClientSession(connector=connector, headers=headers,
+                                         trace_configs=[self._trace_config()]) as session:
+            errors = await asyncio.gather(*[worker(session) for _ in range(limit)], return_exceptions=True)
+        for error in errors:
+            if isinstance(error, Exception):
+                # Reading the next item failed (e.g. the cursor was lost)
+                self.logger.error(f"Download worker stopped: {error}")
+
+    def _item_source(self, items):
+        """
+        Build a coroutine function returning the next item, or _END.
+
+        Args:
+            items: Iterable or async iterable of items
+
+        Returns:
+            Coroutine function shared by the download workers
+        """
+        if hasattr(items, '__aiter__'):
+            iterator = items.__aiter__()
+            lock = asyncio.Lock()
+
+            async def next_item():
+                async with lock:
+                    try:
+                        return await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return self._END
+        else:
+            iterator = iter(items)
+
+            async def next_item():
+                return next(iterator, self._END)
+
+        return next_item
+
+    def _host_slot(self, host_slots, item):
+        """
+        Get the per-host semaphore guarding requests to the item's host.
+
+        Args:
+            host_slots: Dict of host -> asyncio.Semaphore shared by the run
+            item: Object with 'url' and 'kind' attributes
+
+        Returns:
+            asyncio.Semaphore for the item's host
+        """
+        host = self.host_of(getattr(item, 'url', None))
+        if host not in host_slots:
+            kind = getattr(item, 'kind', None)
+            host_slots[host] = asyncio.Semaphore(self.max_host_concurrency(kind))
+        return host_slots[host]
 
-    async def _fetch(self, session, item, callback):
+    async def _fetch(self, session, item, sink, duplicates=None):
         """
         Fetch a single item asynchronously.
 
         Args:
             session: aiohttp ClientSession
             item: Object with 'url' attribute
-            callback: Function to call on success
+            sink: Coroutine function called with (item, Response) on success
+            duplicates: Dict of URL in flight -> items coalesced into its
+                download, which get the page too (None = no coalescing)
         """
         try:
-            async with session.get(item.url, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                if response.status == 200:
-                    html = await response.read()
+            response = await self._download(session, item)
+        finally:
+            waiting = duplicates.pop(item.url, []) if duplicates is not None else []
+        if response is not None:
+            await sink(item, response)
+        for duplicate, duplicate_response in self._fan_out(item, waiting, response):
+            await sink(duplicate, duplicate_response)
 
-                    # Convert encoding to UTF-8
-                    Encoding.set_utf8_html(item, html)
-
-                    # Validate HTML
-                    if not Utils.valid_html(item.html):
-                        self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Bad HTML.")
-                    else:
-                        # Call callback with successfully downloaded item
-                        callback(item)
+    async def _get(self, session, item):
+        """
+        GET an item's URL through the response cache, the circuit breaker
+        and the rate limiter. The phases of the request are recorded in
+        timings.
+
+        Args:
+            session: aiohttp ClientSession
+            item: Object with 'url' and 'kind' attributes
+
+        Returns:
+            tuple: (status, body, headers, cached)
+        """
+        entry, cached = self._cache_lookup(item)
+        if cached:
+            return 200, entry.body, entry.headers, True
+        if not self._claim(item):
+            shared = await self._await_peer(item)
+            if shared is not None:
+                return 200, shared.body, shared.headers, True
+
+        wait = self._pace(item)
+        if wait:
+            await asyncio.sleep(wait)
+        proxy = self._choose_proxy(item)
+        request_args = dict(self._conditional(entry), **self._proxy_args(proxy))
+        started = time.monotonic()
+        with self.metrics.tracking('spider_requests_in_flight', site=item.kind):
+            try:
+                status, body, headers, stream, timer = await self._send(session, item, request_args)
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientHttpProxyError):
+                self._feedback(item, proxy=proxy)
+                raise
+            except ResponseRejected:
+                # Only 200 responses have their body read
+                self._feedback(item, 200, time.monotonic() - started, proxy)
+                raise
+        self._feedback(item, status, time.monotonic() - started, proxy)
+        if stream is not None:
+            # Only the attempt that won a hedge race parsed the body the item gets
+            item.stream = stream
+        self.timings.record_request(item, timer)
+        self._count_bytes(item, body)
+
+        status, body, cached = self._revalidated(entry, status, body)
+        return status, body, entry.headers if cached else headers, cached
+
+    @staticmethod
+    def _trace_config():
+        """
+        Build the aiohttp TraceConfig adding the DNS and connect time of a
+        new connection to the RequestTimer of the request that opened it.
+
+        Returns:
+            aiohttp.TraceConfig
+        """
+        async def on_connection_create_start(session, context, params):
+            context.connect_started = time.perf_counter()
+            context.dns = 0.0
+
+        async def on_dns_resolvehost_start(session, context, params):
+            context.dns_started = time.perf_counter()
+
+        async def on_dns_resolvehost_end(session, context, params):
+            elapsed = time.perf_counter() - context.dns_started
+            context.dns = getattr(context, 'dns', 0.0) + elapsed
+            timer = RequestTimer.current()
+            if timer is not None:
+                timer.add('dns', elapsed)
+
+        async def on_connection_create_end(session, context, params):
+            # Connection setup resolves the host first: keep DNS apart
+            timer = RequestTimer.current()
+            if timer is not None:
+                timer.add('connect', time.perf_counter() - context.connect_started - context.dns)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
+
+    async def _await_peer(self, item):
+        """
+        Wait for another run's download of an item's URL without blocking
+        the event loop.
+
+        Args:
+            item: Object with 'url' attribute
+
+        Returns:
+            CacheEntry: The page the other run stored, or None if this run
+                now holds the claim and has to download it
+
+        Raises:
+            ClaimHeld: If, after CLAIM_TTL, the claim is still held by another run
+        """
+        since = time.time()
+        deadline = time.monotonic() + self.response_cache.CLAIM_TTL
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.PEER_POLL)
+            entry, done = self._poll_peer(item, since)
+            if done:
+                return entry
+        return self._claim_after_wait(item)
+
+    @staticmethod
+    def _proxy_args(proxy):
+        """
+        Request arguments routing an aiohttp call through a proxy.
+
+        Args:
+            proxy: Proxy URL or None
+
+        Returns:
+            dict: {'proxy': proxy} or {} for a direct request
+        """
+        return {'proxy': proxy} if proxy is not None else {}
+
+    async def _send(self, session, item, request_args):
+        """
+        Send the GET request for an item, hedging it when it runs long.
+
+        If the request is still running after the host's p95 latency and the
+        hedge budget allows, a duplicate is sent; the first successful
+        response wins and the other request is cancelled.
+
+        Args:
+            session: aiohttp ClientSession
+            item: Object with 'url' attribute
+            request_args: Extra request arguments (conditional headers, proxy)
+
+        Returns:
+            tuple: (status, body, headers, stream, timer) of the winning attempt,
+                as returned by _request()
+        """
+        delay = self.hedger.delay(self.host_of(item.url)) if self.hedger is not None else None
+        if delay is None:
+            return await self._request(session, item, request_args)
+
+        primary = asyncio.ensure_future(self._request(session, item, request_args))
+        try:
+            done, _ = await asyncio.wait([primary], timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or not self.hedger.acquire():
+            return await primary
+        backup = asyncio.ensure_future(self._request(session, item, request_args))
+        return await self._first_success([primary, backup])
+
+    async def _request(self, session, item, request_args):
+        """
+        Perform a single GET request, streaming a 200 body in within the
+        site's body limit and handing it to a StreamingParse of its own.
+
+        Each attempt of a hedged request has its own StreamingParse and
+        RequestTimer, so the one that loses the race never touches the item.
+
+        Args:
+            session: aiohttp ClientSession
+            item: Object with 'url' and 'kind' attributes
+            request_args: Extra request arguments (conditional headers, proxy)
+
+        Returns:
+            tuple: (status, body, headers, stream, timer) - body is None unless
+                status is 200, stream is the StreamingParse fed the body (None
+                if streaming is off)
+
+        Raises:
+            ResponseRejected: If the body is not HTML or over max_bytes
+        """
+        with RequestTimer() as timer:
+            async with session.get(item.url, timeout=aiohttp.ClientTimeout(total=30), **request_args) as response:
+                timer.headers_received()
+                if response.status != 200:
+                    return response.status, None, response.headers, None, timer
+                limit = self.body_limit(item.kind)
+                limit.check_headers(response.headers)
+                stream = self.streaming(item, response.headers) if self.streaming is not None else None
+                loop = asyncio.get_running_loop()
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                    body += chunk
+                    limit.check_size(len(body))
+                    # Parsing runs off the event loop, so other downloads keep moving
+                    if stream is not None and await loop.run_in_executor(None, stream.feed, chunk) \
+                            and self.stream_cancel:
+                        # Leaving the block closes the connection with the rest unread
+                        stream.cancelled = True
+                        break
+                else:
+                    if stream is not None:
+                        await loop.run_in_executor(None, stream.close)
+                timer.body_received()
+                return response.status, bytes(body), response.headers, stream, timer
+
+    @staticmethod
+    async def _first_success(tasks):
+        """
+        Wait for the first task that completes without an exception.
+
+        Args:
+            tasks: Tasks racing for the same request
+
+        Returns:
+            Result of the winning task (the others are cancelled)
+
+        Raises:
+            Exception: The last error if every task failed
+        """
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _download(self, session, item):
+        """
+        Download a single item and set its html.
+
+        Args:
+            session: aiohttp ClientSession
+            item: Object with 'url' attribute
+
+        Returns:
+            Response on success, None otherwise (the failure is logged)
+        """
+        self._count(item, 'attempted')
+        try:
+            status, html, headers, cached = await self._get(session, item)
+
+            if status == 200:
+                # Reject truncated pages before decoding them (streaming cuts them short on purpose)
+                cut = self._cut_short(item)
+                if not cut and not Utils.valid_html(html):
+                    self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Bad HTML.")
+                    self._failed(item, RetryScheduler.BAD_HTML)
                 else:
-                    self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP {response.status}.")
+                    # Convert encoding to UTF-8
+                    with self.timings.timed(item, 'decode'):
+                        Encoding.set_utf8_html(item, html, headers)
+                    if not cached and not cut:
+                        self._store_response(item, status, html, headers)
+                    return self._succeeded(item, Response(item.url, status, html, headers, from_cache=cached))
+            else:
+                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP {status}.")
+                self._failed(item, RetryScheduler.HTTP)
 
+        except CircuitOpenError:
+            # Host is down: leave the item for a later run without recording a retry failure
+            self.logger.warning(f"{item.__class__.__name__} {item.kind} {item.url} Circuit Open.")
+            self._count(item, 'skipped', reason='circuit_open')
+        except ClaimHeld:
+            # Another run is downloading the page: leave the item for a later run
+            self.logger.warning(f"{item.__class__.__name__} {item.kind} {item.url} Claimed By Another Run.")
+            self._count(item, 'skipped', reason='claimed')
+        except ResponseRejected as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Rejected: {e}.")
+            self._failed(item, e.failure)
         except asyncio.TimeoutError:
             self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP Connection Timeout.")
+            self._failed(item, RetryScheduler.TIMEOUT)
         except aiohttp.ClientError as e:
             self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP Connection Error: {e}")
+            self._failed(item, RetryScheduler.CONNECTION)
         except Exception as e:
             self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Error: {e}")
+            self._failed(item, RetryScheduler.ERROR)
+        finally:
+            self._release(item)
+        return None
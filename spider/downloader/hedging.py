@@ -0,0 +1,86 @@
+# encoding: utf-8
+"""
+Hedged requests: send a duplicate when a request runs past the host's p95.
+"""
+import threading
+from collections import deque
+
+
+class Hedger:
+    """
+    Tracks per-host latency and decides when a duplicate request may be sent.
+
+    A request that has not finished after its host's observed p95 latency is
+    hedged with a duplicate; whichever answers first wins. Hedges are capped
+    at `budget` (a fraction) of all requests so a slow host cannot double
+    its own load.
+
+    Usage:
+        delay = hedger.delay(host)          # None: do not hedge
+        ...
+        if hedger.acquire():                # budget left for a duplicate
+            ...
+        hedger.record(host, elapsed)
+    """
+
+    WINDOW = 200        # Latency samples kept per host
+    MIN_SAMPLES = 20    # Samples needed before a host is hedged
+    PERCENTILE = 0.95
+
+    def __init__(self, budget=0.05):
+        """
+        Initialize the hedger.
+
+        Args:
+            budget: Maximum hedges as a fraction of requests (0.05 = 5%)
+        """
+        self.budget = budget
+        self.requests = 0
+        self.hedges = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, host, elapsed):
+        """
+        Record the latency of a completed request.
+
+        Args:
+            host: Host name
+            elapsed: Seconds the request took
+        """
+        with self._lock:
+            samples = self._latencies.get(host)
+            if samples is None:
+                samples = self._latencies[host] = deque(maxlen=self.WINDOW)
+            samples.append(elapsed)
+
+    def delay(self, host):
+        """
+        Count a new request and get the time after which it may be hedged.
+
+        Args:
+            host: Host name
+
+        Returns:
+            float: The host's p95 latency, or None until enough samples exist
+        """
+        with self._lock:
+            self.requests += 1
+            samples = self._latencies.get(host)
+            if samples is None or len(samples) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(samples)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * self.PERCENTILE))]
+
+    def acquire(self):
+        """
+        Take a hedge from the budget.
+
+        Returns:
+            bool: True if a duplicate request may be sent
+        """
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
@@ -0,0 +1,85 @@
+# encoding: utf-8
+"""
+Limits on response bodies: downloads of non-HTML or oversized bodies are
+aborted before they are read into memory.
+"""
+from spider.downloader.retry import RetryScheduler
+
+
+class ResponseRejected(Exception):
+    """Raised when a response body is refused by its BodyLimit"""
+
+    def __init__(self, failure, message):
+        """
+        Initialize the error.
+
+        Args:
+            failure: Failure class (RetryScheduler.NOT_HTML or TOO_LARGE)
+            message: What was refused
+        """
+        super().__init__(message)
+        self.failure = failure
+
+
+class BodyLimit:
+    """
+    Checks a response while its body streams in.
+
+    The headers are checked before the first byte of the body is read: a
+    Content-Type that is not HTML, or a Content-Length above `max_bytes`,
+    rejects the response at once. The body is then counted chunk by chunk
+    so a response without (or with a lying) Content-Length is cut off as
+    soon as it passes the limit.
+
+    Usage:
+        limit = BodyLimit(max_bytes)
+        limit.check_headers(response.headers)
+        for chunk in chunks:
+            limit.check_size(len(body))
+    """
+
+    # Media type prefixes accepted as pages (a missing Content-Type is accepted too)
+    HTML_TYPES = ('text/', 'application/xhtml+xml', 'application/xml')
+
+    def __init__(self, max_bytes):
+        """
+        Initialize the limit.
+
+        Args:
+            max_bytes: Largest (decompressed) body accepted, in bytes
+        """
+        self.max_bytes = max_bytes
+
+    def check_headers(self, headers):
+        """
+        Reject a response by its headers.
+
+        Args:
+            headers: Response headers (case-insensitive mapping)
+
+        Raises:
+            ResponseRejected: If the body is not HTML or announced too large
+        """
+        content_type = headers.get('Content-Type')
+        if content_type:
+            media_type = content_type.split(';', 1)[0].strip().lower()
+            if not media_type.startswith(self.HTML_TYPES):
+                raise ResponseRejected(RetryScheduler.NOT_HTML, f"Content-Type {media_type}")
+
+        length = headers.get('Content-Length')
+        if length and length.strip().isdigit():
+            # The wire length of a compressed body is a lower bound of its size
+            self.check_size(int(length))
+
+    def check_size(self, size):
+        """
+        Reject a body that has grown past the limit.
+
+        Args:
+            size: Bytes of the body seen so far
+
+        Raises:
+            ResponseRejected: If size exceeds max_bytes
+        """
+        if size > self.max_bytes:
+            raise ResponseRejected(RetryScheduler.TOO_LARGE, f"Body over {self.max_bytes} bytes")
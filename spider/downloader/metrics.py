@@ -0,0 +1,333 @@
+# encoding: utf-8
+"""
+Crawl metrics in the Prometheus text exposition format, served over HTTP
+or written to a textfile.
+"""
+import atexit
+import contextlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Metrics:
+    """
+    Thread-safe registry of labelled counters and gauges, rendered
+    together with the phase histograms of a Timings registry.
+
+    Only the metrics declared in METRICS can be updated; each labelled
+    series appears once it has a value.
+
+    Usage:
+        metrics.inc('spider_items_attempted_total', site='tmall', stage='Page')
+        with metrics.tracking('spider_requests_in_flight', site='tmall'):
+            ...
+        metrics.gauge('spider_queue_depth', stage.queue.qsize, queue='callback')
+        metrics.export(port=9108)
+    """
+
+    # Name -> (type, help)
+    METRICS = {
+        'spider_items_attempted_total': ('counter', "Items the downloaders tried to download."),
+        'spider_items_succeeded_total': ('counter', "Items downloaded and handed to the callback."),
+        'spider_items_failed_total': ('counter', "Items that failed to download, by reason."),
+        'spider_items_skipped_total': ('counter', "Items left for the next run without a request, by reason."),
+        'spider_bytes_downloaded_total': ('counter', "Response body bytes read from the network."),
+        'spider_records_written_total': ('counter', "Records saved to the database."),
+        'spider_requests_in_flight': ('gauge', "Requests sent and not yet answered."),
+        'spider_queue_depth': ('gauge', "Items waiting in a queue."),
+    }
+    HISTOGRAM = 'spider_request_phase_seconds'
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    INTERVAL = 15           # Seconds between textfile rewrites
+
+    def __init__(self, timings=None):
+        """
+        Initialize the registry.
+
+        Args:
+            timings: Timings whose histograms are exported (None = none)
+        """
+        self.timings = timings
+        self._values = {}       # (name, labels) -> value
+        self._functions = {}    # (name, labels) -> function sampled on render
+        self._exporters = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Increase a counter (or gauge).
+
+        Args:
+            name: Metric name from METRICS
+            amount: Increment
+            **labels: Label values of the series
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge.
+
+        Args:
+            name: Metric name from METRICS
+            value: New value
+            **labels: Label values of the series
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def gauge(self, name, function, **labels):
+        """
+        Sample a gauge from a function each time the metrics are rendered.
+
+        Args:
+            name: Metric name from METRICS
+            function: Callable returning the current value
+            **labels: Label values of the series
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._functions[key] = function
+
+    @contextlib.contextmanager
+    def tracking(self, name, **labels):
+        """
+        Count a block in a gauge while it runs.
+
+        Args:
+            name: Metric name from METRICS
+            **labels: Label values of the series
+        """
+        self.inc(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.inc(name, -1, **labels)
+
+    def value(self, name, **labels):
+        """
+        Get the current value of a series.
+
+        Args:
+            name: Metric name from METRICS
+            **labels: Label values of the series
+
+        Returns:
+            Value of the series (0 if it has none)
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            function = self._functions.get(key)
+            return function() if function is not None else self._values.get(key, 0)
+
+    def written(self, record, site=None):
+        """
+        Count a record saved to the database.
+
+        Args:
+            record: Saved model instance
+            site: Site kind (default: the record's kind)
+        """
+        site = site if site is not None else getattr(record, 'kind', None)
+        self.inc('spider_records_written_total', site=site, model=record.__class__.__name__)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str
+        """
+        with self._lock:
+            series = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                series[key] = function()
+            except Exception:
+                continue
+
+        lines = []
+        for name, (kind, help_text) in self.METRICS.items():
+            rows = sorted((labels, value) for (metric, labels), value in series.items() if metric == name)
+            if not rows:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{self._labels(labels)} {self._number(value)}" for labels, value in rows]
+        lines += self._render_histograms()
+        return '\n'.join(lines) + '\n'
+
+    def _render_histograms(self):
+        if self.timings is None:
+            return []
+        keys = sorted(self.timings.keys(), key=lambda key: tuple(str(part) for part in key))
+        if not keys:
+            return []
+        name = self.HISTOGRAM
+        lines = [f"# HELP {name} Time spent in each phase of a download.", f"# TYPE {name} histogram"]
+        for site, stage, phase in keys:
+            histogram = self.timings.histogram(site, stage, phase)
+            labels = (('phase', phase), ('site', site), ('stage', stage))
+            for bound in self.BUCKETS:
+                bucket = labels + (('le', self._number(bound)),)
+                lines.append(f"{name}_bucket{self._labels(bucket)} {histogram.count_at_or_below(bound)}")
+            lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {self._number(histogram.total / 1000000)}")
+            lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return lines
+
+    def export(self, port=None, path=None, interval=None):
+        """
+        Start exporting the metrics (once per port or path).
+
+        Args:
+            port: Serve /metrics on this local port (None or 0 = no endpoint)
+            path: Rewrite this textfile every interval seconds (None = no file)
+            interval: Seconds between textfile rewrites
+
+        Returns:
+            list: The MetricsServer and/or TextfileExporter started
+        """
+        started = []
+        with self._lock:
+            running = {getattr(exporter, 'requested_port', None) for exporter in self._exporters}
+            running |= {getattr(exporter, 'path', None) for exporter in self._exporters}
+            if port and port not in running:
+                started.append(MetricsServer(self, port))
+            if path and path not in running:
+                started.append(TextfileExporter(self, path, interval or self.INTERVAL))
+            self._exporters += started
+        for exporter in started:
+            exporter.start()
+            atexit.register(exporter.close)
+        return started
+
+    @classmethod
+    def _key(cls, name, labels):
+        if name not in cls.METRICS:
+            raise KeyError(f"Unknown metric: {name}")
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ''
+        pairs = ','.join(f'{label}="{Metrics._escape(str(value))}"' for label, value in labels)
+        return '{' + pairs + '}'
+
+    @staticmethod
+    def _escape(value):
+        return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+    @staticmethod
+    def _number(value):
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint serving the metrics at /metrics from a daemon thread.
+    """
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        """
+        Initialize the server.
+
+        Args:
+            metrics: Metrics to serve
+            port: Port to listen on (0 = any free port, see .port)
+            host: Address to bind
+        """
+        self.metrics = metrics
+        self.requested_port = port
+        self.host = host
+        self.port = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Bind the port and start serving"""
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.requested_port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop serving and release the port"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class TextfileExporter:
+    """
+    Rewrites a textfile with the metrics every interval seconds, for the
+    node_exporter textfile collector. The file is replaced atomically, so
+    it is never read half-written.
+    """
+
+    def __init__(self, metrics, path, interval=Metrics.INTERVAL):
+        """
+        Initialize the exporter.
+
+        Args:
+            metrics: Metrics to write
+            path: File to write (its directory must exist)
+            interval: Seconds between rewrites
+        """
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Write the file now and then every interval seconds"""
+        self.write()
+        self._thread = threading.Thread(target=self._run, name="metrics-textfile", daemon=True)
+        self._thread.start()
+
+    def write(self):
+        """Write the current metrics to the file"""
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.metrics.render())
+        os.replace(temporary, self.path)
+
+    def close(self):
+        """Stop the rewrites and write the final values"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                continue
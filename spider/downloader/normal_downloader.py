@@ -1,14 +1,21 @@
 # encoding: utf-8
 import requests
 from spider.downloader import Downloader
+from spider.downloader.session import SessionPool
+from spider.downloader.cache import ClaimHeld
+from spider.downloader.circuit import CircuitOpenError
+from spider.downloader.limits import ResponseRejected
+from spider.downloader.response import Response
+from spider.downloader.retry import RetryScheduler
 from spider.encoding import Encoding
 from spider.utils.utils import Utils
 
 
 class NormalDownloader(Downloader):
     """
-    Single-threaded downloader using requests library.
-    Downloads items sequentially one at a time.
+    Sequential downloader using requests library.
+    Downloads items one at a time over a shared keep-alive session, handing
+    them to callback workers.
     """
 
     def __init__(self, items):
@@ -24,25 +31,87 @@ class NormalDownloader(Downloader):
         """
         Download all items sequentially and call callback for each successful download.
 
+        Callbacks run on a CallbackStage with `callback_workers` threads, so
+        the next page downloads while the last one is parsed and saved.
+
         Args:
             callback: Function to call for each successfully downloaded item
         """
-        for item in self.items:
-            try:
-                response = requests.get(item.url, timeout=30)
-                html = response.content
-
-                # Convert encoding to UTF-8
-                Encoding.set_utf8_html(item, html)
-
-                # Validate HTML
-                if not Utils.valid_html(item.html):
-                    self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Bad HTML.")
-                else:
-                    # Call callback with successfully downloaded item
-                    callback(item)
-
-            except (requests.Timeout, requests.ConnectionError) as e:
-                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP Connection Error: {e}")
-            except Exception as e:
-                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Error: {e}")
+        with self.callback_stage(callback) as stage:
+            for item, response in self._results(self._iter_items()):
+                stage.put(item)
+
+    def _results(self, items):
+        """
+        Download items one at a time.
+
+        An item whose URL was already downloaded in the batch is skipped
+        (only the URLs are remembered, not their pages).
+
+        Args:
+            items: Iterator of objects with 'url' attribute
+
+        Yields:
+            (item, Response) for each successful download
+        """
+        session = SessionPool.get(1)
+        seen = set()
+        for item in self._prewarm(items, session):
+            if item.url in seen:
+                self.logger.warning(f"{item.__class__.__name__} {item.kind} {item.url} Duplicate In Batch.")
+                self._count(item, 'skipped', reason='duplicate')
+                continue
+            seen.add(item.url)
+            response = self._download(session, item)
+            if response is not None:
+                yield item, response
+
+    def _download(self, session, item):
+        """
+        Download a single item and set its html.
+
+        Args:
+            session: requests.Session to download with
+            item: Object with 'url' attribute
+
+        Returns:
+            Response on success, None otherwise (the failure is logged)
+        """
+        self._count(item, 'attempted')
+        try:
+            status, html, headers, cached = self._get(session, item)
+
+            # Reject truncated pages before decoding them (streaming cuts them short on purpose)
+            cut = self._cut_short(item)
+            if not cut and not Utils.valid_html(html):
+                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Bad HTML.")
+                self._failed(item, RetryScheduler.BAD_HTML)
+                return None
+
+            # Convert encoding to UTF-8
+            with self.timings.timed(item, 'decode'):
+                Encoding.set_utf8_html(item, html, headers)
+            if not cached and not cut:
+                self._store_response(item, status, html, headers)
+            return self._succeeded(item, Response(item.url, status, html, headers, from_cache=cached))
+
+        except CircuitOpenError:
+            # Host is down: leave the item for a later run without recording a retry failure
+            self.logger.warning(f"{item.__class__.__name__} {item.kind} {item.url} Circuit Open.")
+            self._count(item, 'skipped', reason='circuit_open')
+        except ClaimHeld:
+            # Another run is downloading the page: leave the item for a later run
+            self.logger.warning(f"{item.__class__.__name__} {item.kind} {item.url} Claimed By Another Run.")
+            self._count(item, 'skipped', reason='claimed')
+        except ResponseRejected as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Rejected: {e}.")
+            self._failed(item, e.failure)
+        except requests.RequestException as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP Connection Error: {e}")
+            self._failed(item, RetryScheduler.TIMEOUT if isinstance(e, requests.Timeout) else RetryScheduler.CONNECTION)
+        except Exception as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Error: {e}")
+            self._failed(item, RetryScheduler.ERROR)
+        finally:
+            self._release(item)
+        return None
@@ -0,0 +1,136 @@
+# encoding: utf-8
+"""
+Pipelined download -> parse -> persist mode.
+
+Downloads stay in the downloader's I/O stage. The raw page bytes go to a
+process pool where the CPU-heavy BeautifulSoup parsing runs, and only the
+compact result dict comes back to the main process for persistence.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from spider.encoding import Encoding, LazyHtml
+
+
+class PageSnapshot:
+    """
+    Picklable stand-in for a downloaded Category/Page/ProductUrl.
+
+    Carries only what parsers need (url, kind, id and the raw body), so
+    sending a page to a worker process costs one copy of its bytes.
+    """
+
+    html = LazyHtml()
+
+    def __init__(self, item):
+        """
+        Initialize the snapshot from a downloaded item.
+
+        Args:
+            item: Object with 'url', 'kind', 'id' and 'raw_html' (or 'html')
+        """
+        self.url = item.url
+        self.kind = item.kind
+        self.id = getattr(item, 'id', None)
+        raw_html = getattr(item, 'raw_html', None)
+        self.raw_html = raw_html if isinstance(raw_html, bytes) else item.html
+        encoding = getattr(item, 'encoding', None)
+        self.encoding = encoding if isinstance(encoding, str) else None
+        self._html = None
+
+    def decode(self):
+        """
+        Resolve the charset of raw_html in the worker process. html is
+        decoded on first access; parsers read raw_html directly.
+
+        Returns:
+            The snapshot
+        """
+        return Encoding.set_utf8_html(self, self.raw_html, encoding=self.encoding)
+
+
+def extract_product(parser_class, snapshot):
+    """
+    Parse a product page in a worker process.
+
+    Args:
+        parser_class: Site Parser subclass
+        snapshot: PageSnapshot of a ProductUrl
+
+    Returns:
+        dict: {'categories': [...], 'attributes': {...}}
+    """
+    parser = parser_class(snapshot.decode())
+    return {
+        'categories': parser.belongs_to_categories(),
+        'attributes': parser.attributes()
+    }
+
+
+def extract_product_urls(digger_class, snapshot):
+    """
+    Dig product URLs from a listing page in a worker process.
+
+    Args:
+        digger_class: Site Digger subclass
+        snapshot: PageSnapshot of a Page
+
+    Returns:
+        dict: {'product_urls': [...]}
+    """
+    return {'product_urls': digger_class(snapshot.decode()).product_list()}
+
+
+class ParsePipeline:
+    """
+    Downloader callback that parses pages in a process pool and persists the
+    results in the calling thread.
+
+    Use it together with a downloader whose callback_workers matches the
+    pipeline's worker count: each callback thread ships one page to a parser
+    process and waits for its result, so parse throughput scales with cores
+    while database writes stay in the main process.
+
+    Usage:
+        with ParsePipeline(partial(extract_product, CurrentParser), save) as pipeline:
+            downloader.run(pipeline)
+    """
+
+    def __init__(self, extract, persist, workers=None, logger=None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            extract: Picklable function(snapshot) -> result dict, run in a worker process
+            persist: Function(item, result) run in the main process
+            workers: Number of parser processes (default: CPU count)
+            logger: Logger used to report parse errors
+        """
+        self.extract = extract
+        self.persist = persist
+        self.workers = workers or os.cpu_count() or 1
+        self.logger = logger
+        self._pool = None
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._pool.shutdown()
+        self._pool = None
+        return False
+
+    def __call__(self, item):
+        """
+        Parse a downloaded item in a worker process and persist the result.
+
+        Args:
+            item: Downloaded item with raw_html (or html) set
+        """
+        try:
+            result = self._pool.submit(self.extract, PageSnapshot(item)).result()
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.error(f"Error parsing {item.url}: {e}")
+            return
+        self.persist(item, result)
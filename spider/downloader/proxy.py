@@ -0,0 +1,197 @@
+# encoding: utf-8
+"""
+Egress proxy pool with per-proxy and per-proxy/host health scoring.
+"""
+import os
+import random
+import threading
+import time
+
+
+class ProxyStats:
+    """
+    Rolling health of a proxy, or of a proxy when used for one host.
+
+    Success rate and latency are exponentially weighted moving averages,
+    so recent requests count most and old incidents fade out.
+    """
+
+    UNKNOWN_LATENCY = 30.0  # Assumed until the first success (the request timeout)
+
+    def __init__(self):
+        self.success = 1.0      # EWMA of 1 (success) / 0 (failure)
+        self.latency = None     # EWMA of successful request seconds
+        self.samples = 0
+        self.failures = 0       # Consecutive failures
+        self.strikes = 0        # Consecutive quarantines
+        self.quarantined_until = 0.0
+
+    def update(self, ok, elapsed, alpha):
+        """
+        Fold the outcome of a request into the averages.
+
+        Args:
+            ok: True if the request succeeded
+            elapsed: Seconds the request took (None for a failure)
+            alpha: EWMA weight of the new sample
+        """
+        self.samples += 1
+        self.success += alpha * ((1.0 if ok else 0.0) - self.success)
+        if ok:
+            self.failures = 0
+            self.strikes = 0
+            if elapsed is not None:
+                self.latency = elapsed if self.latency is None else self.latency + alpha * (elapsed - self.latency)
+        else:
+            self.failures += 1
+
+    def score(self):
+        """
+        Expected cost of sending a request through this proxy.
+
+        Returns:
+            float: Latency divided by success rate (lower is better)
+        """
+        latency = self.latency if self.latency is not None else self.UNKNOWN_LATENCY
+        return latency / max(self.success, 0.01)
+
+
+class ProxyPool:
+    """
+    Routes requests over a pool of egress proxies.
+
+    Proxies never used for a host are tried first. After that, two random
+    healthy proxies are compared by their latency and success rate for the
+    target host and the cheaper one is used, so traffic leans towards the
+    fastest proxies without piling onto a single one.
+
+    A proxy (or a proxy for one host, e.g. when a site bans it) that fails
+    `MAX_FAILURES` times in a row, or whose success rate drops below
+    `MIN_SUCCESS`, is quarantined for `quarantine` seconds, doubling on each
+    consecutive quarantine. After that it gets trial traffic again.
+
+    Usage:
+        proxy = pool.choose(host)
+        ...
+        pool.feedback(proxy, host, ok, elapsed)
+    """
+
+    ALPHA = 0.2             # Weight of the newest sample in the averages
+    MAX_FAILURES = 3        # Consecutive failures that quarantine a proxy
+    MIN_SUCCESS = 0.5       # Success rate below which a proxy is quarantined
+    MIN_SAMPLES = 5         # Samples before the success rate is trusted
+    QUARANTINE = 60.0       # Seconds of the first quarantine
+    MAX_STRIKES = 5         # Longest quarantine is QUARANTINE * 2 ** (MAX_STRIKES - 1)
+
+    def __init__(self, proxies, quarantine=None):
+        """
+        Initialize the pool.
+
+        Args:
+            proxies: Proxy URLs (e.g. 'http://10.0.0.1:3128')
+            quarantine: Seconds of the first quarantine
+
+        Raises:
+            ValueError: If no proxy is given
+        """
+        self.proxies = list(dict.fromkeys(proxies))
+        if not self.proxies:
+            raise ValueError("ProxyPool needs at least one proxy")
+        self.quarantine = quarantine or self.QUARANTINE
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_option(cls, value):
+        """
+        Build a pool from the --proxies option.
+
+        Args:
+            value: Comma-separated proxy URLs, or a file with one per line
+
+        Returns:
+            ProxyPool
+        """
+        if os.path.isfile(value):
+            with open(value, encoding='utf-8') as f:
+                proxies = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        else:
+            proxies = [proxy.strip() for proxy in value.split(',') if proxy.strip()]
+        return cls(proxies)
+
+    def stats(self, proxy, host=None):
+        """
+        Get the stats of a proxy, or of a proxy for one host.
+
+        Args:
+            proxy: Proxy URL
+            host: Host name (None for the proxy overall)
+
+        Returns:
+            ProxyStats
+        """
+        key = (proxy, host)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ProxyStats()
+        return stats
+
+    def choose(self, host):
+        """
+        Pick the proxy for a request.
+
+        Args:
+            host: Host name the request goes to
+
+        Returns:
+            str: Proxy URL
+        """
+        with self._lock:
+            now = time.monotonic()
+            healthy = [proxy for proxy in self.proxies
+                       if self.stats(proxy).quarantined_until <= now
+                       and self.stats(proxy, host).quarantined_until <= now]
+            if not healthy:
+                # Everything is quarantined: use the proxy released soonest
+                return min(self.proxies, key=lambda proxy: max(self.stats(proxy).quarantined_until,
+                                                               self.stats(proxy, host).quarantined_until))
+            untried = [proxy for proxy in healthy if self.stats(proxy, host).samples == 0]
+            if untried:
+                return random.choice(untried)
+            candidates = random.sample(healthy, min(2, len(healthy)))
+            return min(candidates, key=lambda proxy: self.stats(proxy, host).score())
+
+    def feedback(self, proxy, host, ok, elapsed=None):
+        """
+        Record the outcome of a request sent through a proxy.
+
+        Args:
+            proxy: Proxy URL used
+            host: Host name the request went to
+            ok: True if the proxy delivered a healthy response
+            elapsed: Seconds the request took
+        """
+        with self._lock:
+            now = time.monotonic()
+            for stats in (self.stats(proxy), self.stats(proxy, host)):
+                stats.update(ok, elapsed, self.ALPHA)
+                # Requests still in flight when a proxy is quarantined do not extend it
+                if not ok and stats.quarantined_until <= now and self._unhealthy(stats):
+                    stats.strikes = min(stats.strikes + 1, self.MAX_STRIKES)
+                    stats.quarantined_until = now + self.quarantine * 2 ** (stats.strikes - 1)
+                    # On release a single failed trial quarantines it again, for longer
+                    stats.failures = 0
+                    stats.success = self.MIN_SUCCESS
+
+    def _unhealthy(self, stats):
+        """
+        Check whether a proxy should be quarantined.
+
+        Args:
+            stats: ProxyStats after the latest failure
+
+        Returns:
+            bool
+        """
+        return (stats.failures >= self.MAX_FAILURES
+                or (stats.samples >= self.MIN_SAMPLES and stats.success < self.MIN_SUCCESS))
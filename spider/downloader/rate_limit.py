@@ -0,0 +1,160 @@
+# encoding: utf-8
+"""
+Adaptive per-host request pacing shared by all downloaders.
+"""
+import threading
+import time
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose refill rate follows AIMD (additive increase,
+    multiplicative decrease).
+
+    Every healthy response raises the rate by `increase` requests per second;
+    a 5xx, 429 or timeout multiplies it by `decrease`. Cuts are applied at
+    most once per `cooldown` seconds, so a burst of failures from requests
+    that were already in flight counts as one congestion signal.
+    """
+
+    def __init__(self, rate, max_rate, min_rate=0.5, burst=1, increase=0.1, decrease=0.5, cooldown=1.0):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate: Initial rate in requests per second
+            max_rate: Upper bound for the rate
+            min_rate: Lower bound for the rate
+            burst: Tokens that may accumulate while the host is idle
+            increase: Rate added per healthy response
+            decrease: Factor applied to the rate on failure
+            cooldown: Minimum seconds between two decreases
+        """
+        self.rate = float(rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token, borrowing against future refills if none is left.
+
+        Returns:
+            float: Seconds the caller must wait before sending its request
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def success(self):
+        """Raise the rate after a healthy response"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def failure(self):
+        """Cut the rate after a 5xx, 429 or timeout"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+
+class RateLimiter:
+    """
+    Registry of AdaptiveTokenBucket objects, one per host.
+
+    Buckets are configured from the per-site `rate`, `max_rate` and
+    `latency_target` download settings of the item's kind.
+
+    Usage:
+        wait = limiter.reserve(host, kind)
+        ...
+        limiter.feedback(host, status, elapsed)
+    """
+
+    DEFAULT_RATE = 5         # Requests per second for sites without a `rate` setting
+    DEFAULT_MAX_RATE = 50
+    LATENCY_TARGET = 5.0     # Slower responses do not raise the rate
+
+    def __init__(self, site_settings):
+        """
+        Initialize the limiter.
+
+        Args:
+            site_settings: Dict of kind -> settings (Downloader.SiteSettings)
+        """
+        self.site_settings = site_settings
+        self._buckets = {}
+        self._targets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host, kind=None):
+        """
+        Get the bucket pacing a host, creating it on first use.
+
+        Args:
+            host: Host name
+            kind: Spider kind used to look up the site's settings
+
+        Returns:
+            AdaptiveTokenBucket
+        """
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                settings = self.site_settings.get(kind, {})
+                rate = settings.get('rate', self.DEFAULT_RATE)
+                bucket = self._buckets[host] = AdaptiveTokenBucket(
+                    rate, max(rate, settings.get('max_rate', self.DEFAULT_MAX_RATE)))
+                self._targets[host] = settings.get('latency_target', self.LATENCY_TARGET)
+            return bucket
+
+    def reserve(self, host, kind=None):
+        """
+        Reserve the next request slot for a host.
+
+        Args:
+            host: Host name
+            kind: Spider kind of the item
+
+        Returns:
+            float: Seconds to wait before sending the request
+        """
+        return self.bucket(host, kind).reserve()
+
+    def feedback(self, host, status=None, elapsed=None):
+        """
+        Adjust a host's rate from the outcome of a request.
+
+        Args:
+            host: Host name
+            status: HTTP status code, or None for a timeout/connection error
+            elapsed: Seconds the request took
+        """
+        bucket = self.bucket(host)
+        if status is None or status == 429 or status >= 500:
+            bucket.failure()
+        elif elapsed is None or elapsed <= self._targets.get(host, self.LATENCY_TARGET):
+            bucket.success()
+
+    def rates(self):
+        """
+        Current rate of every host.
+
+        Returns:
+            dict: host -> requests per second
+        """
+        with self._lock:
+            return {host: bucket.rate for host, bucket in self._buckets.items()}
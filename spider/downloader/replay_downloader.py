@@ -0,0 +1,125 @@
+# encoding: utf-8
+import itertools
+from spider.downloader import Downloader
+from spider.downloader.response import Response
+from spider.downloader.retry import RetryScheduler
+from spider.encoding import Encoding
+from spider.utils.utils import Utils
+
+
+class ReplayDownloader(Downloader):
+    """
+    Downloader that serves pages from the PageArchive instead of the network.
+    Feeds the latest archived copy of each item's URL to the callbacks at
+    disk speed, so pages can be re-parsed after a parser fix without a crawl.
+    Requires the archive to be configured (--archive DIR).
+    """
+
+    def __init__(self, items):
+        """
+        Initialize downloader with list of items to replay.
+
+        Args:
+            items: List of objects with 'url' attribute
+        """
+        self.items = items
+
+    @classmethod
+    def select(cls, queryset, number=None):
+        """
+        Select the archived items of a stage to replay.
+
+        Completed, dead-lettered and not yet due items are included: those
+        are the pages to parse again after a parser fix.
+
+        Args:
+            queryset: QuerySet of the stage's Category/Page/ProductUrl documents
+            number: Maximum number of items (None = all)
+
+        Returns:
+            Iterator of the items whose URL is in the archive
+        """
+        if cls.page_archive is None:
+            raise ValueError("ReplayDownloader requires a page archive (--archive DIR)")
+        items = itertools.chain.from_iterable(
+            queryset.filter(url__in=urls) for urls in cls.page_archive.urls()
+        )
+        return itertools.islice(items, number) if number else items
+
+    @classmethod
+    def selects(cls, item):
+        """
+        Check whether select() would pick an item, for stages filtering in Python.
+
+        Args:
+            item: Category, Page or ProductUrl
+
+        Returns:
+            bool: True if the item's URL is archived
+        """
+        if cls.page_archive is None:
+            raise ValueError("ReplayDownloader requires a page archive (--archive DIR)")
+        return cls.page_archive.lookup(item.url) is not None
+
+    def run(self, callback):
+        """
+        Replay all archived items and call callback for each one.
+
+        Args:
+            callback: Function to call for each successfully replayed item
+        """
+        with self.callback_stage(callback) as stage:
+            for item, response in self._results(self._iter_items()):
+                stage.put(item)
+
+    def _results(self, items):
+        """
+        Read items from the archive one at a time.
+
+        Args:
+            items: Iterator of objects with 'url' attribute
+
+        Yields:
+            (item, Response) for each archived page
+        """
+        if self.page_archive is None:
+            raise ValueError("ReplayDownloader requires a page archive (--archive DIR)")
+        for item in items:
+            response = self._download(item)
+            if response is not None:
+                yield item, response
+
+    def _download(self, item):
+        """
+        Load a single item from the archive and set its html.
+
+        Args:
+            item: Object with 'url' attribute
+
+        Returns:
+            Response on success, None otherwise (the failure is logged)
+        """
+        self._count(item, 'attempted')
+        try:
+            record = self.page_archive.lookup(item.url)
+            if record is None:
+                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Not Archived.")
+                self._count(item, 'failed', reason='not_archived')
+                return None
+            html = self.page_archive.read_record(record)
+
+            # Reject truncated pages before decoding them
+            if not Utils.valid_html(html):
+                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Bad HTML.")
+                self._count(item, 'failed', reason=RetryScheduler.BAD_HTML)
+                return None
+
+            # Convert encoding to UTF-8, with the charset found when the page was downloaded
+            with self.timings.timed(item, 'decode'):
+                Encoding.set_utf8_html(item, html, encoding=record.encoding)
+            return self._succeeded(item, Response(item.url, 200, html, from_cache=True))
+
+        except Exception as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Error: {e}")
+            self._count(item, 'failed', reason=RetryScheduler.ERROR)
+        return None
@@ -0,0 +1,32 @@
+# encoding: utf-8
+"""
+Downloaded response shared by all downloaders.
+"""
+
+
+class Response:
+    """
+    A downloaded page, independent of the HTTP library that fetched it.
+
+    Yielded alongside the item by Downloader.iter_results()/aiter_results().
+    """
+
+    def __init__(self, url, status, body, headers=None, from_cache=False):
+        """
+        Initialize the response.
+
+        Args:
+            url: Requested URL
+            status: HTTP status code
+            body: Raw response body (bytes)
+            headers: Response headers (case-insensitive mapping or dict)
+            from_cache: True if the body was served from the ResponseCache
+        """
+        self.url = url
+        self.status = status
+        self.body = body
+        self.headers = headers if headers is not None else {}
+        self.from_cache = from_cache
+
+    def __repr__(self):
+        return f"<Response {self.status} {self.url}>"
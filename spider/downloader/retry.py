@@ -0,0 +1,110 @@
+# encoding: utf-8
+"""
+Persistent retry scheduling for items whose download failed.
+"""
+import random
+from datetime import datetime, timedelta
+from mongoengine.queryset.visitor import Q
+
+
+class RetryScheduler:
+    """
+    Records download failures on Category/Page/ProductUrl documents.
+
+    Each failure increments `retry_time`, stores the failure class in
+    `failure` and pushes `retry_at` out with exponential backoff and jitter.
+    After `max_attempts` failures the item is moved to the dead-letter state
+    (`dead=True`) and no longer selected by due().
+
+    Usage:
+        pages = Page.from_kind(kind).filter(RetryScheduler.due(), completed=False)
+    """
+
+    # Failure classes recorded in the item's `failure` field
+    TIMEOUT = 'timeout'
+    CONNECTION = 'connection'
+    HTTP = 'http'
+    BAD_HTML = 'bad_html'
+    NOT_HTML = 'not_html'      # Aborted: Content-Type is not a page
+    TOO_LARGE = 'too_large'    # Aborted: body over the site's max_bytes
+    ERROR = 'error'
+
+    BASE_DELAY = 300        # Seconds before the first retry
+    MAX_DELAY = 86400       # Longest wait between two attempts
+
+    def __init__(self, max_attempts=5, base_delay=None, max_delay=None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_attempts: Failures after which an item is dead-lettered
+            base_delay: Backoff after the first failure, in seconds
+            max_delay: Upper bound for the backoff, in seconds
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay or self.BASE_DELAY
+        self.max_delay = max_delay or self.MAX_DELAY
+
+    def backoff(self, attempt):
+        """
+        Delay before the next attempt.
+
+        Doubles with every attempt up to max_delay; the second half of the
+        delay is random, so items that failed together do not retry together.
+
+        Args:
+            attempt: Number of failures so far (1 for the first)
+
+        Returns:
+            float: Delay in seconds
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def record_failure(self, item, failure):
+        """
+        Record a failed download on the item and save it.
+
+        Args:
+            item: Category, Page or ProductUrl
+            failure: Failure class (TIMEOUT, CONNECTION, HTTP, BAD_HTML, ERROR)
+        """
+        item.retry_time = (item.retry_time or 0) + 1
+        item.failure = failure
+        if item.retry_time >= self.max_attempts:
+            item.dead = True
+            item.retry_at = None
+        else:
+            item.retry_at = datetime.utcnow() + timedelta(seconds=self.backoff(item.retry_time))
+        if hasattr(item, 'save'):
+            item.save()
+
+    @staticmethod
+    def is_due(item, now=None):
+        """
+        Check whether an item may be downloaded now.
+
+        Args:
+            item: Category, Page or ProductUrl
+            now: Current UTC time (default: utcnow)
+
+        Returns:
+            bool: False if the item is dead-lettered or waiting for its retry
+        """
+        if getattr(item, 'dead', False) is True:
+            return False
+        retry_at = getattr(item, 'retry_at', None)
+        return not isinstance(retry_at, datetime) or retry_at <= (now or datetime.utcnow())
+
+    @staticmethod
+    def due(now=None):
+        """
+        Query matching items that may be downloaded now.
+
+        Args:
+            now: Current UTC time (default: utcnow)
+
+        Returns:
+            Q excluding dead-lettered items and items not yet due
+        """
+        return Q(dead__ne=True) & (Q(retry_at=None) | Q(retry_at__lte=now or datetime.utcnow()))
@@ -0,0 +1,223 @@
+# encoding: utf-8
+"""
+Shared keep-alive HTTP sessions for the requests-based downloaders.
+"""
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, NewConnectionError
+from spider.downloader.compression import ACCEPT_ENCODING
+from spider.downloader.dns import DnsCache
+from spider.downloader.timing import RequestTimer
+
+
+class SessionPool:
+    """
+    Process-wide registry of pooled requests.Session objects.
+
+    Sessions are keyed by pool size so every downloader running with the same
+    worker count reuses the same warm connections instead of paying a new TCP
+    handshake per item.
+    """
+
+    # Number of per-host connection pools kept open (a run only touches a few hosts)
+    HOST_POOLS = 16
+
+    dns_cache = None        # DnsCache used by new connections (None = system resolver)
+
+    _sessions = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, pool_size=1):
+        """
+        Get the shared session for a given worker count.
+
+        Args:
+            pool_size: Number of threads that will use the session concurrently
+
+        Returns:
+            requests.Session with keep-alive connection pools
+        """
+        pool_size = max(1, int(pool_size))
+        with cls._lock:
+            session = cls._sessions.get(pool_size)
+            if session is None:
+                session = cls._sessions[pool_size] = cls.build(pool_size)
+            return session
+
+    @classmethod
+    def build(cls, pool_size):
+        """
+        Build a new session with connection pools sized to the worker count.
+
+        Each host gets its own pool of at most pool_size connections. Workers
+        block for a free connection instead of opening throwaway extras.
+
+        Args:
+            pool_size: Maximum connections kept per host
+
+        Returns:
+            requests.Session
+        """
+        session = requests.Session()
+        adapter = DnsCacheAdapter(pool_connections=cls.HOST_POOLS, pool_maxsize=pool_size, pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        return session
+
+    @classmethod
+    def prewarm(cls, session, url, connections):
+        """
+        Open idle connections to the origin of a URL in a session's pool.
+
+        The DNS lookup and TCP/TLS handshakes happen here, in parallel, so
+        the first requests of a batch find warm connections waiting.
+
+        urllib3 has no public way to check connections out of a pool, so
+        this uses HTTPConnectionPool._get_conn/_put_conn; requirements.txt
+        pins urllib3 to the major version they are tested against.
+
+        Args:
+            session: Session from get()
+            url: Any URL on the origin (scheme, host and port are used)
+            connections: Number of connections to open
+
+        Returns:
+            int: Connections opened
+        """
+        pool = session.get_adapter(url).poolmanager.connection_from_url(url)
+        connections = min(connections, pool.pool.maxsize)
+        # Take the connections out of the pool first so each one is distinct
+        conns = [pool._get_conn(timeout=0) for _ in range(connections)]
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(conns))) as executor:
+                opened = list(executor.map(cls._connect, conns))
+        finally:
+            for conn in conns:
+                pool._put_conn(conn)
+        return sum(opened)
+
+    @staticmethod
+    def _connect(conn):
+        """
+        Connect a pooled connection unless it already is.
+
+        Args:
+            conn: urllib3 HTTPConnection
+
+        Returns:
+            bool: True if a new connection was opened
+        """
+        if conn.is_connected:
+            return False
+        try:
+            conn.connect()
+            return True
+        except OSError:
+            return False
+
+    @classmethod
+    def close_all(cls):
+        """Close every shared session and drop its pooled connections"""
+        with cls._lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+
+
+class DnsCacheConnection:
+    """
+    Mixin resolving the host of a new urllib3 connection through
+    SessionPool.dns_cache instead of the system resolver.
+
+    The DNS and connect (TCP and TLS) time of a connection opened for a
+    request are added to the request's RequestTimer. Without the DNS cache
+    the system resolver runs inside the connect and is counted there.
+    """
+
+    def connect(self):
+        """Connect, adding the time taken to the current RequestTimer"""
+        timer = RequestTimer.current()
+        if timer is None:
+            return super().connect()
+        started = time.perf_counter()
+        dns = timer.phases.get('dns', 0.0)
+        try:
+            return super().connect()
+        finally:
+            resolved = timer.phases.get('dns', 0.0) - dns
+            timer.add('connect', time.perf_counter() - started - resolved)
+
+    def _new_conn(self):
+        """Open the socket to the host's cached address"""
+        dns_cache = SessionPool.dns_cache
+        host = self._dns_host
+        if dns_cache is None or DnsCache.is_ip(host):
+            return super()._new_conn()
+        started = time.perf_counter()
+        try:
+            infos = dns_cache.resolve(host, self.port)
+        except OSError as e:
+            raise NameResolutionError(self.host, self, e) from e
+        finally:
+            timer = RequestTimer.current()
+            if timer is not None:
+                timer.add('dns', time.perf_counter() - started)
+        if not infos:
+            dns_cache.invalidate(host)
+            raise NameResolutionError(self.host, self, socket.gaierror(socket.EAI_NONAME, "No addresses"))
+        # Connect to a cached address; Host header and TLS still use the name
+        error = None
+        for info in infos:
+            self._dns_host = info[4][0]
+            try:
+                return super()._new_conn()
+            except NewConnectionError as e:
+                error = e
+            finally:
+                self._dns_host = host
+        dns_cache.invalidate(host)
+        raise error
+
+
+class DnsCacheHTTPConnection(DnsCacheConnection, HTTPConnection):
+    """HTTP connection resolved through the DNS cache"""
+
+
+class DnsCacheHTTPSConnection(DnsCacheConnection, HTTPSConnection):
+    """HTTPS connection resolved through the DNS cache (SNI and certificate checks use the host name)"""
+
+
+class DnsCacheHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool opening DnsCacheHTTPConnections"""
+
+    ConnectionCls = DnsCacheHTTPConnection
+
+
+class DnsCacheHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool opening DnsCacheHTTPSConnections"""
+
+    ConnectionCls = DnsCacheHTTPSConnection
+
+
+class DnsCacheAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools open connections through the
+    shared DNS cache.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Create the pool manager and swap in the DNS-caching pool classes"""
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': DnsCacheHTTPConnectionPool,
+            'https': DnsCacheHTTPSConnectionPool,
+        }
@@ -0,0 +1,355 @@
+# encoding: utf-8
+"""
+Per-request timing histograms, keyed by site, stage and request phase.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+
+
+class Histogram:
+    """
+    Log-linear histogram of durations in the style of HdrHistogram.
+
+    Durations are counted in integer microseconds. Values below
+    2 ** SUB_BUCKET_BITS get a bucket each; above that every power of two is
+    split into 2 ** (SUB_BUCKET_BITS - 1) buckets, so a percentile is off by
+    less than 1% whatever the range, in a few hundred counters at most.
+    """
+
+    SUB_BUCKET_BITS = 8     # Relative precision of 1 / 2 ** (SUB_BUCKET_BITS - 1)
+
+    def __init__(self):
+        self.counts = {}        # Bucket index -> samples
+        self.count = 0
+        self.total = 0          # Sum of the samples in microseconds
+        self.max_value = 0
+
+    def record(self, seconds):
+        """
+        Count a duration.
+
+        Args:
+            seconds: Duration in seconds (negative values count as 0)
+        """
+        value = max(0, int(seconds * 1000000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max_value = max(self.max_value, value)
+
+    def merge(self, other):
+        """
+        Add the samples of another histogram to this one.
+
+        Args:
+            other: Histogram
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max_value = max(self.max_value, other.max_value)
+
+    def percentile(self, percentile):
+        """
+        Get the duration below which a percentage of the samples fall.
+
+        Args:
+            percentile: Percentage between 0 and 100
+
+        Returns:
+            float: Seconds (highest value of the bucket, capped at the maximum),
+                or None without samples
+        """
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest(index), self.max_value) / 1000000
+        return self.max_value / 1000000
+
+    def count_at_or_below(self, seconds):
+        """
+        Count the samples up to a duration (for cumulative buckets).
+
+        Args:
+            seconds: Upper bound (samples in its bucket are included)
+
+        Returns:
+            int
+        """
+        limit = self._index(max(0, int(seconds * 1000000)))
+        return sum(count for index, count in self.counts.items() if index <= limit)
+
+    @property
+    def max(self):
+        """Longest duration recorded, in seconds"""
+        return self.max_value / 1000000
+
+    @property
+    def mean(self):
+        """Mean duration, in seconds (None without samples)"""
+        return self.total / self.count / 1000000 if self.count else None
+
+    @classmethod
+    def _index(cls, value):
+        bits = cls.SUB_BUCKET_BITS
+        if value < 1 << bits:
+            return value
+        shift = value.bit_length() - bits
+        return (shift << (bits - 1)) + (value >> shift)
+
+    @classmethod
+    def _highest(cls, index):
+        bits = cls.SUB_BUCKET_BITS
+        if index < 1 << bits:
+            return index
+        shift = (index >> (bits - 1)) - 1
+        mantissa = index - (shift << (bits - 1))
+        return ((mantissa + 1) << shift) - 1
+
+
+class RequestTimer:
+    """
+    Timestamps of one HTTP request, shared with the connection code that
+    serves it through a context variable (so it follows the request into
+    urllib3 and aiohttp without being passed down).
+
+    DNS and connect time are added by the connection layer when the request
+    opens a new connection; time to first byte is what is left of the wait
+    for the response headers.
+
+    Usage:
+        with RequestTimer() as timer:
+            response = session.get(url, stream=True)
+            timer.headers_received()
+            body = response.content
+            timer.body_received()
+        timer.durations()
+    """
+
+    _current = contextvars.ContextVar('spider_request_timer', default=None)
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_byte = None
+        self.finished = None
+        self.phases = {}        # Phase -> seconds added by the connection layer
+        self._token = None
+
+    def __enter__(self):
+        self._token = self._current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._current.reset(self._token)
+        return False
+
+    @classmethod
+    def current(cls):
+        """
+        Get the timer of the request running in this thread or task.
+
+        Returns:
+            RequestTimer, or None outside a timed request
+        """
+        return cls._current.get()
+
+    def add(self, phase, seconds):
+        """
+        Add time spent in a phase.
+
+        Args:
+            phase: Phase name ('dns', 'connect')
+            seconds: Duration
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def headers_received(self):
+        """Mark the response headers as received (the first call counts)"""
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+
+    def body_received(self):
+        """Mark the response body as read (the first call counts)"""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def durations(self):
+        """
+        Get the time spent in each phase of the request.
+
+        Returns:
+            dict: Phase -> seconds, for the phases the request went through
+        """
+        durations = dict(self.phases)
+        if self.first_byte is not None:
+            durations['ttfb'] = max(0.0, self.first_byte - self.started - sum(self.phases.values()))
+            if self.finished is not None:
+                durations['transfer'] = self.finished - self.first_byte
+        return durations
+
+
+class Timings:
+    """
+    Thread-safe registry of Histograms keyed by (site, stage, phase).
+
+    The site is the item's kind and the stage its class (Category, Page,
+    ProductUrl), so one run's fetch, paginate, dig and parse stages are
+    reported apart. Phases are those of PHASES.
+
+    Usage:
+        timings.record('tmall', 'Page', 'ttfb', 0.12)
+        with timings.timed(item, 'callback'):
+            callback(item)
+        timings.percentiles()[('tmall', 'Page', 'ttfb')]['p99']
+        print(timings.summary())
+    """
+
+    PHASES = ('dns', 'connect', 'ttfb', 'transfer', 'decode', 'callback')
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._histograms)
+
+    def record(self, site, stage, phase, seconds):
+        """
+        Count the duration of a phase.
+
+        Args:
+            site: Site kind (e.g. 'tmall')
+            stage: Stage name (the item class name)
+            phase: Phase name
+            seconds: Duration
+        """
+        key = (site, stage, phase)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.record(seconds)
+
+    def record_item(self, item, phase, seconds):
+        """
+        Count the duration of a phase for an item's site and stage.
+
+        Args:
+            item: Object with 'kind' attribute
+            phase: Phase name
+            seconds: Duration
+        """
+        self.record(item.kind, item.__class__.__name__, phase, seconds)
+
+    def record_request(self, item, timer):
+        """
+        Count the phases of a finished request.
+
+        Args:
+            item: Object with 'kind' attribute
+            timer: RequestTimer of the request
+        """
+        for phase, seconds in timer.durations().items():
+            self.record_item(item, phase, seconds)
+
+    @contextlib.contextmanager
+    def timed(self, item, phase):
+        """
+        Time a block as a phase of an item (also when it raises).
+
+        Args:
+            item: Object with 'kind' attribute
+            phase: Phase name
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_item(item, phase, time.perf_counter() - started)
+
+    def keys(self):
+        """
+        Get the (site, stage, phase) keys with samples.
+
+        Returns:
+            list
+        """
+        with self._lock:
+            return list(self._histograms)
+
+    def histogram(self, site, stage, phase):
+        """
+        Get a copy of the histogram of a phase.
+
+        Args:
+            site: Site kind
+            stage: Stage name
+            phase: Phase name
+
+        Returns:
+            Histogram, or None if nothing was recorded
+        """
+        with self._lock:
+            histogram = self._histograms.get((site, stage, phase))
+            if histogram is None:
+                return None
+            copy = Histogram()
+            copy.merge(histogram)
+            return copy
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """
+        Get the percentiles of every recorded phase.
+
+        Args:
+            percentiles: Percentages to compute
+
+        Returns:
+            dict: (site, stage, phase) -> {'count', 'p50', ..., 'max'}, in seconds
+        """
+        with self._lock:
+            stats = {}
+            for key, histogram in self._histograms.items():
+                row = {'count': histogram.count}
+                for percentile in percentiles:
+                    row[f"p{percentile:g}"] = histogram.percentile(percentile)
+                row['max'] = histogram.max
+                stats[key] = row
+            return stats
+
+    def summary(self, percentiles=PERCENTILES):
+        """
+        Format the percentiles as a table, in milliseconds.
+
+        Args:
+            percentiles: Percentages to show
+
+        Returns:
+            str: The table, or an empty string if nothing was recorded
+        """
+        stats = self.percentiles(percentiles)
+        if not stats:
+            return ''
+        order = {phase: i for i, phase in enumerate(self.PHASES)}
+        columns = [f"p{percentile:g}" for percentile in percentiles] + ['max']
+        lines = [f"{'site':<12} {'stage':<12} {'phase':<10} {'count':>8}"
+                 + ''.join(f" {column + ' ms':>10}" for column in columns)]
+        for key in sorted(stats, key=lambda key: (str(key[0]), str(key[1]), order.get(key[2], len(order)))):
+            row = stats[key]
+            lines.append(f"{str(key[0]):<12} {str(key[1]):<12} {key[2]:<10} {row['count']:>8}"
+                         + ''.join(f" {row[column] * 1000:>10.1f}" for column in columns))
+        return '\n'.join(lines)
+
+    def reset(self):
+        """Drop every recorded sample"""
+        with self._lock:
+            self._histograms.clear()
@@ -1,7 +1,15 @@
 # encoding: utf-8
+import itertools
+import threading
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from spider.downloader import Downloader
+from spider.downloader.session import SessionPool
+from spider.downloader.cache import ClaimHeld
+from spider.downloader.circuit import CircuitOpenError
+from spider.downloader.limits import ResponseRejected
+from spider.downloader.response import Response
+from spider.downloader.retry import RetryScheduler
 from spider.encoding import Encoding
 from spider.utils.utils import Utils
 
@@ -9,9 +17,12 @@ from spider.utils.utils import Utils
 class TyDownloader(Downloader):
     """
     Multi-threaded downloader using ThreadPoolExecutor.
-    Downloads multiple items concurrently.
+    Downloads multiple items concurrently over a shared keep-alive session
+    whose connection pool is sized to the worker count.
     """
 
+    _hedge_pool = None  # Executor for hedged requests, set while a run is in progress
+
     def __init__(self, items):
         """
         Initialize downloader with list of items to download.
@@ -20,61 +31,265 @@ class TyDownloader(Downloader):
             items: List of objects with 'url' attribute
         """
         self.items = items
-        self.max_workers = 20  # Matches Ruby's max_concurrency
+        self.max_workers = self.concurrency or 20  # Matches Ruby's max_concurrency
+        self.window = 2 * self.max_workers  # Futures submitted but not yet handled
+
+    def max_concurrency(self):
+        """
+        Maximum number of concurrent downloads.
+
+        Returns:
+            int: Number of download threads
+        """
+        return self.max_workers
 
     def run(self, callback):
         """
         Download all items concurrently using thread pool and call callback for each.
 
+        Callbacks run on a separate CallbackStage with `callback_workers`
+        threads, so parsing and saving do not hold up the download loop.
+
         Args:
             callback: Function to call for each successfully downloaded item
         """
+        with self.callback_stage(callback) as stage:
+            for item, response in self._results(self._iter_items()):
+                stage.put(item)
+
+    def _results(self, items):
+        """
+        Download items on the thread pool and yield them as they complete.
+
+        At most `window` items are submitted at any time, so memory stays flat
+        however many items the iterable (e.g. a Mongo cursor) yields.
+
+        Args:
+            items: Iterator of objects with 'url' attribute
+
+        Yields:
+            (item, Response) for each successful download
+        """
+        host_slots = {}
+        if self.hedger is not None:
+            # Requests run here so a worker can wait on them with a deadline
+            self._hedge_pool = ThreadPoolExecutor(max_workers=2 * self.max_workers)
+        try:
+            yield from self._window(self._prewarm(items, self._session()), host_slots)
+        finally:
+            if self._hedge_pool is not None:
+                self._hedge_pool.shutdown(wait=False)
+                self._hedge_pool = None
+
+    def _window(self, items, host_slots):
+        """
+        Run the sliding window of downloads for _results().
+
+        Args:
+            items: Iterator of objects with 'url' attribute
+            host_slots: Dict of host -> threading.BoundedSemaphore shared by the run
+
+        Yields:
+            (item, Response) for each successful download
+        """
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submit all download tasks
-            future_to_item = {executor.submit(self._fetch, item): item for item in self.items}
+            # Fill the window, then submit one new item per completed future
+            in_flight = {}
+            duplicates = {}     # URL in flight -> items coalesced into its download
+            self._submit(executor, host_slots, itertools.islice(items, self.window), in_flight, duplicates)
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                results = []
+                for future in done:
+                    item = in_flight.pop(future)
+                    waiting = duplicates.pop(item.url, [])
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Error processing {item.url}: {e}")
+                        response = None
+                    if response is not None:
+                        results.append((item, response))
+                    results.extend(self._fan_out(item, waiting, response))
 
-            # Process completed downloads
-            for future in as_completed(future_to_item):
-                item = future_to_item[future]
-                try:
-                    success = future.result()
-                    if success:
-                        callback(item)
-                except Exception as e:
-                    self.logger.error(f"Error processing {item.url}: {e}")
+                # Hand results over before refilling, so items pulled but not
+                # yet consumed never exceed the window
+                yield from results
 
-    def _fetch(self, item):
+                pending = len(in_flight) + sum(len(waiting) for waiting in duplicates.values())
+                self._submit(executor, host_slots, itertools.islice(items, self.window - pending),
+                             in_flight, duplicates)
+
+    def _submit(self, executor, host_slots, items, in_flight, duplicates):
         """
-        Fetch a single item (executed in thread pool).
+        Submit downloads for _window(), coalescing items whose URL is
+        already in flight into that download.
 
         Args:
+            executor: ThreadPoolExecutor running the downloads
+            host_slots: Dict of host -> threading.BoundedSemaphore shared by the run
+            items: Iterable of objects with 'url' attribute
+            in_flight: Dict of future -> item, updated in place
+            duplicates: Dict of URL -> coalesced items, updated in place
+        """
+        for item in items:
+            if item.url in duplicates:
+                duplicates[item.url].append(item)
+                continue
+            duplicates[item.url] = []
+            in_flight[executor.submit(self._fetch_limited, host_slots, item)] = item
+
+    def _fetch_limited(self, host_slots, item):
+        """
+        Download a single item while holding a slot for its host.
+
+        Args:
+            host_slots: Dict of host -> threading.BoundedSemaphore shared by the run
             item: Object with 'url' attribute
 
         Returns:
-            bool: True if successful, False otherwise
+            Response on success, None otherwise
         """
-        try:
-            response = requests.get(item.url, timeout=30)
+        host = self.host_of(getattr(item, 'url', None))
+        slot = host_slots.get(host)
+        if slot is None:
+            limit = self.max_host_concurrency(getattr(item, 'kind', None))
+            slot = host_slots.setdefault(host, threading.BoundedSemaphore(limit))
+        with slot:
+            return self._download(item)
+
+    def _send(self, session, item, request_args):
+        """
+        Send the GET request for an item, hedging it when it runs long.
 
-            if response.status_code == 200:
-                html = response.content
+        If the request is still running after the host's p95 latency and the
+        hedge budget allows, a duplicate is sent and the first successful
+        response wins. A blocking requests call cannot be interrupted, so the
+        losing request is cancelled if it has not started and otherwise left
+        to finish in the background with its response discarded.
 
-                # Convert encoding to UTF-8
-                Encoding.set_utf8_html(item, html)
+        Args:
+            session: requests.Session to download with
+            item: Object with 'url' attribute
+            request_args: Extra request arguments (conditional headers, proxy)
 
-                # Validate HTML
-                if not Utils.valid_html(item.html):
+        Returns:
+            requests.Response
+        """
+        delay = self.hedger.delay(self.host_of(item.url)) if self._hedge_pool is not None else None
+        if delay is None:
+            return session.get(item.url, timeout=30, stream=True, **request_args)
+
+        primary = self._hedge_pool.submit(session.get, item.url, timeout=30, stream=True, **request_args)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.hedger.acquire():
+            return primary.result()
+        backup = self._hedge_pool.submit(session.get, item.url, timeout=30, stream=True, **request_args)
+        return self._first_success([primary, backup])
+
+    @staticmethod
+    def _first_success(futures):
+        """
+        Wait for the first future that completes without an exception.
+
+        Args:
+            futures: Futures racing for the same request
+
+        Returns:
+            Result of the winning future (the others are cancelled)
+
+        Raises:
+            Exception: The last error if every future failed
+        """
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        if not loser.cancel():
+                            # Already sent: drop its connection once it answers
+                            loser.add_done_callback(TyDownloader._close_loser)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @staticmethod
+    def _close_loser(future):
+        """
+        Close the streamed response of a request that lost a hedge race.
+
+        Args:
+            future: Finished future of the losing request
+        """
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
+
+    def _session(self):
+        """
+        Get the shared session sized for this downloader's workers.
+
+        Returns:
+            requests.Session
+        """
+        # Hedged requests may need a second connection per worker
+        return SessionPool.get(self.max_workers * (2 if self.hedger is not None else 1))
+
+    def _download(self, item):
+        """
+        Download a single item and set its html.
+
+        Args:
+            item: Object with 'url' attribute
+
+        Returns:
+            Response on success, None otherwise (the failure is logged)
+        """
+        self._count(item, 'attempted')
+        try:
+            status, html, headers, cached = self._get(self._session(), item)
+
+            if status == 200:
+                # Reject truncated pages before decoding them (streaming cuts them short on purpose)
+                cut = self._cut_short(item)
+                if not cut and not Utils.valid_html(html):
                     self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Bad HTML.")
-                    return False
-                else:
-                    return True
+                    self._failed(item, RetryScheduler.BAD_HTML)
+                    return None
+
+                # Convert encoding to UTF-8
+                with self.timings.timed(item, 'decode'):
+                    Encoding.set_utf8_html(item, html, headers)
+                if not cached and not cut:
+                    self._store_response(item, status, html, headers)
+                return self._succeeded(item, Response(item.url, status, html, headers, from_cache=cached))
             else:
-                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP {response.status_code}.")
-                return False
+                self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP {status}.")
+                self._failed(item, RetryScheduler.HTTP)
+                return None
 
-        except (requests.Timeout, requests.ConnectionError) as e:
+        except CircuitOpenError:
+            # Host is down: leave the item for a later run without recording a retry failure
+            self.logger.warning(f"{item.__class__.__name__} {item.kind} {item.url} Circuit Open.")
+            self._count(item, 'skipped', reason='circuit_open')
+            return None
+        except ClaimHeld:
+            # Another run is downloading the page: leave the item for a later run
+            self.logger.warning(f"{item.__class__.__name__} {item.kind} {item.url} Claimed By Another Run.")
+            self._count(item, 'skipped', reason='claimed')
+        except ResponseRejected as e:
+            self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Rejected: {e}.")
+            self._failed(item, e.failure)
+            return None
+        except requests.RequestException as e:
             self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} HTTP Connection Error: {e}")
-            return False
+            self._failed(item, RetryScheduler.TIMEOUT if isinstance(e, requests.Timeout) else RetryScheduler.CONNECTION)
+            return None
         except Exception as e:
             self.logger.error(f"{item.__class__.__name__} {item.kind} {item.url} Error: {e}")
-            return False
+            self._failed(item, RetryScheduler.ERROR)
+            return None
+        finally:
+            self._release(item)
@@ -3,12 +3,28 @@
 Encoding conversion module for handling different character encodings
 from e-commerce sites.
 """
+import codecs
+import re
+from urllib.parse import urlsplit
+
+
+def _question_mark(error):
+    """Codec error handler writing '?' for undefined bytes while decoding"""
+    return '?', error.end
+
+
+codecs.register_error('spider-question-mark', _question_mark)
 
 
 class Encoding:
     """
     Handles character encoding conversion for different e-commerce sites.
     Mimics Ruby's Spider::Encoding module.
+
+    The charset of a page is taken from, in order: a byte order mark, the
+    Content-Type header, a <meta charset> near the top of the page, and
+    otherwise guessed by trying UTF-8, the encoding learned for the host
+    and the site's encoding in Map.
     """
 
     # Encoding map for different sites
@@ -21,33 +37,315 @@ class Encoding:
         "gome": "UTF-8"
     }
 
+    # Declared charsets decoded with a superset, as browsers do
+    Supersets = {
+        "gb2312": "gb18030",
+        "gbk": "gb18030",
+        "ascii": "cp1252",
+        "iso8859_1": "cp1252"
+    }
+
+    Hosts = {}              # Host -> charset learned from its pages
+    SNIFF_BYTES = 4096      # Head of the page searched for <meta charset>
+    GUESS_BYTES = 65536     # Bytes of an undeclared page a guessed charset must decode
+
+    HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+    NON_ASCII = re.compile(rb'[\x80-\xff]')
+    META_CHARSET = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+    BOMS = (
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16")
+    )
+
     @staticmethod
-    def set_utf8_html(item, html):
+    def set_utf8_html(item, html, headers=None, encoding=None):
         """
         Convert HTML from origin encoding to UTF-8 and set it on the item.
+        Raw bytes are also kept on item.raw_html, and the charset they were
+        decoded with on item.encoding, for the parse pipeline.
+
+        Items whose class declares `html = LazyHtml()` (the models) are only
+        decoded when their html is first read; parsers take raw_html.
 
         Args:
             item: Object with 'kind' attribute and 'html' attribute to set
             html: Raw HTML bytes or string
+            headers: Response headers (for the Content-Type charset)
+            encoding: Charset already resolved for html (skips detection)
 
         Returns:
             The item with html attribute set to UTF-8 string
         """
-        origin_encoding = Encoding.Map.get(item.kind, "UTF-8")
-
         # Handle both bytes and string input
         if isinstance(html, bytes):
-            # Decode bytes to UTF-8 string, replacing invalid characters
-            try:
-                item.html = html.decode(origin_encoding, errors='replace')
-            except (LookupError, UnicodeDecodeError):
-                # Fallback to UTF-8 if origin encoding fails
-                item.html = html.decode('utf-8', errors='replace')
+            item.raw_html = html
+            item.encoding = Encoding.codec(encoding) or Encoding.resolve(html, headers, item.kind,
+                                                                         getattr(item, 'url', None))
+            if isinstance(getattr(type(item), 'html', None), LazyHtml):
+                item.html = None
+            else:
+                item.html, _ = Encoding.decode(html, encoding=item.encoding)
+        elif html and '\ufffd' in html:
+            # Replace undefined characters with "?"
+            item.html = html.replace('\ufffd', '?')
         else:
             # Already a string
             item.html = html
 
-        # Replace undefined characters with "?"
-        item.html = item.html.replace('\ufffd', '?')
-
         return item
+
+    @staticmethod
+    def decode(body, headers=None, kind=None, url=None, encoding=None):
+        """
+        Decode a page, replacing undefined bytes with "?" in the same pass.
+
+        Args:
+            body: Raw HTML bytes
+            headers: Response headers
+            kind: Site kind (for Map)
+            url: Page URL (for the per-host charset)
+            encoding: Charset already resolved for body (skips detection)
+
+        Returns:
+            tuple: (html, encoding) - the decoded string and the charset used
+        """
+        encoding = Encoding.codec(encoding) or Encoding.resolve(body, headers, kind, url)
+
+        # Pure ASCII decodes the same in every ASCII-compatible charset
+        if not encoding.startswith(('utf_16', 'utf_32')) and body.isascii():
+            return body.decode('ascii'), encoding
+        return body.decode(encoding, errors='spider-question-mark'), encoding
+
+    @staticmethod
+    def resolve(body, headers=None, kind=None, url=None):
+        """
+        Find the charset of a page without decoding it.
+
+        Args:
+            body: Raw HTML bytes
+            headers: Response headers
+            kind: Site kind (for Map)
+            url: Page URL (for the per-host charset)
+
+        Returns:
+            str: Python codec name
+        """
+        bom = Encoding.bom(body)
+        if bom is not None:
+            return bom
+        host = Encoding.host_of(url)
+        declared = Encoding.declared(body, headers)
+        if declared is not None:
+            Encoding.learn(host, declared)
+            return declared
+
+        candidates = Encoding.guesses(kind, host)
+        start = Encoding.NON_ASCII.search(body)
+        if start is None:
+            return candidates[0]
+        # No declaration: take the first guess the text from the first
+        # non-ASCII byte on is valid in
+        sample = body[start.start():start.start() + Encoding.GUESS_BYTES]
+        final = start.start() + Encoding.GUESS_BYTES >= len(body)
+        for candidate in candidates:
+            try:
+                codecs.getincrementaldecoder(candidate)().decode(sample, final)
+            except UnicodeDecodeError:
+                continue
+            Encoding.learn(host, candidate)
+            return candidate
+        # Broken everywhere: the host's or site's own charset is most likely
+        return candidates[1] if len(candidates) > 1 else candidates[0]
+
+    @staticmethod
+    def markup(item):
+        """
+        Get what to hand an HTML parser for an item.
+
+        Downloaded pages are passed as raw bytes with their charset, so the
+        parser decodes them natively and no Python string of the page is
+        built. libxml2 aborts on bytes invalid in a charset it decodes
+        through iconv, so pages not in UTF-8 are passed as bytes only if
+        they decode cleanly.
+
+        Args:
+            item: Object with 'html' and optionally 'raw_html' and 'encoding'
+
+        Returns:
+            tuple: (markup, encoding) - raw bytes and the charset label, or
+                the html string and None
+        """
+        raw_html = getattr(item, 'raw_html', None)
+        encoding = getattr(item, 'encoding', None)
+        if isinstance(raw_html, bytes) and isinstance(encoding, str):
+            try:
+                utf8 = codecs.lookup(encoding).name in ('utf-8', 'utf-8-sig')
+            except LookupError:
+                return item.html, None
+            # libxml2 decodes UTF-8 itself and replaces invalid bytes, so no check is needed
+            if utf8:
+                return raw_html, 'utf-8'
+            if Encoding.decodes_cleanly(raw_html, encoding):
+                return raw_html, encoding.replace('_', '-')
+        return item.html, None
+
+    @staticmethod
+    def decodes_cleanly(body, encoding, chunk_size=65536):
+        """
+        Check that a body is valid in a charset, a chunk at a time, so the
+        decoded page is never held in memory.
+
+        Args:
+            body: Raw HTML bytes
+            encoding: Python codec name
+            chunk_size: Bytes decoded at a time
+
+        Returns:
+            bool
+        """
+        if body.isascii():
+            return True
+        decoder = codecs.getincrementaldecoder(encoding)()
+        view = memoryview(body)
+        try:
+            for start in range(0, len(body), chunk_size):
+                decoder.decode(view[start:start + chunk_size])
+            decoder.decode(b'', True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    @staticmethod
+    def bom(body):
+        """
+        Find the charset given by a byte order mark.
+
+        Args:
+            body: Raw HTML bytes
+
+        Returns:
+            str: Python codec name, or None without a byte order mark
+        """
+        for bom, name in Encoding.BOMS:
+            if body.startswith(bom):
+                return Encoding.codec(name)
+        return None
+
+    @staticmethod
+    def declared(body, headers=None):
+        """
+        Find the charset a page declares in its headers or <meta> tags.
+
+        Args:
+            body: Raw HTML bytes
+            headers: Response headers
+
+        Returns:
+            str: Python codec name, or None if nothing usable is declared
+        """
+        if headers:
+            content_type = headers.get('Content-Type') or headers.get('content-type')
+            if isinstance(content_type, str):
+                match = Encoding.HEADER_CHARSET.search(content_type)
+                codec = Encoding.codec(match.group(1)) if match else None
+                if codec:
+                    return codec
+        match = Encoding.META_CHARSET.search(body, 0, Encoding.SNIFF_BYTES)
+        if match:
+            return Encoding.codec(match.group(1).decode('ascii'))
+        return None
+
+    @staticmethod
+    def guesses(kind=None, host=None):
+        """
+        Charsets to try for a page that declares none.
+
+        UTF-8 goes first: multi-byte text in another charset is almost never
+        valid UTF-8, so it only matches UTF-8 pages (e.g. a UTF-8 subdomain
+        of a GB18030 site).
+
+        Args:
+            kind: Site kind (for Map)
+            host: Host name (for the learned charset)
+
+        Returns:
+            list: Python codec names, most likely first
+        """
+        names = ['utf-8', Encoding.Hosts.get(host), Encoding.Map.get(kind, 'UTF-8')]
+        codecs_ = [Encoding.codec(name) for name in names if name]
+        return list(dict.fromkeys(codec for codec in codecs_ if codec))
+
+    @staticmethod
+    def learn(host, encoding):
+        """
+        Remember the charset of a host's pages for pages that declare none.
+
+        Args:
+            host: Host name (None is ignored)
+            encoding: Python codec name
+        """
+        if host is not None:
+            Encoding.Hosts[host] = encoding
+
+    @staticmethod
+    def codec(name):
+        """
+        Normalize a charset label to a Python codec name.
+
+        Args:
+            name: Charset label (e.g. 'GBK', 'utf8')
+
+        Returns:
+            str: Codec name (superset where one applies), or None if unknown
+        """
+        if not name:
+            return None
+        try:
+            codec = codecs.lookup(name).name.replace('-', '_')
+        except LookupError:
+            return None
+        codec = Encoding.Supersets.get(codec, codec)
+        return 'utf-8' if codec == 'utf_8' else codec
+
+    @staticmethod
+    def host_of(url):
+        """
+        Get the host of a page URL.
+
+        Args:
+            url: URL string (or None)
+
+        Returns:
+            str: Host name, or None
+        """
+        if not isinstance(url, str):
+            return None
+        try:
+            return urlsplit(url).hostname
+        except ValueError:
+            return None
+
+
+class LazyHtml:
+    """
+    `html` attribute decoding the item's raw_html on first access.
+
+    Usage:
+        class Page(Document):
+            _html = None
+            raw_html = None
+            encoding = None
+            html = LazyHtml()
+    """
+
+    def __get__(self, item, owner=None):
+        if item is None:
+            return self
+        if item._html is None and isinstance(item.raw_html, bytes):
+            item._html, item.encoding = Encoding.decode(item.raw_html, kind=item.kind, url=item.url,
+                                                        encoding=item.encoding)
+        return item._html
+
+    def __set__(self, item, value):
+        item._html = value
@@ -0,0 +1,539 @@
+# encoding: utf-8
+"""
+HTML engines behind the `doc` of parsers, diggers and paginaters.
+
+The 'bs4' engine builds a BeautifulSoup tree, as the spider always did.
+The 'lxml' engine keeps the page in lxml's C tree and evaluates CSS
+selectors as XPath in libxml2; its elements answer the subset of the
+BeautifulSoup API the sites use (select, select_one, get, get_text, text,
+name, attrs, decode_contents, str()). Anything else raises, so a site
+needing more stays on 'bs4' rather than silently parsing its page twice.
+"""
+import re
+from html import escape
+from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+from spider.encoding import Encoding
+
+
+class HtmlEngine:
+    """
+    Builds the document of a downloaded page with the selected engine.
+
+    The engine of a site is its class's ENGINE, or else the run-wide
+    default (set from the --engine option).
+
+    Usage:
+        doc = HtmlEngine.parse(item)            # run-wide default
+        doc = HtmlEngine.parse(item, 'lxml')
+        doc.select_one("#name").get_text(strip=True)
+    """
+
+    ENGINES = ('bs4', 'lxml')
+    default = 'bs4'         # Engine of sites that do not choose one
+
+    @classmethod
+    def configure(cls, options):
+        """
+        Apply the run-wide engine from the spider options.
+
+        Args:
+            options: SpiderOptions dict
+        """
+        cls.default = options.get('engine') or cls.default
+
+    @classmethod
+    def parse(cls, item, engine=None):
+        """
+        Parse a downloaded page.
+
+        Args:
+            item: Object with 'html' (or 'raw_html' and 'encoding') attributes
+            engine: Engine name from ENGINES (None = the run-wide default)
+
+        Returns:
+            BeautifulSoup, or LxmlDocument for the 'lxml' engine
+
+        Raises:
+            ValueError: If the engine is unknown
+        """
+        engine = engine or cls.default
+        if engine not in cls.ENGINES:
+            raise ValueError(f"Unknown HTML engine: {engine}")
+        markup, encoding = Encoding.markup(item)
+        if engine == 'lxml':
+            return LxmlDocument(markup, encoding)
+        return BeautifulSoup(markup, 'lxml', from_encoding=encoding)
+
+
+class UnsupportedSelector(ValueError):
+    """Raised for CSS that CssXPath does not translate"""
+
+
+class CssXPath:
+    """
+    Translates CSS selectors to XPath 1.0 with BeautifulSoup's (soupsieve)
+    matching rules: from an element, a selector matches its descendants,
+    whose ancestors and siblings may lie outside it.
+
+    Type, universal, #id, .class and attribute selectors ([a], =, ~=, |=,
+    ^=, $=, *=), the four combinators, :first-child, :last-child,
+    :only-child and :nth-child(n|odd|even) are translated; anything else
+    raises UnsupportedSelector.
+
+    cssselect is not used: its XPath walks down from the context element,
+    so from an element "#plist a" needs #plist inside it, where
+    BeautifulSoup also matches through ancestors outside it. Each test here
+    is instead a predicate on the candidate element looking up its
+    ancestor and sibling axes. Being a few regexes, it also saves a
+    dependency.
+    """
+
+    IDENT = re.compile(r'-?[_a-zA-Z\u00a0-\uffff][\w\u00a0-\uffff-]*')
+    STRING = re.compile(r'"([^"\\]*)"|\'([^\'\\]*)\'')
+    SPACE = re.compile(r'\s*')
+    ATTRIBUTE_OPERATOR = re.compile(r'[~|^$*]?=')
+
+    # Combinator -> axis from an element to the one left of the combinator
+    AXES = {
+        ' ': 'ancestor::*',
+        '>': 'parent::*',
+        '+': 'preceding-sibling::*[1]',
+        '~': 'preceding-sibling::*'
+    }
+
+    _cache = {}             # Selector -> XPath test of each selector of the group
+
+    @classmethod
+    def translate(cls, selector, axis='descendant::'):
+        """
+        Translate a selector (group) to an XPath expression.
+
+        Args:
+            selector: CSS selector
+            axis: Axis of the elements matched from the context node
+
+        Returns:
+            str: XPath expression
+
+        Raises:
+            UnsupportedSelector: If the selector uses unsupported CSS
+        """
+        tests = cls._cache.get(selector)
+        if tests is None:
+            tests = cls._cache[selector] = _SelectorReader(selector).read()
+        return ' | '.join(axis + test for test in tests)
+
+    @staticmethod
+    def literal(value):
+        """
+        Quote a string as an XPath literal.
+
+        Args:
+            value: String
+
+        Returns:
+            str
+        """
+        if "'" not in value:
+            return f"'{value}'"
+        if '"' not in value:
+            return f'"{value}"'
+        return "concat('" + "', \"'\", '".join(value.split("'")) + "')"
+
+
+class _SelectorReader:
+    """One pass over a selector group, building the XPath of each selector"""
+
+    def __init__(self, selector):
+        self.text = selector
+        self.pos = 0
+
+    def read(self):
+        tests = []
+        while True:
+            self._space()
+            tests.append(self._complex())
+            if self.pos >= len(self.text):
+                return tests
+            self.pos += 1   # ','
+
+    def _complex(self):
+        conditions = self._compound()
+        while True:
+            start = self.pos
+            self._space()
+            if self.pos >= len(self.text) or self.text[self.pos] == ',':
+                return '*' + self._predicates(conditions)
+            combinator = self.text[self.pos]
+            if combinator in '>+~':
+                self.pos += 1
+                self._space()
+            elif self.pos > start:
+                combinator = ' '
+            else:
+                raise UnsupportedSelector(self.text)
+            conditions = self._compound() + [CssXPath.AXES[combinator] + self._predicates(conditions)]
+
+    def _compound(self):
+        conditions = []
+        start = self.pos
+        if self._peek('*'):
+            self.pos += 1
+        else:
+            name = self._ident(required=False)
+            if name is not None:
+                conditions.append(f"self::{name.lower()}")
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == '#':
+                self.pos += 1
+                conditions.append(f"@id={CssXPath.literal(self._ident())}")
+            elif char == '.':
+                self.pos += 1
+                conditions.append(self._word('@class', self._ident()))
+            elif char == '[':
+                self.pos += 1
+                conditions.append(self._attribute())
+            elif char == ':':
+                self.pos += 1
+                conditions.append(self._pseudo_class())
+            else:
+                break
+        if self.pos == start:
+            raise UnsupportedSelector(self.text)
+        return conditions
+
+    def _attribute(self):
+        self._space()
+        name = '@' + self._ident().lower()
+        self._space()
+        operator = CssXPath.ATTRIBUTE_OPERATOR.match(self.text, self.pos)
+        if operator is None:
+            condition = name
+        else:
+            self.pos = operator.end()
+            self._space()
+            value = self._value()
+            condition = self._attribute_match(name, operator.group(0), value)
+            self._space()
+        if not self._peek(']'):
+            raise UnsupportedSelector(self.text)
+        self.pos += 1
+        return condition
+
+    def _attribute_match(self, name, operator, value):
+        literal = CssXPath.literal(value)
+        if operator == '=':
+            return f"{name}={literal}"
+        if operator == '~=':
+            return self._word(name, value) if value and value.split() == [value] else 'false()'
+        if operator == '|=':
+            return f"({name}={literal} or starts-with({name}, {CssXPath.literal(value + '-')}))"
+        if not value:
+            return 'false()'    # ^=, $= and *= with an empty value match nothing
+        if operator == '^=':
+            return f"starts-with({name}, {literal})"
+        if operator == '$=':
+            return f"substring({name}, string-length({name}) - {len(value) - 1})={literal}"
+        return f"contains({name}, {literal})"
+
+    def _pseudo_class(self):
+        name = self._ident().lower()
+        if name == 'first-child':
+            return 'not(preceding-sibling::*)'
+        if name == 'last-child':
+            return 'not(following-sibling::*)'
+        if name == 'only-child':
+            return 'not(preceding-sibling::*) and not(following-sibling::*)'
+        if name == 'nth-child' and self._peek('('):
+            end = self.text.find(')', self.pos)
+            if end < 0:
+                raise UnsupportedSelector(self.text)
+            argument = self.text[self.pos + 1:end].strip().lower()
+            self.pos = end + 1
+            if argument == 'odd':
+                return 'count(preceding-sibling::*) mod 2 = 0'
+            if argument == 'even':
+                return 'count(preceding-sibling::*) mod 2 = 1'
+            if argument.isdigit() and int(argument) > 0:
+                return f"count(preceding-sibling::*) = {int(argument) - 1}"
+        raise UnsupportedSelector(self.text)
+
+    @staticmethod
+    def _word(name, value):
+        """Whitespace-separated word match, as for class names"""
+        return f"contains(concat(' ', normalize-space({name}), ' '), {CssXPath.literal(' ' + value + ' ')})"
+
+    @staticmethod
+    def _predicates(conditions):
+        return ''.join(f"[{condition}]" for condition in conditions)
+
+    def _value(self):
+        string = CssXPath.STRING.match(self.text, self.pos)
+        if string is not None:
+            self.pos = string.end()
+            return string.group(1) if string.group(1) is not None else string.group(2)
+        return self._ident()
+
+    def _ident(self, required=True):
+        match = CssXPath.IDENT.match(self.text, self.pos)
+        if match is None:
+            if required:
+                raise UnsupportedSelector(self.text)
+            return None
+        self.pos = match.end()
+        return match.group(0)
+
+    def _space(self):
+        self.pos = CssXPath.SPACE.match(self.text, self.pos).end()
+
+    def _peek(self, char):
+        return self.text.startswith(char, self.pos)
+
+
+class LxmlTag:
+    """
+    BeautifulSoup-compatible view of an lxml element.
+
+    Only the calls defined here are supported: CSS that CssXPath does not
+    translate raises UnsupportedSelector, and any other BeautifulSoup
+    attribute raises AttributeError.
+    """
+
+    AXIS = 'descendant::'
+    # Attributes BeautifulSoup splits into a list of words
+    MULTI_VALUED = frozenset(('class', 'rel', 'rev', 'accept-charset', 'headers', 'accesskey', 'dropzone'))
+    # Elements whose text BeautifulSoup leaves out of an ancestor's get_text()
+    HIDDEN_TEXT = frozenset(('script', 'style', 'template'))
+    # Elements BeautifulSoup writes as <br/>, with no closing tag
+    VOID = frozenset(('area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr',
+                      'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid',
+                      'param', 'source', 'spacer', 'track', 'wbr'))
+    # Elements whose text BeautifulSoup writes unescaped
+    RAW_TEXT = frozenset(('script', 'style'))
+
+    def __init__(self, element, document):
+        """
+        Initialize the view.
+
+        Args:
+            element: lxml element
+            document: LxmlDocument the element belongs to
+        """
+        self.element = element
+        self.document = document
+
+    @property
+    def name(self):
+        """Tag name"""
+        return self.element.tag
+
+    @property
+    def attrs(self):
+        """Attributes, with multi-valued ones split into lists"""
+        return {name: self.get(name) for name in self.element.attrib}
+
+    @property
+    def text(self):
+        """Text of the element and its descendants"""
+        return self.get_text()
+
+    def get(self, name, default=None):
+        """
+        Get an attribute.
+
+        Args:
+            name: Attribute name
+            default: Returned if the element has no such attribute
+
+        Returns:
+            str, a list of words for MULTI_VALUED attributes, or default
+        """
+        value = self.element.get(name)
+        if value is None:
+            return default
+        return value.split() if name in self.MULTI_VALUED else value
+
+    def __getitem__(self, name):
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def has_attr(self, name):
+        """True if the element has the attribute"""
+        return name in self.element.attrib
+
+    def get_text(self, separator='', strip=False):
+        """
+        Get the text of the element and its descendants.
+
+        Args:
+            separator: Joins the text nodes
+            strip: Strip each text node and drop the empty ones
+
+        Returns:
+            str
+        """
+        strings = self._strings(self.element, False)
+        if strip:
+            strings = (string.strip() for string in strings)
+            strings = (string for string in strings if string)
+        return separator.join(strings)
+
+    def select(self, selector, limit=None):
+        """
+        Get the descendants matching a CSS selector, in document order.
+
+        Args:
+            selector: CSS selector
+            limit: Most elements to return (None = all)
+
+        Returns:
+            list: LxmlTag
+
+        Raises:
+            UnsupportedSelector: If the selector uses CSS CssXPath does not translate
+        """
+        elements = self.element.xpath(CssXPath.translate(selector, self.AXIS))
+        if limit:
+            elements = elements[:limit]
+        return [LxmlTag(element, self.document) for element in elements]
+
+    def select_one(self, selector):
+        """
+        Get the first descendant matching a CSS selector.
+
+        Args:
+            selector: CSS selector
+
+        Returns:
+            LxmlTag, or None
+
+        Raises:
+            UnsupportedSelector: If the selector uses CSS CssXPath does not translate
+        """
+        found = self.select(selector, limit=1)
+        return found[0] if found else None
+
+    def decode_contents(self):
+        """
+        Get the markup inside the element.
+
+        Returns:
+            str: Serialized text and children, without the element's own tag
+        """
+        return ''.join(self._contents(self.element))
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, LxmlTag) and other.element is self.element
+
+    def __hash__(self):
+        return hash(self.element)
+
+    def __str__(self):
+        return ''.join(self._markup(self.element))
+
+    __repr__ = __str__
+
+    @classmethod
+    def _markup(cls, element):
+        """
+        Serialize an element the way BeautifulSoup's str() does: attributes
+        sorted and double quoted, multi-valued ones with their words joined
+        by single spaces, and void elements closed as <br/>.
+
+        One difference remains: libxml2 gives a boolean attribute its own
+        name as value, so <input checked> is written checked="checked"
+        where BeautifulSoup writes checked="".
+        """
+        if not isinstance(element.tag, str):
+            if element.tag is etree.Comment:
+                yield f"<!--{element.text or ''}-->"
+            return
+        yield '<' + element.tag
+        for name in sorted(element.attrib):
+            value = cls._quoted(escape(' '.join(element.get(name).split()) if name in cls.MULTI_VALUED
+                                       else element.get(name), quote=False))
+            yield f" {name}={value}"
+        if element.tag in cls.VOID and not len(element) and not element.text:
+            yield '/>'
+            return
+        yield '>'
+        yield from cls._contents(element)
+        yield f"</{element.tag}>"
+
+    @classmethod
+    def _contents(cls, element):
+        raw = element.tag in cls.RAW_TEXT
+        if element.text:
+            yield element.text if raw else escape(element.text, quote=False)
+        for child in element:
+            yield from cls._markup(child)
+            if child.tail:
+                yield child.tail if raw else escape(child.tail, quote=False)
+
+    @staticmethod
+    def _quoted(value):
+        # Single quotes around a value holding only double quotes, as BeautifulSoup does
+        if '"' not in value:
+            return f'"{value}"'
+        if "'" not in value:
+            return f"'{value}'"
+        return '"' + value.replace('"', '&quot;') + '"'
+
+    @classmethod
+    def _strings(cls, element, hidden):
+        if element.text and not hidden:
+            yield element.text
+        for child in element:
+            if isinstance(child.tag, str):
+                yield from cls._strings(child, hidden or child.tag in cls.HIDDEN_TEXT)
+            if child.tail and not hidden:
+                yield child.tail
+
+
+class LxmlDocument(LxmlTag):
+    """
+    Page parsed by lxml.html, the root of its LxmlTags. Selecting from the
+    document also matches the <html> element, as from a BeautifulSoup.
+    """
+
+    AXIS = 'descendant-or-self::'
+
+    def __init__(self, markup, encoding=None):
+        """
+        Parse a page.
+
+        Args:
+            markup: Page bytes (in encoding) or string
+            encoding: Charset of bytes markup (None = let libxml2 detect it)
+        """
+        if isinstance(markup, str):
+            markup, encoding = markup.encode('utf-8', 'surrogatepass'), 'utf-8'
+        parser = lxml_html.HTMLParser(encoding=encoding)
+        try:
+            root = lxml_html.document_fromstring(markup, parser=parser)
+        except etree.ParserError:
+            # Empty page: an empty document, as BeautifulSoup gives
+            root = lxml_html.document_fromstring(b"<html></html>", parser=parser)
+        super().__init__(root, self)
+
+    @classmethod
+    def from_root(cls, root):
+        """
+        Wrap a tree that is already parsed, such as one built while streaming.
+
+        Args:
+            root: Root lxml element of the page
+
+        Returns:
+            LxmlDocument
+        """
+        doc = cls.__new__(cls)
+        LxmlTag.__init__(doc, root, doc)
+        return doc
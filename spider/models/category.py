@@ -1,6 +1,8 @@
 # encoding: utf-8
 from mongoengine import Document, StringField, BooleanField, IntField, DateTimeField, ObjectIdField, QuerySet
+from mongoengine.errors import NotUniqueError
 from datetime import datetime
+from spider.encoding import LazyHtml
 
 
 class Category(Document):
@@ -13,12 +15,19 @@ class Category(Document):
     name = StringField()
     kind = StringField()
     retry_time = IntField(default=0)
+    retry_at = DateTimeField()  # Next download attempt after a failure (None = due)
+    failure = StringField()     # Class of the last download failure
+    dead = BooleanField(default=False)  # Given up after too many failures
 
     # Tree structure fields
     parent_id = ObjectIdField()
 
-    # Virtual attribute (not stored in database)
+    # Virtual attributes (not stored in database)
     _html = None
+    raw_html = None  # Response body as downloaded, set by Encoding.set_utf8_html
+    encoding = None  # Charset raw_html was decoded with, set by Encoding.set_utf8_html
+    stream = None  # StreamingParse of the download, set when streaming is on
+    html = LazyHtml()  # Page HTML, decoded from raw_html on first access
 
     # Timestamps
     created_at = DateTimeField(default=datetime.utcnow)
@@ -30,18 +39,11 @@ class Category(Document):
         'indexes': [
             'url',
             'kind',
+            'retry_at',
             'parent_id'
         ]
     }
 
-    @property
-    def html(self):
-        return self._html
-
-    @html.setter
-    def html(self, value):
-        self._html = value
-
     @property
     def parent(self):
         """Get parent category"""
@@ -70,6 +72,34 @@ class Category(Document):
         """Filter categories by kind"""
         return cls.objects(kind=kind)
 
+    @classmethod
+    def find_or_create(cls, url, kind, **fields):
+        """
+        Find a category by url, creating it if missing.
+
+        The url is unique, so the category is looked up by url alone (whatever
+        its kind) with a single upsert. When two workers upsert the same URL at
+        once and one of them loses on the unique index, it reads the
+        category the other one created.
+
+        Args:
+            url: Category URL
+            kind: Spider kind/name of a created category
+            **fields: Other fields of a created category (e.g. name)
+
+        Returns:
+            Category
+        """
+        now = datetime.utcnow()
+        on_insert = {'kind': kind, 'completed': False, 'retry_time': 0, 'dead': False, 'created_at': now,
+                     'updated_at': now, **fields}
+        try:
+            return cls.objects(url=url).modify(
+                upsert=True, new=True, **{f'set_on_insert__{name}': value for name, value in on_insert.items()}
+            )
+        except NotUniqueError:
+            return cls.objects(url=url).first()
+
     @classmethod
     def leaves(cls):
         """Get all leaf categories (no children)"""
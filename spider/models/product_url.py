@@ -1,6 +1,7 @@
 # encoding: utf-8
 from mongoengine import Document, StringField, BooleanField, IntField, DateTimeField, ObjectIdField, ReferenceField
 from datetime import datetime
+from spider.encoding import LazyHtml
 
 
 class ProductUrl(Document):
@@ -11,10 +12,17 @@ class ProductUrl(Document):
     completed = BooleanField(default=False)
     kind = StringField()
     retry_time = IntField(default=0)
+    retry_at = DateTimeField()  # Next download attempt after a failure (None = due)
+    failure = StringField()     # Class of the last download failure
+    dead = BooleanField(default=False)  # Given up after too many failures
     page_id = ObjectIdField()
 
-    # Virtual attribute (not stored in database)
+    # Virtual attributes (not stored in database)
     _html = None
+    raw_html = None  # Response body as downloaded, set by Encoding.set_utf8_html
+    encoding = None  # Charset raw_html was decoded with, set by Encoding.set_utf8_html
+    stream = None  # StreamingParse of the download, set when streaming is on
+    html = LazyHtml()  # Page HTML, decoded from raw_html on first access
 
     # Timestamps
     created_at = DateTimeField(default=datetime.utcnow)
@@ -26,19 +34,12 @@ class ProductUrl(Document):
         'indexes': [
             'url',
             'kind',
+            'retry_at',
             'completed',
             'page_id'
         ]
     }
 
-    @property
-    def html(self):
-        return self._html
-
-    @html.setter
-    def html(self, value):
-        self._html = value
-
     @property
     def page(self):
         """Get associated page"""
@@ -1,5 +1,5 @@
 # encoding: utf-8
-from bs4 import BeautifulSoup
+from spider.engine import HtmlEngine
 from spider.logger import LoggerMixin
 
 
@@ -9,15 +9,19 @@ class Paginater(LoggerMixin):
     Subclasses must implement pagination_list() method.
     """
 
-    def __init__(self, item):
+    ENGINE = None           # HTML engine of the site (None = HtmlEngine.default)
+
+    def __init__(self, item, engine=None):
         """
         Initialize paginater with a category item.
 
         Args:
-            item: Category object with 'url' and 'html' attributes
+            item: Category object with 'url' and 'html' (or 'raw_html' and
+                'encoding') attributes
+            engine: HTML engine name (default: the site's ENGINE)
         """
         self.url = item.url
-        self.doc = BeautifulSoup(item.html, 'lxml')
+        self.doc = HtmlEngine.parse(item, engine or self.ENGINE)
 
     def pagination_list(self):
         """
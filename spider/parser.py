@@ -1,5 +1,9 @@
 # encoding: utf-8
-from bs4 import BeautifulSoup
+import codecs
+from functools import partial
+from lxml import etree
+from spider.encoding import Encoding
+from spider.engine import CssXPath, HtmlEngine, LxmlDocument
 from spider.logger import LoggerMixin
 
 
@@ -7,17 +11,41 @@ class Parser(LoggerMixin):
     """
     Base Parser class for parsing product details from product pages.
     Subclasses must implement all abstract methods.
+
+    STREAM_FIELDS maps the fields a page can be streamed for (see
+    StreamingParse) to the CSS selector of the element holding everything
+    the field reads, or None for a field that reads nothing from the page;
+    the field is final once that element is complete. A download is only
+    cut short when it lists every field of PAGE_FIELDS.
     """
 
-    def __init__(self, product):
+    # Fields read from the page: those of attributes() and the categories
+    PAGE_FIELDS = ('title', 'product_code', 'price', 'price_url', 'stock', 'image_url', 'score', 'desc',
+                   'standard', 'comments', 'end_product', 'merchant', 'brand', 'brand_type',
+                   'belongs_to_categories')
+    STREAM_FIELDS = {}
+    ENGINE = None           # HTML engine of the site (None = HtmlEngine.default)
+
+    def __init__(self, product, doc=None, engine=None):
         """
         Initialize parser with a product URL object.
 
         Args:
-            product: ProductUrl object with 'html' attribute containing page HTML
+            product: ProductUrl object with 'html' attribute containing page HTML,
+                or the downloaded 'raw_html' bytes and their 'encoding'
+            doc: Already parsed document of the page (skips parsing)
+            engine: HTML engine name (default: the site's ENGINE)
         """
         self.product = product
-        self.doc = BeautifulSoup(product.html, 'lxml')
+        self.values = {}        # Fields extracted while the page streamed in
+        stream = getattr(product, 'stream', None)
+        if doc is None and isinstance(stream, StreamingParse):
+            # Reuse what was parsed during the download
+            self.values = stream.values or {}
+            doc = stream.document(product)
+        if doc is None:
+            doc = HtmlEngine.parse(product, engine or self.ENGINE)
+        self.doc = doc
 
     def attributes(self):
         """
@@ -28,23 +56,38 @@ class Parser(LoggerMixin):
         """
         return {
             'kind': self.product.kind,
-            'title': self.title(),
-            'product_code': self.product_code(),
-            'price': self.price(),
-            'price_url': self.price_url(),
-            'stock': self.stock(),
-            'image_url': self.image_url(),
-            'score': self.score(),
-            'desc': self.desc(),
-            'standard': self.standard(),
-            'comments': self.comments(),
-            'end_product': self.end_product(),
-            'merchant': self.merchant(),
-            'brand': self.brand(),
-            'brand_type': self.brand_type(),
+            'title': self.field('title'),
+            'product_code': self.field('product_code'),
+            'price': self.field('price'),
+            'price_url': self.field('price_url'),
+            'stock': self.field('stock'),
+            'image_url': self.field('image_url'),
+            'score': self.field('score'),
+            'desc': self.field('desc'),
+            'standard': self.field('standard'),
+            'comments': self.field('comments'),
+            'end_product': self.field('end_product'),
+            'merchant': self.field('merchant'),
+            'brand': self.field('brand'),
+            'brand_type': self.field('brand_type'),
             'product_url_id': self.product.id
         }
 
+    def field(self, name):
+        """
+        Get a field, taking the value extracted while the page streamed in
+        if there is one.
+
+        Args:
+            name: Field name from PAGE_FIELDS
+
+        Returns:
+            The field's value
+        """
+        if name in self.values:
+            return self.values[name]
+        return getattr(self, name)()
+
     # Abstract methods - subclasses must implement these
     def title(self):
         """Extract product title"""
@@ -120,3 +163,188 @@ class Parser(LoggerMixin):
                 Example: [{'name': 'Electronics', 'url': 'http://...'}, ...]
         """
         raise NotImplementedError()
+
+
+class StreamingParse:
+    """
+    Parses a product page with lxml's incremental parser while it downloads.
+
+    The downloader feeds each chunk as it arrives. The head of the page is
+    held back until its charset can be resolved (Encoding.SNIFF_BYTES), then
+    every byte is decoded and parsed exactly once. A field of STREAM_FIELDS
+    is final once the element holding it has been closed; when all are, the
+    fields are extracted from the partial tree into values.
+
+    If STREAM_FIELDS covers every field of Parser.PAGE_FIELDS the rest of the
+    page is not needed (cancellable) and a downloader with stream_cancel set
+    stops reading it. Otherwise the whole page is fed and its tree becomes
+    the parser's document, so a streamed page is never parsed twice.
+
+    Usage:
+        Downloader.streaming = StreamingParse.for_parser(TmallParser)
+        ...
+        TmallParser(item).attributes()  # uses item.stream
+    """
+
+    SEARCH_BYTES = 16384    # Characters parsed between searches for the fields' elements
+    # Selectors are matched as the page grows, so they cannot look at what follows an element
+    LOOKAHEAD = (':last-child', ':only-child', ':nth-last')
+
+    def __init__(self, parser_class, item, headers=None):
+        """
+        Initialize the parse of one download.
+
+        Args:
+            parser_class: Parser subclass with STREAM_FIELDS
+            item: Object being downloaded (with 'kind' and 'url')
+            headers: Response headers (for the charset)
+        """
+        self.parser_class = parser_class
+        self.item = item
+        self.headers = headers
+        self.fields = tuple(parser_class.STREAM_FIELDS)
+        self.cancellable_fields = set(self.fields) >= set(parser_class.PAGE_FIELDS)
+        self.searches = {
+            field: etree.XPath(f"({CssXPath.translate(selector, 'descendant-or-self::')})[1]")
+            for field, selector in parser_class.STREAM_FIELDS.items() if selector
+        }
+        self.elements = {}      # Field -> element holding it, once found
+        self.values = None      # Field -> value once every field is extracted
+        self.encoding = None    # Charset the page is decoded with
+        self.root = None
+        self.closed = False     # The whole page was parsed
+        self.broken = False     # Parsing failed: the parser parses the page itself
+        self.cancelled = False  # Set by the downloader when it stopped reading
+        self._head = bytearray()
+        self._decoder = None
+        self._parser = None
+        self._open = set()      # Elements started and not yet ended
+        self._unsearched = 0
+
+    @classmethod
+    def for_parser(cls, parser_class):
+        """
+        Build the Downloader.streaming factory for a parser.
+
+        Args:
+            parser_class: Parser subclass with STREAM_FIELDS
+
+        Returns:
+            Callable (item, headers) -> StreamingParse, or None if the parser
+                has no STREAM_FIELDS or does not use the lxml engine
+
+        Raises:
+            ValueError: If a selector depends on what follows its element
+        """
+        if not parser_class.STREAM_FIELDS or (parser_class.ENGINE or HtmlEngine.default) != 'lxml':
+            return None
+        for field, selector in parser_class.STREAM_FIELDS.items():
+            if selector and any(pseudo in selector for pseudo in cls.LOOKAHEAD):
+                raise ValueError(f"{parser_class.__name__}.STREAM_FIELDS['{field}'] cannot be streamed: {selector}")
+        return partial(cls, parser_class)
+
+    @property
+    def resolved(self):
+        """True once every field of STREAM_FIELDS is extracted"""
+        return self.values is not None
+
+    @property
+    def cancellable(self):
+        """True once every field the parser reads from the page is extracted"""
+        return self.values is not None and self.cancellable_fields
+
+    def feed(self, chunk):
+        """
+        Parse the next chunk of the body.
+
+        Args:
+            chunk: Bytes received
+
+        Returns:
+            bool: True once the rest of the page is not needed (see cancellable)
+        """
+        if self.broken or self.closed:
+            return False
+        try:
+            if self._parser is None:
+                self._head += chunk
+                if len(self._head) < Encoding.SNIFF_BYTES:
+                    return False
+                chunk = self._start()
+            self._parse(self._decoder.decode(chunk))
+        except (etree.LxmlError, UnicodeError, LookupError):
+            self.broken = True
+        return self.cancellable
+
+    def close(self):
+        """Parse the end of the body once it is fully received"""
+        if self.broken or self.closed:
+            return
+        try:
+            if self._parser is None:
+                self._start()
+            self._parse(self._decoder.decode(b'', True))
+            self.root = self._parser.close()
+            self._read_events()
+            self._unsearched = self.SEARCH_BYTES
+            self._resolve()
+            self.closed = True
+        except (etree.LxmlError, UnicodeError, LookupError):
+            self.broken = True
+
+    def document(self, item):
+        """
+        Get the document the parser of the item can use instead of parsing it.
+
+        Args:
+            item: The downloaded item (with the charset it was decoded with)
+
+        Returns:
+            LxmlDocument of the page (partial when the download was cut
+                short), or None if the page has to be parsed from its body
+        """
+        if self.broken or self.root is None:
+            return None
+        if self.cancelled or (self.closed and Encoding.codec(getattr(item, 'encoding', None)) == self.encoding):
+            return LxmlDocument.from_root(self.root)
+        return None
+
+    def _start(self):
+        head = bytes(self._head)
+        self._head = None
+        self.encoding = Encoding.resolve(head, self.headers, self.item.kind, getattr(self.item, 'url', None))
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='spider-question-mark')
+        self._parser = etree.HTMLPullParser(events=('start', 'end'))
+        return head
+
+    def _parse(self, text):
+        if not text:
+            return
+        self._parser.feed(text)
+        self._read_events()
+        self._unsearched += len(text)
+        self._resolve()
+
+    def _read_events(self):
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                if self.root is None:
+                    self.root = element.getroottree().getroot()
+                self._open.add(element)
+            else:
+                self._open.discard(element)
+
+    def _resolve(self):
+        if self.values is not None or self.root is None:
+            return
+        if len(self.elements) < len(self.searches) and self._unsearched >= self.SEARCH_BYTES:
+            self._unsearched = 0
+            for field, search in self.searches.items():
+                if field not in self.elements:
+                    found = search(self.root)
+                    if found:
+                        self.elements[field] = found[0]
+        if len(self.elements) < len(self.searches) or any(e in self._open for e in self.elements.values()):
+            return
+        parser = self.parser_class(self.item, doc=LxmlDocument.from_root(self.root))
+        self.values = {field: getattr(parser, field)() for field in self.fields}
@@ -8,6 +8,7 @@ _module = importlib.util.module_from_spec(_spec)
 _spec.loader.exec_module(_module)
 
 Parser = _module.Parser
+StreamingParse = _module.StreamingParse
 
 # Import and export specific parser implementations
 from .dangdang_parser import DangdangParser
@@ -8,6 +8,25 @@ import re
 class DangdangParser(Parser):
     """Parser for Dangdang product pages"""
 
+    # Element holding each field, None for fields not read from the page (see StreamingParse)
+    STREAM_FIELDS = {
+        "title": "div.dp_wrap h1",
+        "price": "#salePriceTag",
+        "image_url": "#largePic",
+        "score": "p.fraction",
+        "comments": "#comm_all",
+        "belongs_to_categories": ".crumb",
+        "product_code": None,
+        "price_url": None,
+        "stock": None,
+        "desc": None,
+        "standard": None,
+        "end_product": None,
+        "merchant": None,
+        "brand": None,
+        "brand_type": None
+    }
+
     def title(self):
         """Extract product title"""
         elem = self.doc.select_one("div.dp_wrap h1")
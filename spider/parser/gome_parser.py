@@ -8,6 +8,25 @@ import re
 class GomeParser(Parser):
     """Parser for Gome product pages"""
 
+    # Element holding each field, None for fields not read from the page (see StreamingParse)
+    STREAM_FIELDS = {
+        "title": "#name",
+        "product_code": "#sku",
+        "price_url": "#gomeprice img",
+        "image_url": ".p_img_bar img",
+        "score": "#positive div.star",
+        "desc": ".description",
+        "standard": ".Ptable",
+        "belongs_to_categories": "#navigation",
+        "price": None,
+        "stock": None,
+        "comments": None,
+        "end_product": None,
+        "merchant": None,
+        "brand": None,
+        "brand_type": None
+    }
+
     def title(self):
         """Extract product title"""
         elem = self.doc.select_one("#name")
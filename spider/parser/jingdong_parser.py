@@ -8,6 +8,25 @@ import re
 class JingdongParser(Parser):
     """Parser for Jingdong (JD.com) product pages"""
 
+    # Element holding each field, None for fields not read from the page (see StreamingParse)
+    STREAM_FIELDS = {
+        "title": "div#name h1",
+        "product_code": "#summary",
+        "price_url": "strong.price img",
+        "stock": "#stocktext",
+        "image_url": "#preview img",
+        "score": "div[id^=star]",
+        "desc": ".mc.fore.tabcon",
+        "standard": ".Ptable",
+        "belongs_to_categories": ".crumb",
+        "price": None,
+        "comments": None,
+        "end_product": None,
+        "merchant": None,
+        "brand": None,
+        "brand_type": None
+    }
+
     def end_product(self):
         """Extract or find end product reference"""
         return None
@@ -8,6 +8,25 @@ import re
 class NeweggParser(Parser):
     """Parser for Newegg product pages"""
 
+    # Element holding each field, None for fields not read from the page (see StreamingParse)
+    STREAM_FIELDS = {
+        "title": ".proHeader h1",
+        "price_url": ".neweggPrice img",
+        "stock": ".detailList span.lightly",
+        "image_url": "a#bigImg",
+        "score": ".score",
+        "standard": ".proDescTab table",
+        "comments": "#comment_1",
+        "product_code": None,
+        "price": None,
+        "desc": None,
+        "end_product": None,
+        "merchant": None,
+        "brand": None,
+        "brand_type": None,
+        "belongs_to_categories": None
+    }
+
     def title(self):
         """Extract product title"""
         elem = self.doc.select_one(".proHeader h1")
@@ -8,6 +8,25 @@ import re
 class SuningParser(Parser):
     """Parser for Suning product pages"""
 
+    # Element holding each field, None for fields not read from the page (see StreamingParse)
+    STREAM_FIELDS = {
+        "title": ".product_title_name",
+        "product_code": ".product_title_cout",
+        "stock": "#deleverStatus",
+        "image_url": ".product_b_image img",
+        "score": ".sn_stars",
+        "belongs_to_categories": ".path",
+        "price": None,
+        "price_url": None,
+        "desc": None,
+        "standard": None,
+        "comments": None,
+        "end_product": None,
+        "merchant": None,
+        "brand": None,
+        "brand_type": None
+    }
+
     def title(self):
         """Extract product title"""
         elem = self.doc.select_one(".product_title_name")
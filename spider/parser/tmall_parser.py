@@ -8,6 +8,25 @@ import re
 class TmallParser(Parser):
     """Parser for Tmall product pages"""
 
+    # Element holding each field, None for fields not read from the page (see StreamingParse)
+    STREAM_FIELDS = {
+        "title": "#detail h3 a",
+        "price": "#J_StrPrice",
+        "stock": "#J_SpanStock",
+        "image_url": "#J_ImgBooth",
+        "standard": ".attributes-list",
+        "product_code": None,
+        "price_url": None,
+        "score": None,
+        "desc": None,
+        "comments": None,
+        "end_product": None,
+        "merchant": None,
+        "brand": None,
+        "brand_type": None,
+        "belongs_to_categories": None
+    }
+
     def title(self):
         """Extract product title (商品名称)"""
         elem = self.doc.select_one("#detail h3 a")
@@ -13,7 +13,25 @@ SpiderOptions = {
     'name': 'dangdang',
     'environment': os.environ.get('SPIDER_ENV', 'development'),
     'downloader': 'normal',
-    'number': 1000
+    'number': 1000,
+    'concurrency': 0,
+    'workers': 1,
+    'executor': 'thread',
+    'pipeline': False,
+    'cache': '',
+    'archive': '',
+    'rate_limit': False,
+    'retries': 5,
+    'breaker': 5,
+    'hedge': 0,
+    'dns_ttl': 300,
+    'prewarm': False,
+    'proxies': '',
+    'metrics_port': 0,
+    'metrics_file': '',
+    'stream': False,
+    'stream_cancel': False,
+    'engine': None
 }
 
 
@@ -54,8 +72,8 @@ Examples:
         '-d', '--downloader',
         type=str,
         default=SpiderOptions['downloader'],
-        choices=['normal', 'ty', 'em'],
-        help='Downloader type (normal=single-thread, ty=multi-thread, em=async). Default: normal'
+        choices=['normal', 'ty', 'em', 'replay'],
+        help='Downloader type (normal=single-thread, ty=multi-thread, em=async, replay=page archive). Default: normal'
     )
 
     parser.add_argument(
@@ -65,6 +83,139 @@ Examples:
         help='Number of records to process from database. Default: 1000'
     )
 
+    parser.add_argument(
+        '-c', '--concurrency',
+        type=int,
+        default=SpiderOptions['concurrency'],
+        help='Concurrent downloads (ty threads / em in-flight requests, 0 = downloader default). Default: 0'
+    )
+
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=SpiderOptions['workers'],
+        help='Callback workers that parse and save downloaded pages (0 = inline). Default: 1'
+    )
+
+    parser.add_argument(
+        '--executor',
+        type=str,
+        default=SpiderOptions['executor'],
+        choices=['thread', 'process'],
+        help='Run callbacks on worker threads or worker processes. Default: thread'
+    )
+
+    parser.add_argument(
+        '-p', '--pipeline',
+        action='store_true',
+        default=SpiderOptions['pipeline'],
+        help='Parse pages in a pool of -w worker processes (run_parser/run_digger). Default: off'
+    )
+
+    parser.add_argument(
+        '--cache',
+        type=str,
+        default=SpiderOptions['cache'],
+        metavar='DIR',
+        help='Cache downloaded pages in DIR and revalidate them with conditional requests. Default: off'
+    )
+
+    parser.add_argument(
+        '--archive',
+        type=str,
+        default=SpiderOptions['archive'],
+        metavar='DIR',
+        help='Append every downloaded page to a compressed archive in DIR (read back by -d replay). Default: off'
+    )
+
+    parser.add_argument(
+        '--rate-limit',
+        action='store_true',
+        default=SpiderOptions['rate_limit'],
+        help='Pace requests per host with an adaptive (AIMD) token bucket. Default: off'
+    )
+
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=SpiderOptions['retries'],
+        help='Failed downloads before an item is given up (0 = do not record failures). Default: 5'
+    )
+
+    parser.add_argument(
+        '--breaker',
+        type=int,
+        default=SpiderOptions['breaker'],
+        help='Consecutive failures that open a host\'s circuit breaker (0 = off). Default: 5'
+    )
+
+    parser.add_argument(
+        '--hedge',
+        type=float,
+        default=SpiderOptions['hedge'],
+        metavar='PCT',
+        help='Hedge requests slower than the host\'s p95, up to PCT%% of requests (ty/em, 0 = off). Default: 0'
+    )
+
+    parser.add_argument(
+        '--dns-ttl',
+        type=int,
+        default=SpiderOptions['dns_ttl'],
+        metavar='SECONDS',
+        help='Reuse resolved host addresses for SECONDS in all downloaders (0 = system resolver). Default: 300'
+    )
+
+    parser.add_argument(
+        '--prewarm',
+        action='store_true',
+        default=SpiderOptions['prewarm'],
+        help='Resolve and connect to the first items\' hosts before each batch starts. Default: off'
+    )
+
+    parser.add_argument(
+        '--proxies',
+        default=SpiderOptions['proxies'],
+        metavar='LIST',
+        help='Route requests over egress proxies: comma-separated URLs or a file with one per line. Default: direct'
+    )
+
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=SpiderOptions['metrics_port'],
+        metavar='PORT',
+        help='Serve Prometheus metrics at http://127.0.0.1:PORT/metrics (0 = off). Default: 0'
+    )
+
+    parser.add_argument(
+        '--metrics-file',
+        default=SpiderOptions['metrics_file'],
+        metavar='PATH',
+        help='Rewrite Prometheus metrics to PATH every 15 seconds (node_exporter textfile). Default: off'
+    )
+
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        default=SpiderOptions['stream'],
+        help='Parse product pages with the lxml engine while they download (run_parser). Default: off'
+    )
+
+    parser.add_argument(
+        '--stream-cancel',
+        action='store_true',
+        default=SpiderOptions['stream_cancel'],
+        help='With --stream, stop downloading a page once every field is parsed. Default: off'
+    )
+
+    parser.add_argument(
+        '--engine',
+        choices=['bs4', 'lxml'],
+        default=SpiderOptions['engine'],
+        help='HTML engine of sites that do not choose one: bs4 (BeautifulSoup) or lxml (faster). '
+             'Default: lxml with --stream, else bs4'
+    )
+
     args = parser.parse_args()
 
     # Update global SpiderOptions
@@ -72,6 +223,24 @@ Examples:
     SpiderOptions['environment'] = args.environment
     SpiderOptions['downloader'] = args.downloader
     SpiderOptions['number'] = args.number
+    SpiderOptions['concurrency'] = args.concurrency
+    SpiderOptions['workers'] = args.workers
+    SpiderOptions['executor'] = args.executor
+    SpiderOptions['pipeline'] = args.pipeline
+    SpiderOptions['cache'] = args.cache
+    SpiderOptions['archive'] = args.archive
+    SpiderOptions['rate_limit'] = args.rate_limit
+    SpiderOptions['retries'] = args.retries
+    SpiderOptions['breaker'] = args.breaker
+    SpiderOptions['hedge'] = args.hedge
+    SpiderOptions['dns_ttl'] = args.dns_ttl
+    SpiderOptions['prewarm'] = args.prewarm
+    SpiderOptions['proxies'] = args.proxies
+    SpiderOptions['metrics_port'] = args.metrics_port
+    SpiderOptions['metrics_file'] = args.metrics_file
+    SpiderOptions['stream'] = args.stream or args.stream_cancel
+    SpiderOptions['stream_cancel'] = args.stream_cancel
+    SpiderOptions['engine'] = args.engine or ('lxml' if SpiderOptions['stream'] else 'bs4')
 
     print(f"Loading {SpiderOptions['name']}'s {SpiderOptions['environment']} spider environment...")
 
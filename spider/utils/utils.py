@@ -4,9 +4,7 @@ Utility functions for the Spider framework.
 Mimics Ruby's Spider::Utils module.
 """
 
-import re
-import gzip
-import io
+import zlib
 from pathlib import Path
 import yaml
 from urllib.parse import parse_qs, urlencode
@@ -19,22 +17,64 @@ class Utils:
     Mimics Ruby's Spider::Utils module.
     """
 
+    # Arguments of the MongoDB connection opened by load_mongo(), for worker
+    # processes to open their own (None = not connected through load_mongo)
+    mongo_settings = None
+
     @staticmethod
     def valid_html(html):
         """
-        Check if HTML is valid/complete.
+        Check if HTML is valid/complete, i.e. ends with </html> followed only
+        by whitespace and comments.
+
+        Only the end of the page is inspected, so a downloaded body can be
+        checked as raw bytes before it is decoded.
 
         Args:
-            html: HTML string
+            html: HTML string, or raw bytes in an ASCII-compatible encoding
 
         Returns:
             bool: True if HTML appears complete
         """
         if not html:
             return False
-        # Check if HTML ends with </html> tag (with optional comments/whitespace)
-        pattern = r'</html>(<!--(.*?)-->|\s)*$'
-        return re.search(pattern, html, re.MULTILINE | re.IGNORECASE) is not None
+        if isinstance(html, (bytes, bytearray)):
+            if html[:2] in (b'\xff\xfe', b'\xfe\xff'):
+                # UTF-16 pages are the only ones whose markup is not ASCII bytes
+                return Utils.valid_html(bytes(html).decode('utf-16', errors='replace'))
+            end_tag, comment_start, comment_end = b'</html>', b'<!--', b'-->'
+        else:
+            end_tag, comment_start, comment_end = '</html>', '<!--', '-->'
+
+        # Skip trailing whitespace and comments
+        end = Utils._content_end(html, len(html))
+        while html.endswith(comment_end, 0, end):
+            start = html.rfind(comment_start, 0, end - len(comment_end))
+            if start < 0:
+                return False
+            end = Utils._content_end(html, start)
+        return html[max(0, end - len(end_tag)):end].lower() == end_tag
+
+    @staticmethod
+    def _content_end(html, end, window=1024):
+        """
+        Find where the content before a position ends, ignoring whitespace.
+
+        Args:
+            html: HTML string or bytes
+            end: Position to search back from
+            window: Characters stripped at a time
+
+        Returns:
+            int: Position after the last non-whitespace character before end
+        """
+        while end > 0:
+            chunk = html[max(0, end - window):end]
+            stripped = chunk.rstrip()
+            if stripped:
+                return end - len(chunk) + len(stripped)
+            end -= len(chunk)
+        return 0
 
     @staticmethod
     def query2hash(query_str):
@@ -66,21 +106,31 @@ class Utils:
         return urlencode(hash_dict)
 
     @staticmethod
-    def decompress_gzip(data):
+    def decompress_gzip(data, chunk_size=64 * 1024):
         """
-        Decompress gzip data.
+        Decompress gzip data incrementally.
+
+        The result is left as bytes so the page charset can be detected by
+        Encoding instead of assuming UTF-8.
 
         Args:
             data: Gzip compressed bytes
+            chunk_size: Compressed bytes fed to the decompressor at a time
 
         Returns:
-            str: Decompressed string
+            bytes: Decompressed data
+
+        Raises:
+            TypeError: If data is a str (its original bytes cannot be recovered)
         """
         if isinstance(data, str):
-            data = data.encode('utf-8')
+            raise TypeError("decompress_gzip requires bytes, not str")
 
-        with gzip.GzipFile(fileobj=io.BytesIO(data)) as gz:
-            return gz.read().decode('utf-8')
+        view = memoryview(data)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = [decompressor.decompress(view[i:i + chunk_size]) for i in range(0, len(view), chunk_size)]
+        chunks.append(decompressor.flush())
+        return b''.join(chunks)
 
     @staticmethod
     def load_models():
@@ -122,8 +172,11 @@ class Utils:
         # Connect to MongoDB
         if username and password:
             connect(database, host=host, port=port, username=username, password=password)
+            Utils.mongo_settings = {'db': database, 'host': host, 'port': port,
+                                    'username': username, 'password': password}
         else:
             connect(database, host=host, port=port)
+            Utils.mongo_settings = {'db': database, 'host': host, 'port': port}
 
         print(f"Connected to MongoDB: {host}:{port}/{database}")
 
@@ -139,7 +139,7 @@ class TestCompleteCoverage:
     def test_error_handling_paths(self):
         """Test all error handling paths"""
         # Test connection errors
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_get.side_effect = ConnectionError("Connection failed")
             from spider.downloader import NormalDownloader
             downloader = NormalDownloader([Mock(url='http://test.com')])
@@ -148,7 +148,7 @@ class TestCompleteCoverage:
             mock_callback.assert_not_called()
         
         # Test timeout errors
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_get.side_effect = TimeoutError("Request timeout")
             from spider.downloader import NormalDownloader
             downloader = NormalDownloader([Mock(url='http://test.com')])
@@ -157,9 +157,11 @@ class TestCompleteCoverage:
             mock_callback.assert_not_called()
         
         # Test HTTP errors
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_response = Mock()
             mock_response.status_code = 500
+            mock_response.headers = {}
+            mock_response.iter_content.return_value = []
             mock_response.raise_for_status.side_effect = Exception("HTTP 500")
             mock_get.return_value = mock_response
             from spider.downloader import NormalDownloader
@@ -655,9 +657,11 @@ class TestSpiderComponents:
             mock_item.url = "http://test.com"
             downloader = NormalDownloader([mock_item])
             
-            with patch('requests.get') as mock_get:
+            with patch('requests.Session.get') as mock_get:
                 mock_response = Mock()
                 mock_response.content = b"<html>test</html>"
+                mock_response.headers = {}
+                mock_response.iter_content.return_value = [mock_response.content]
                 mock_get.return_value = mock_response
                 
                 downloader.run(mock_callback)
@@ -677,6 +681,8 @@ class TestSpiderComponents:
                 mock_response.status_code = 200
                 mock_response.text = "<html><body>Test</body></html>"
                 mock_response.content = b"<html><body>json_category={\"test\":{\"u\":\"#dd#test\",\"n\":\"Test Category\"}}menudataloaded</body></html>"
+                mock_response.headers = {}
+                mock_response.iter_content.return_value = [mock_response.content]
                 mock_get.return_value = mock_response
                 
                 categories = fetcher.category_list()
@@ -0,0 +1,103 @@
+"""
+Shared fixtures for downloader tests: a local HTTP server standing in for the
+crawled sites.
+"""
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+
+PAGE = b"<html><head><title>Test</title></head><body>Test</body></html>"
+
+
+class LocalSite:
+    """
+    Threaded HTTP server recording every request it receives.
+
+    Routes map a path to (status, headers, body). Unknown paths answer 200
+    with PAGE. `delay` holds each response open to make concurrency visible.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.delay = 0
+        self.requests = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def url(self, path='/'):
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def route(self, path, body=PAGE, status=200, headers=None):
+        self.routes[path] = (status, headers or {}, body)
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests.append((self.path, dict(self.headers)))
+                    site.connections.add(self.client_address)
+                    site.in_flight += 1
+                    site.max_in_flight = max(site.max_in_flight, site.in_flight)
+                try:
+                    if site.delay:
+                        time.sleep(site.delay)
+                    status, headers, body = site.routes.get(self.path, (200, {}, PAGE))
+                    if callable(body):
+                        body = body(self)
+                    self.send_response(status)
+                    headers = dict(headers)
+                    headers.setdefault('Content-Type', 'text/html')
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with site._lock:
+                        site.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def local_site():
+    """Start a LocalSite for the duration of a test"""
+    site = LocalSite()
+    site.thread.start()
+    yield site
+    site.server.shutdown()
+    site.server.server_close()
+
+
+class Item:
+    """Minimal stand-in for Category/Page/ProductUrl"""
+
+    def __init__(self, url, kind='dangdang'):
+        self.url = url
+        self.kind = kind
+        self.html = None
+
+
+@pytest.fixture
+def make_item():
+    """Factory for plain downloadable items"""
+    return Item
@@ -0,0 +1,220 @@
+"""
+Tests for the page archive and ReplayDownloader
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import pytest
+import mongomock
+from datetime import datetime
+from bs4 import BeautifulSoup
+from mongoengine import connect, disconnect
+from spider.downloader import archive as archive_module
+from spider.downloader.archive import ArchiveLocked, PageArchive
+from spider.downloader.ty_downloader import TyDownloader
+from spider.encoding import Encoding
+from spider.downloader.replay_downloader import ReplayDownloader
+from spider.models.product_url import ProductUrl
+
+
+PAGE = b"<html><head><title>Archived</title></head><body>Archived</body></html>"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Empty gzip archive, closed after the test"""
+    archive = PageArchive(str(tmp_path / 'archive'), codec='gzip')
+    yield archive
+    archive.close()
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestPageArchive:
+    """Test cases for PageArchive storage"""
+
+    def test_append_and_read(self, archive):
+        """Test an archived body reads back unchanged"""
+        archive.append("http://test.com/a", PAGE)
+        assert archive.read("http://test.com/a") == PAGE
+        assert archive.read("http://test.com/missing") is None
+
+    def test_records_are_compressed(self, archive):
+        """Test records take less space than the raw body"""
+        body = PAGE * 100
+        record = archive.append("http://test.com/a", body)
+        assert record.length < len(body)
+
+    def test_latest_download_wins(self, archive):
+        """Test every download is kept and reads return the latest"""
+        archive.append("http://test.com/a", b"<html>v1</html>", fetched_at=100)
+        archive.append("http://test.com/a", b"<html>v2</html>", fetched_at=200)
+
+        assert archive.read("http://test.com/a") == b"<html>v2</html>"
+        assert archive.read("http://test.com/a", before=150) == b"<html>v1</html>"
+        assert len(archive) == 2
+
+    def test_segments_roll_over(self, tmp_path):
+        """Test a full segment is closed and a new one started"""
+        archive = PageArchive(str(tmp_path), codec='gzip', segment_bytes=64)
+        records = [archive.append(f"http://test.com/{i}", os.urandom(100)) for i in range(3)]
+        archive.close()
+
+        assert [record.segment for record in records] == [1, 2, 3]
+
+    def test_reopen_keeps_records(self, tmp_path):
+        """Test the index and segments survive closing the archive"""
+        archive = PageArchive(str(tmp_path), codec='gzip')
+        archive.append("http://test.com/a", PAGE)
+        archive.close()
+
+        archive = PageArchive(str(tmp_path), codec='gzip')
+        archive.append("http://test.com/b", PAGE)
+
+        assert archive.read("http://test.com/a") == PAGE
+        assert archive.lookup("http://test.com/b").offset > 0
+        archive.close()
+
+    def test_encoding_recorded(self, archive):
+        """Test the charset a page was decoded with reads back with its record"""
+        archive.append("http://test.com/a", PAGE, encoding='gb18030')
+        archive.append("http://test.com/b", PAGE)
+
+        assert archive.lookup("http://test.com/a").encoding == 'gb18030'
+        assert archive.lookup("http://test.com/b").encoding is None
+
+    def test_index_without_encoding_upgraded(self, tmp_path):
+        """Test an index written before charsets were recorded gains the column"""
+        index = sqlite3.connect(str(tmp_path / 'index.sqlite'))
+        index.execute("CREATE TABLE records (url TEXT, fetched_at REAL, segment INTEGER, "
+                      "offset INTEGER, length INTEGER, codec TEXT)")
+        index.execute("INSERT INTO records VALUES ('http://test.com/old', 1, 1, 0, 0, 'gzip')")
+        index.commit()
+        index.close()
+
+        archive = PageArchive(str(tmp_path), codec='gzip')
+        archive.append("http://test.com/a", PAGE, encoding='utf-8')
+
+        assert archive.lookup("http://test.com/old").encoding is None
+        assert archive.read("http://test.com/a") == PAGE
+        archive.close()
+
+    @pytest.mark.skipif(archive_module.fcntl is None, reason="flock is not available")
+    def test_single_writer(self, tmp_path):
+        """Test a second process cannot append while one is writing, but can read"""
+        archive = PageArchive(str(tmp_path), codec='gzip')
+        archive.append("http://test.com/a", PAGE)
+        archive.close()
+        archive = PageArchive(str(tmp_path), codec='gzip')
+        archive.append("http://test.com/b", PAGE)
+        script = (
+            "import sys\n"
+            "from spider.downloader.archive import ArchiveLocked, PageArchive\n"
+            "archive = PageArchive(sys.argv[1], codec='gzip')\n"
+            "assert archive.read('http://test.com/a') is not None\n"
+            "try:\n"
+            "    archive.append('http://test.com/c', b'<html></html>')\n"
+            "except ArchiveLocked:\n"
+            "    sys.exit(3)\n"
+        )
+
+        other = subprocess.run([sys.executable, '-c', script, str(tmp_path)], cwd=os.getcwd())
+        archive.close()
+
+        assert other.returncode == 3
+        assert subprocess.run([sys.executable, '-c', script, str(tmp_path)]).returncode == 0
+
+    @pytest.mark.skipif(archive_module.zstandard is None, reason="zstandard is not installed")
+    def test_zstd_codec(self, tmp_path):
+        """Test zstd records read back unchanged"""
+        archive = PageArchive(str(tmp_path), codec='zstd')
+        archive.append("http://test.com/a", PAGE)
+
+        assert archive.read("http://test.com/a") == PAGE
+        archive.close()
+
+    @pytest.mark.skipif(archive_module.zstandard is not None, reason="zstandard is installed")
+    def test_zstd_codec_requires_zstandard(self, tmp_path):
+        """Test asking for zstd without the zstandard package fails loudly"""
+        with pytest.raises(ValueError):
+            PageArchive(str(tmp_path), codec='zstd')
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestReplayDownloader:
+    """Test cases for archiving downloads and replaying them"""
+
+    def test_downloads_are_archived_and_replayed(self, archive, local_site, make_item, monkeypatch):
+        """Test pages downloaded by TyDownloader replay without any request"""
+        monkeypatch.setattr(TyDownloader, 'page_archive', archive)
+        monkeypatch.setattr(ReplayDownloader, 'page_archive', archive)
+        local_site.route('/page', body=PAGE)
+        TyDownloader([make_item(local_site.url('/page'))]).run(lambda item: None)
+        requests_made = len(local_site.requests)
+
+        replayed = []
+        ReplayDownloader([make_item(local_site.url('/page'))]).run(replayed.append)
+
+        assert requests_made == 1
+        assert len(local_site.requests) == 1
+        assert "Archived" in replayed[0].html
+
+    def test_replay_uses_recorded_charset(self, archive, local_site, make_item, monkeypatch):
+        """Test a page whose charset came from its Content-Type header replays in that charset"""
+        body = "<html><body>商品列表</body></html>".encode('gb18030')
+        monkeypatch.setattr(TyDownloader, 'page_archive', archive)
+        monkeypatch.setattr(ReplayDownloader, 'page_archive', archive)
+        local_site.route('/page', body=body, headers={'Content-Type': 'text/html; charset=gbk'})
+        TyDownloader([make_item(local_site.url('/page'), kind='suning')]).run(lambda item: None)
+        monkeypatch.setattr(Encoding, 'Hosts', {})     # As in a later run
+
+        replayed = []
+        ReplayDownloader([make_item(local_site.url('/page'), kind='suning')]).run(replayed.append)
+
+        assert replayed[0].encoding == 'gb18030'
+        assert "商品列表" in replayed[0].html
+
+    def test_unarchived_items_are_skipped(self, archive, make_item, monkeypatch):
+        """Test items missing from the archive are logged and not called back"""
+        monkeypatch.setattr(ReplayDownloader, 'page_archive', archive)
+        archive.append("http://test.com/a", PAGE)
+        items = [make_item("http://test.com/a"), make_item("http://test.com/b")]
+        replayed = []
+
+        ReplayDownloader(items).run(replayed.append)
+
+        assert replayed == [items[0]]
+
+    def test_completed_items_are_parsed_again(self, archive, monkeypatch):
+        """Test archived items are selected and parsed again whatever their state"""
+        connect('testdb', host='localhost', mongo_client_class=mongomock.MongoClient, alias='default')
+        ProductUrl.drop_collection()
+        try:
+            monkeypatch.setattr(ReplayDownloader, 'page_archive', archive)
+            ProductUrl(url="http://test.com/a", kind='suning', completed=True).save()
+            ProductUrl(url="http://test.com/b", kind='suning', dead=True, retry_at=datetime(2999, 1, 1)).save()
+            ProductUrl(url="http://test.com/c", kind='suning').save()
+            archive.append("http://test.com/a", PAGE)
+            archive.append("http://test.com/b", PAGE)
+            titles = {}
+
+            def parse(product_url):
+                titles[product_url.url] = BeautifulSoup(product_url.html, 'html.parser').title.get_text()
+
+            selected = ReplayDownloader.select(ProductUrl.from_kind('suning'), 10)
+            ReplayDownloader(selected).run(parse)
+
+            assert titles == {"http://test.com/a": "Archived", "http://test.com/b": "Archived"}
+            assert [ReplayDownloader.selects(item) for item in ProductUrl.objects.order_by('url')] == \
+                [True, True, False]
+            assert [item.url for item in TyDownloader.select(ProductUrl.from_kind('suning'))] == ["http://test.com/c"]
+        finally:
+            ProductUrl.drop_collection()
+            disconnect(alias='default')
+
+    def test_requires_archive(self, make_item):
+        """Test replaying without --archive fails loudly"""
+        with pytest.raises(ValueError):
+            ReplayDownloader([make_item("http://test.com/a")]).run(lambda item: None)
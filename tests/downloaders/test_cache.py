@@ -0,0 +1,123 @@
+"""
+Tests for the on-disk response cache
+"""
+import time
+import pytest
+from spider.downloader.cache import ResponseCache, CacheEntry
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+PAGE = b"<html><head><title>Cached</title></head><body>Cached</body></html>"
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestResponseCache:
+    """Test cases for ResponseCache storage"""
+
+    def test_store_and_lookup(self, tmp_path):
+        """Test a stored body and its validators are read back"""
+        cache = ResponseCache(str(tmp_path))
+        cache.store("http://test.com/a", PAGE, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+
+        entry = cache.lookup("http://test.com/a")
+
+        assert entry.body == PAGE
+        assert entry.validators() == {
+            'If-None-Match': '"v1"',
+            'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'
+        }
+
+    def test_lookup_missing(self, tmp_path):
+        """Test an unknown URL is a miss"""
+        assert ResponseCache(str(tmp_path)).lookup("http://test.com/none") is None
+
+    def test_is_fresh(self):
+        """Test freshness honours max_age, with 0 meaning always revalidate"""
+        entry = CacheEntry("http://test.com", PAGE, {}, time.time() - 10)
+        assert entry.is_fresh(60)
+        assert not entry.is_fresh(5)
+        assert not entry.is_fresh(0)
+
+    def test_refresh_restarts_max_age(self, tmp_path):
+        """Test refresh() after a 304 makes the entry fresh again"""
+        cache = ResponseCache(str(tmp_path))
+        entry = cache.store("http://test.com/a", PAGE, {})
+        entry.stored_at -= 100
+        cache.refresh(entry)
+
+        assert cache.lookup("http://test.com/a").is_fresh(60)
+
+    def test_entry_is_one_file(self, tmp_path):
+        """Test headers and body are replaced together, so a reader never mixes two downloads"""
+        cache = ResponseCache(str(tmp_path))
+        cache.store("http://test.com/a", PAGE, {'ETag': '"v1"'})
+        cache.store("http://test.com/a", b"<html>v2</html>", {'ETag': '"v2"'})
+
+        entry = cache.lookup("http://test.com/a")
+
+        assert (entry.body, entry.headers) == (b"<html>v2</html>", {'ETag': '"v2"'})
+        assert [p.suffix for p in tmp_path.rglob('*') if p.is_file()] == ['.entry']
+
+    def test_corrupt_entry_is_a_miss(self, tmp_path):
+        """Test an entry whose header line does not parse is not served"""
+        cache = ResponseCache(str(tmp_path))
+        cache.store("http://test.com/a", PAGE, {})
+        with open(cache._path("http://test.com/a") + '.entry', 'wb') as f:
+            f.write(b'{"url": "http://te')
+
+        assert cache.lookup("http://test.com/a") is None
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderCache:
+    """Test cases for conditional requests through every downloader"""
+
+    @pytest.fixture(autouse=True)
+    def cache(self, tmp_path, downloader_class, monkeypatch):
+        """Enable a response cache without per-site max-age"""
+        monkeypatch.setattr(downloader_class, 'response_cache', ResponseCache(str(tmp_path)))
+        monkeypatch.setattr(downloader_class, 'SiteSettings', {})
+        return downloader_class.response_cache
+
+    def test_revalidates_with_etag(self, downloader_class, local_site, make_item):
+        """Test the second run sends If-None-Match and uses the cached body on 304"""
+        local_site.route('/page', body=PAGE, headers={'ETag': '"v1"'})
+        first = list(downloader_class([make_item(local_site.url('/page'))]).iter_results())
+
+        local_site.route('/page', body=b"", status=304, headers={'ETag': '"v1"'})
+        item = make_item(local_site.url('/page'))
+        second = list(downloader_class([item]).iter_results())
+
+        assert first[0][1].from_cache is False
+        assert local_site.requests[1][1].get('If-None-Match') == '"v1"'
+        assert second[0][1].from_cache is True
+        assert second[0][1].body == PAGE
+        assert "Cached" in item.html
+
+    def test_fresh_entry_skips_request(self, downloader_class, local_site, make_item, cache):
+        """Test a page within the site's max-age is served without a request"""
+        downloader_class.SiteSettings = {'dangdang': {'cache_max_age': 3600}}
+        cache.store(local_site.url('/page'), PAGE, {})
+        item = make_item(local_site.url('/page'))
+
+        results = list(downloader_class([item]).iter_results())
+
+        assert local_site.requests == []
+        assert results[0][1].from_cache is True
+        assert "Cached" in item.html
+
+    def test_changed_page_replaces_entry(self, downloader_class, local_site, make_item, cache):
+        """Test a 200 answer to a conditional request updates the cache"""
+        cache.store(local_site.url('/page'), b"<html><body>old</body></html>", {'ETag': '"v0"'})
+        local_site.route('/page', body=PAGE, headers={'ETag': '"v1"'})
+
+        list(downloader_class([make_item(local_site.url('/page'))]).iter_results())
+
+        entry = cache.lookup(local_site.url('/page'))
+        assert entry.body == PAGE
+        assert entry.headers['ETag'] == '"v1"'
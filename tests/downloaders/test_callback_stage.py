@@ -0,0 +1,230 @@
+"""
+Tests for spider.downloader.callback_stage
+"""
+import os
+import threading
+import time
+import pytest
+import mongomock
+from functools import partial
+from mongoengine import connect, disconnect
+from unittest.mock import Mock, patch
+from spider.encoding import Encoding
+from spider.models.product_url import ProductUrl
+from spider.downloader.callback_stage import CallbackStage
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader import Downloader
+
+
+def save_and_count(directory, item):
+    """Callback run in a worker process: save a document and write the product URLs it sees"""
+    ProductUrl(url=f"{item.url}/saved", kind=item.kind).save()
+    with open(os.path.join(directory, 'saved'), 'w', encoding='utf-8') as f:
+        f.write(" ".join(product_url.url for product_url in ProductUrl.objects))
+
+
+def write_html(directory, item):
+    """Callback run in a worker process: write what it received to a file"""
+    with open(os.path.join(directory, f"{os.getpid()}-{item.url.rsplit('/', 1)[-1]}"), 'w', encoding='utf-8') as f:
+        f.write(f"{item.kind}|{item.encoding}|{item.html}")
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestCallbackStage:
+    """Test cases for CallbackStage"""
+
+    def test_processes_every_item(self):
+        """Test every item put into the stage reaches the callback"""
+        seen = []
+        with CallbackStage(seen.append, workers=3) as stage:
+            for i in range(50):
+                stage.put(i)
+        assert sorted(seen) == list(range(50))
+
+    def test_runs_callbacks_in_parallel(self):
+        """Test callbacks run concurrently on the worker threads"""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def callback(item):
+            with lock:
+                active.append(item)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(item)
+
+        with CallbackStage(callback, workers=4) as stage:
+            for i in range(12):
+                stage.put(i)
+
+        assert max(peak) > 1
+        assert max(peak) <= 4
+
+    def test_inline_when_no_workers(self):
+        """Test workers=0 runs callbacks in the calling thread"""
+        threads = []
+        with CallbackStage(lambda item: threads.append(threading.current_thread()), workers=0) as stage:
+            stage.put(1)
+        assert threads == [threading.current_thread()]
+
+    def test_queue_is_bounded(self):
+        """Test the handoff queue defaults to twice the worker count"""
+        stage = CallbackStage(Mock(), workers=3)
+        assert stage.queue.maxsize == 6
+        assert CallbackStage(Mock(), workers=3, queue_size=10).queue.maxsize == 10
+
+    def test_put_blocks_when_queue_full(self):
+        """Test put applies backpressure while workers are busy"""
+        release = threading.Event()
+        stage = CallbackStage(lambda item: release.wait(), workers=1, queue_size=1)
+        stage.start()
+        stage.put(1)  # taken by the worker
+        stage.put(2)  # fills the queue
+
+        blocked = threading.Thread(target=stage.put, args=(3,))
+        blocked.start()
+        blocked.join(0.1)
+        assert blocked.is_alive()
+
+        release.set()
+        blocked.join(1)
+        stage.close()
+        assert not blocked.is_alive()
+
+    def test_callback_errors_are_logged(self):
+        """Test a failing callback is logged and does not stop the stage"""
+        logger = Mock()
+        seen = []
+
+        def callback(item):
+            if item == 1:
+                raise ValueError("boom")
+            seen.append(item)
+
+        with CallbackStage(callback, workers=2, logger=logger) as stage:
+            for i in range(3):
+                stage.put(i)
+
+        assert sorted(seen) == [0, 2]
+        logger.error.assert_called_once()
+        assert "boom" in logger.error.call_args[0][0]
+
+    def test_process_workers_receive_the_page(self, tmp_path):
+        """Test a model sent to a process worker still has its downloaded html"""
+        product_url = ProductUrl(url='http://shop.test/p/1', kind='dangdang')
+        Encoding.set_utf8_html(product_url, "<html><title>页面</title></html>".encode('gb18030'),
+                               encoding='gb18030')
+        logger = Mock()
+
+        with CallbackStage(partial(write_html, str(tmp_path)), workers=1, processes=True,
+                           logger=logger) as stage:
+            stage.put(product_url)
+
+        logger.error.assert_not_called()
+        [written] = list(tmp_path.iterdir())
+        assert not written.name.startswith(f"{os.getpid()}-")
+        assert written.read_text(encoding='utf-8') == "dangdang|gb18030|<html><title>页面</title></html>"
+
+    def test_process_workers_open_their_own_connection(self, tmp_path):
+        """Test a process worker saves through a MongoDB connection of its own, not the forked one"""
+        settings = {'db': 'testdb', 'host': 'mongodb://localhost', 'mongo_client_class': mongomock.MongoClient}
+        connect(**settings)
+        try:
+            product_url = ProductUrl(url='http://shop.test/p/1', kind='dangdang')
+            product_url.save()
+            logger = Mock()
+
+            with CallbackStage(partial(save_and_count, str(tmp_path)), workers=1, processes=True,
+                               logger=logger, mongo_settings=settings) as stage:
+                stage.put(product_url)
+
+            logger.error.assert_not_called()
+            # The worker's in-memory database is its own: the URL saved by the parent is not in it
+            assert (tmp_path / 'saved').read_text(encoding='utf-8') == 'http://shop.test/p/1/saved'
+        finally:
+            ProductUrl.drop_collection()
+            disconnect()
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestDownloaderConfigure:
+    """Test cases for run-wide download settings"""
+
+    @pytest.fixture(autouse=True)
+    def restore(self):
+        """Drop settings configure() stored on TyDownloader"""
+        yield
+        for name in ('concurrency', 'callback_workers', 'callback_processes', 'response_cache'):
+            if name in vars(TyDownloader):
+                delattr(TyDownloader, name)
+
+    def test_configure_sets_concurrency_and_workers(self):
+        """Test configure applies the -c and -w options"""
+        TyDownloader.configure({'concurrency': 5, 'workers': 3})
+        downloader = TyDownloader([])
+        assert downloader.max_workers == 5
+        assert downloader.max_concurrency() == 5
+        assert downloader.callback_workers == 3
+
+    def test_configure_process_executor(self):
+        """Test --executor process switches callbacks to a process pool"""
+        TyDownloader.configure({'workers': 2, 'executor': 'process'})
+        stage = TyDownloader([]).callback_stage(lambda item: None)
+        assert stage.processes is True
+        assert stage.workers == 2
+
+    def test_configure_zero_concurrency_keeps_default(self):
+        """Test concurrency 0 keeps each downloader's default"""
+        TyDownloader.configure({'concurrency': 0, 'workers': 1})
+        assert TyDownloader([]).max_workers == 20
+        assert Downloader().max_concurrency() == 10
+
+    def test_configure_cache(self, tmp_path):
+        """Test --cache enables a response cache in the given directory"""
+        TyDownloader.configure({'cache': str(tmp_path / 'cache')})
+        assert TyDownloader([]).response_cache.directory == str(tmp_path / 'cache')
+        assert Downloader.response_cache is None
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestTyDownloaderCallbackStage:
+    """Test cases for TyDownloader callback execution"""
+
+    @patch.object(TyDownloader, '_download', return_value=Mock())
+    def test_callbacks_run_off_main_thread(self, mock_download):
+        """Test callbacks run on callback workers, not the download loop"""
+        threads = set()
+        downloader = TyDownloader([Mock(url=f"http://test.com/{i}", kind="dangdang") for i in range(20)])
+        downloader.callback_workers = 4
+
+        downloader.run(lambda item: threads.add(threading.current_thread().name))
+
+        assert threads
+        assert all(name.startswith("callback-") for name in threads)
+
+    @patch.object(TyDownloader, '_download', return_value=Mock())
+    def test_callback_concurrency_independent_of_downloads(self, mock_download):
+        """Test callback parallelism follows callback_workers"""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def callback(item):
+            with lock:
+                active.append(item)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.remove(item)
+
+        downloader = TyDownloader([Mock(url=f"http://test.com/{i}", kind="dangdang") for i in range(30)])
+        downloader.callback_workers = 3
+        downloader.run(callback)
+
+        assert len(peak) == 30
+        assert max(peak) <= 3
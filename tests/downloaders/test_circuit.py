@@ -0,0 +1,112 @@
+"""
+Tests for per-host circuit breakers
+"""
+from unittest.mock import Mock, patch
+import pytest
+from spider.downloader.circuit import CircuitBreaker, CircuitBreakers
+from spider.downloader.metrics import Metrics
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestCircuitBreaker:
+    """Test cases for breaker state transitions"""
+
+    def test_opens_after_threshold(self):
+        """Test consecutive failures open the breaker"""
+        breaker = CircuitBreaker(threshold=3, cooldown=60)
+        breaker.failure()
+        breaker.failure()
+        assert breaker.allow()
+        breaker.failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_success_resets_failures(self):
+        """Test a success in between restarts the count"""
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_single_probe_after_cooldown(self):
+        """Test only one request is let through once the cool-down is over"""
+        breaker = CircuitBreaker(threshold=1, cooldown=30)
+        with patch('spider.downloader.circuit.time.monotonic', return_value=100):
+            breaker.failure()
+        with patch('spider.downloader.circuit.time.monotonic', return_value=131):
+            assert breaker.allow()
+            assert breaker.state == CircuitBreaker.HALF_OPEN
+            assert not breaker.allow()
+
+    def test_probe_outcome(self):
+        """Test the probe closes the breaker on success and reopens it on failure"""
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.failure()
+        assert breaker.allow()
+        breaker.failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow()
+        breaker.success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_registry_feedback(self):
+        """Test 5xx and timeouts count as failures, other statuses as successes"""
+        breakers = CircuitBreakers(threshold=2)
+        breakers.feedback('a.com', 503)
+        breakers.feedback('a.com', None)
+        breakers.feedback('b.com', 404)
+        assert not breakers.allow('a.com')
+        assert breakers.allow('b.com')
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderCircuit:
+    """Test cases for failing fast through every downloader"""
+
+    def test_open_breaker_fails_fast_without_recording(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test a down host gets `threshold` requests and skipped items are not marked failed"""
+        retry_scheduler = Mock()
+        metrics = Metrics()
+        monkeypatch.setattr(downloader_class, 'metrics', metrics)
+        monkeypatch.setattr(downloader_class, 'circuit_breakers', CircuitBreakers(threshold=3))
+        monkeypatch.setattr(downloader_class, 'retry_scheduler', retry_scheduler)
+        monkeypatch.setattr(downloader_class, 'concurrency', 1)
+        for i in range(20):
+            local_site.route(f"/p{i}", status=503, body=b"down")
+
+        downloader_class([make_item(local_site.url(f"/p{i}")) for i in range(20)]).run(lambda item: None)
+
+        assert len(local_site.requests) == 3
+        assert retry_scheduler.record_failure.call_count == 3
+        labels = {'site': 'dangdang', 'stage': 'Item'}
+        assert metrics.value('spider_items_skipped_total', reason='circuit_open', **labels) == 17
+        assert metrics.value('spider_items_failed_total', reason='circuit_open', **labels) == 0
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader])
+class TestRequestsCircuit:
+    """Test cases for requests errors reaching the breaker"""
+
+    def test_broken_body_counts_against_host(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test a body broken off mid-transfer trips the breaker like a refused connection"""
+        retry_scheduler = Mock()
+        monkeypatch.setattr(downloader_class, 'metrics', Metrics())
+        monkeypatch.setattr(downloader_class, 'circuit_breakers', CircuitBreakers(threshold=3))
+        monkeypatch.setattr(downloader_class, 'retry_scheduler', retry_scheduler)
+        monkeypatch.setattr(downloader_class, 'concurrency', 1)
+        for i in range(5):
+            local_site.route(f"/p{i}", body=b"zz\r\nbroken", headers={'Transfer-Encoding': 'chunked'})
+
+        downloader_class([make_item(local_site.url(f"/p{i}")) for i in range(5)]).run(lambda item: None)
+
+        assert len(local_site.requests) == 3
+        assert [c.args[1] for c in retry_scheduler.record_failure.call_args_list] == ['connection'] * 3
@@ -0,0 +1,182 @@
+"""
+Tests for coalescing downloads of the same URL within a run and across runs
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from spider.downloader.cache import ResponseCache
+from spider.downloader.metrics import Metrics
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+PAGE = b"<html><head><title>Shared</title></head><body>Shared</body></html>"
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestCacheClaims:
+    """Test cases for URL claims in a shared cache directory"""
+
+    def test_claim_is_exclusive(self, tmp_path):
+        """Test a claimed URL cannot be claimed by another run until released"""
+        ours, theirs = ResponseCache(str(tmp_path)), ResponseCache(str(tmp_path))
+
+        assert ours.claim("http://test.com/a")
+        assert not theirs.claim("http://test.com/a")
+        assert theirs.claim("http://test.com/b")
+
+        ours.release("http://test.com/a")
+        assert theirs.claim("http://test.com/a")
+
+    def test_release_ignores_foreign_claims(self, tmp_path):
+        """Test a run cannot release a claim it does not hold"""
+        ours, theirs = ResponseCache(str(tmp_path)), ResponseCache(str(tmp_path))
+        theirs.claim("http://test.com/a")
+
+        ours.release("http://test.com/a")
+
+        assert not ours.claim("http://test.com/a")
+
+    def test_stale_claim_taken_over(self, tmp_path):
+        """Test the claim of a run that died is taken over after CLAIM_TTL"""
+        ours, theirs = ResponseCache(str(tmp_path)), ResponseCache(str(tmp_path))
+        theirs.claim("http://test.com/a")
+        path = theirs._path("http://test.com/a") + '.lock'
+        old = time.time() - ResponseCache.CLAIM_TTL - 1
+        os.utime(path, (old, old))
+
+        assert ours.claim("http://test.com/a")
+
+    @pytest.mark.skipif(os.name != 'posix', reason="claims are only checked for live pids on POSIX")
+    def test_claim_of_dead_process_taken_over(self, tmp_path):
+        """Test the claim of a run that died on this host is taken over without waiting"""
+        ours = ResponseCache(str(tmp_path))
+        path = ours._path("http://test.com/a") + '.lock'
+        os.makedirs(os.path.dirname(path))
+        dead = subprocess.Popen([sys.executable, '-c', ''])
+        dead.wait()
+        with open(path, 'w') as f:
+            f.write(f"{socket.gethostname()} {dead.pid}")
+
+        assert ours.claim("http://test.com/a")
+
+    def test_claim_of_live_process_kept(self, tmp_path):
+        """Test the claim of a running process, or one on another host, is left until it expires"""
+        ours = ResponseCache(str(tmp_path))
+        path = ours._path("http://test.com/a") + '.lock'
+        os.makedirs(os.path.dirname(path))
+        for owner in (f"{socket.gethostname()} {os.getppid()}", f"other-host {os.getpid() + 1}"):
+            with open(path, 'w') as f:
+                f.write(owner)
+
+            assert not ours.claim("http://test.com/a")
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [TyDownloader, EmDownloader])
+class TestInFlightCoalescing:
+    """Test cases for duplicate URLs within one batch"""
+
+    def test_duplicates_fetched_once(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test every item of a duplicated URL gets the page of a single request"""
+        monkeypatch.setattr(downloader_class, 'concurrency', 4)
+        local_site.delay = 0.1
+        local_site.route('/same', body=PAGE)
+        items = [make_item(local_site.url('/same')) for _ in range(4)] + [make_item(local_site.url('/other'))]
+
+        results = list(downloader_class(items).iter_results())
+
+        assert len(results) == 5
+        assert sorted(path for path, _ in local_site.requests) == ['/other', '/same']
+        assert all("Shared" in item.html for item in items[:4])
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestSequentialDuplicates:
+    """Test cases for duplicate URLs within one NormalDownloader batch"""
+
+    def test_duplicates_skipped(self, local_site, make_item, monkeypatch):
+        """Test a URL already downloaded in the batch is not fetched again"""
+        metrics = Metrics()
+        monkeypatch.setattr(NormalDownloader, 'metrics', metrics)
+        local_site.route('/same', body=PAGE)
+        items = [make_item(local_site.url('/same')), make_item(local_site.url('/other')),
+                 make_item(local_site.url('/same'))]
+
+        results = list(NormalDownloader(items).iter_results())
+
+        assert [item for item, _ in results] == items[:2]
+        assert sorted(path for path, _ in local_site.requests) == ['/other', '/same']
+        assert metrics.value('spider_items_skipped_total', site='dangdang', stage='Item', reason='duplicate') == 1
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestCrossRunCoalescing:
+    """Test cases for runs sharing a cache directory"""
+
+    def test_waits_for_other_run(self, downloader_class, local_site, make_item, tmp_path, monkeypatch):
+        """Test a URL another run is downloading is served from its stored page"""
+        monkeypatch.setattr(downloader_class, 'response_cache', ResponseCache(str(tmp_path)))
+        monkeypatch.setattr(downloader_class, 'SiteSettings', {})
+        other_run = ResponseCache(str(tmp_path))
+        url = local_site.url('/page')
+        other_run.claim(url)
+
+        def finish():
+            time.sleep(0.3)
+            other_run.store(url, PAGE, {})
+            other_run.release(url)
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        item = make_item(url)
+        results = list(downloader_class([item]).iter_results())
+        thread.join()
+
+        assert local_site.requests == []
+        assert results[0][1].from_cache is True
+        assert "Shared" in item.html
+
+    def test_downloads_when_other_run_fails(self, downloader_class, local_site, make_item, tmp_path,
+                                            monkeypatch):
+        """Test the URL is downloaded once the other run gives up its claim without a page"""
+        monkeypatch.setattr(downloader_class, 'response_cache', ResponseCache(str(tmp_path)))
+        monkeypatch.setattr(downloader_class, 'SiteSettings', {})
+        other_run = ResponseCache(str(tmp_path))
+        url = local_site.url('/page')
+        other_run.claim(url)
+        timer = threading.Timer(0.3, other_run.release, (url,))
+        timer.start()
+
+        results = list(downloader_class([make_item(url)]).iter_results())
+        timer.join()
+
+        assert len(local_site.requests) == 1
+        assert results[0][1].from_cache is False
+        assert downloader_class.response_cache.claim(url)
+
+    def test_claim_taken_by_third_run(self, downloader_class, local_site, make_item, tmp_path, monkeypatch):
+        """Test a URL whose claim passes to a third run after CLAIM_TTL is left to that run"""
+        cache = ResponseCache(str(tmp_path))
+        monkeypatch.setattr(cache, 'CLAIM_TTL', 0.3)
+        monkeypatch.setattr(cache, 'claim', lambda url: False)
+        monkeypatch.setattr(downloader_class, 'response_cache', cache)
+        monkeypatch.setattr(downloader_class, 'SiteSettings', {})
+
+        metrics = Metrics()
+        monkeypatch.setattr(downloader_class, 'metrics', metrics)
+
+        results = list(downloader_class([make_item(local_site.url('/page'))]).iter_results())
+
+        assert results == []
+        assert local_site.requests == []
+        assert metrics.value('spider_items_skipped_total', site='dangdang', stage='Item', reason='claimed') == 1
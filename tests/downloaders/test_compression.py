@@ -0,0 +1,72 @@
+"""
+Tests for Content-Encoding negotiation and compressed transfers
+"""
+import gzip
+import zlib
+import pytest
+from spider.downloader import compression
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+PAGE = "<html><head><title>商品</title></head><body>商品列表</body></html>".encode('gb18030')
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestCompression:
+    """Test cases for the advertised encodings"""
+
+    def test_gzip_and_deflate_advertised(self):
+        """Test gzip and deflate are always advertised"""
+        assert compression.ACCEPT_ENCODING.startswith('gzip, deflate')
+
+    @pytest.mark.skipif(compression.brotli is not None, reason="brotli is installed")
+    def test_no_br_without_brotli(self):
+        """Test br is not advertised when no brotli binding is installed"""
+        assert 'br' not in compression.ENCODINGS
+
+    @pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+    def test_br_with_brotli(self):
+        """Test br is advertised when a brotli binding is installed"""
+        assert compression.ACCEPT_ENCODING == 'gzip, deflate, br'
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderCompression:
+    """Test cases for compressed transfers through every downloader"""
+
+    def test_accept_encoding_sent(self, downloader_class, local_site, make_item):
+        """Test every downloader advertises the same encodings"""
+        list(downloader_class([make_item(local_site.url('/p'))]).iter_results())
+
+        headers = {name.lower(): value for name, value in local_site.requests[0][1].items()}
+        assert headers['accept-encoding'] == compression.ACCEPT_ENCODING
+
+    @pytest.mark.parametrize('encoding, body', [
+        ('gzip', gzip.compress(PAGE)),
+        ('deflate', zlib.compress(PAGE)),
+    ])
+    def test_compressed_page_decoded_with_site_charset(self, downloader_class, local_site, make_item,
+                                                       encoding, body):
+        """Test a compressed GB18030 page arrives as bytes and is decoded by Encoding"""
+        local_site.route('/p', body=body, headers={'Content-Encoding': encoding})
+        item = make_item(local_site.url('/p'))
+
+        results = list(downloader_class([item]).iter_results())
+
+        assert results[0][1].body == PAGE
+        assert '商品列表' in item.html
+
+    @pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+    def test_brotli_page_decoded(self, downloader_class, local_site, make_item):
+        """Test a br page is decompressed by the transport when brotli is advertised"""
+        local_site.route('/p', body=compression.brotli.compress(PAGE), headers={'Content-Encoding': 'br'})
+        item = make_item(local_site.url('/p'))
+
+        results = list(downloader_class([item]).iter_results())
+
+        assert results[0][1].body == PAGE
@@ -0,0 +1,134 @@
+"""
+Tests for the shared DNS cache and connection pre-warming
+"""
+import re
+import socket
+from pathlib import Path
+from unittest.mock import patch
+import pytest
+import requests
+import urllib3
+from urllib3.connectionpool import HTTPConnectionPool
+from spider.downloader.dns import DnsCache
+from spider.downloader.session import SessionPool
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+ADDRESS = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 80))]
+
+
+@pytest.fixture
+def sessions():
+    """Fresh shared sessions for each test"""
+    SessionPool.close_all()
+    yield
+    SessionPool.close_all()
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestDnsCache:
+    """Test cases for caching, expiry and invalidation"""
+
+    def test_resolves_once_within_ttl(self):
+        """Test repeated lookups of a host are served from the cache"""
+        cache = DnsCache(ttl=60)
+        with patch('spider.downloader.dns.socket.getaddrinfo', return_value=ADDRESS) as getaddrinfo:
+            for _ in range(5):
+                assert cache.resolve('www.dangdang.com', 80) == ADDRESS
+        assert getaddrinfo.call_count == 1
+        assert (cache.misses, cache.hits) == (1, 4)
+
+    def test_entry_expires_after_ttl(self):
+        """Test a host is resolved again once its entry is older than the TTL"""
+        cache = DnsCache(ttl=60)
+        with patch('spider.downloader.dns.socket.getaddrinfo', return_value=ADDRESS) as getaddrinfo:
+            with patch('spider.downloader.dns.time.monotonic', return_value=1000):
+                cache.resolve('www.dangdang.com', 80)
+            with patch('spider.downloader.dns.time.monotonic', return_value=1061):
+                cache.resolve('www.dangdang.com', 80)
+        assert getaddrinfo.call_count == 2
+
+    def test_invalidate(self):
+        """Test invalidated hosts are looked up again"""
+        cache = DnsCache()
+        with patch('spider.downloader.dns.socket.getaddrinfo', return_value=ADDRESS):
+            cache.resolve('www.dangdang.com', 80)
+            cache.resolve('www.dangdang.com', 443)
+        cache.invalidate('www.dangdang.com')
+        assert cache.lookup('www.dangdang.com', 80) is None
+        assert cache.lookup('www.dangdang.com', 443) is None
+
+    def test_is_ip(self):
+        """Test IP literals are recognised and names are not"""
+        assert DnsCache.is_ip('127.0.0.1')
+        assert DnsCache.is_ip('[::1]')
+        assert not DnsCache.is_ip('list.tmall.com')
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderDns:
+    """Test cases for the DNS cache and pre-warming through every downloader"""
+
+    def test_host_resolved_once(self, downloader_class, local_site, make_item, monkeypatch, sessions):
+        """Test every connection to a host reuses one cached lookup"""
+        cache = DnsCache()
+        monkeypatch.setattr(downloader_class, 'dns_cache', cache)
+        monkeypatch.setattr(SessionPool, 'dns_cache', cache)
+        monkeypatch.setattr(downloader_class, 'concurrency', 4)
+        local_site.delay = 0.05
+        items = [make_item(f"http://localhost:{local_site.port}/p{i}") for i in range(8)]
+
+        results = list(downloader_class(items).iter_results())
+
+        assert len(results) == 8
+        assert cache.misses == 1
+        assert cache.lookup('localhost', local_site.port) is not None
+
+    def test_prewarm_keeps_every_item(self, downloader_class, local_site, make_item, monkeypatch, sessions):
+        """Test the items peeked at for pre-warming are still downloaded"""
+        monkeypatch.setattr(downloader_class, 'prewarm', True)
+        monkeypatch.setattr(downloader_class, 'dns_cache', DnsCache())
+        monkeypatch.setattr(downloader_class, 'concurrency', 2)
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(5)]
+
+        results = list(downloader_class(iter(items)).iter_results())
+
+        assert sorted(item.url for item, _ in results) == sorted(item.url for item in items)
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestSessionPrewarm:
+    """Test cases for opening pooled connections ahead of a batch"""
+
+    def test_prewarm_opens_idle_connections(self, local_site, sessions):
+        """Test the pool holds connected, idle connections after pre-warming"""
+        session = SessionPool.get(4)
+
+        assert SessionPool.prewarm(session, local_site.url('/'), 3) == 3
+
+        pool = session.get_adapter(local_site.url('/')).poolmanager.connection_from_url(local_site.url('/'))
+        assert sum(1 for conn in list(pool.pool.queue) if conn is not None and conn.is_connected) == 3
+
+    def test_urllib3_matches_pin(self):
+        """Test the installed urllib3 is the major version pinned for prewarm's pool internals"""
+        requirements = (Path(__file__).parents[2] / 'requirements.txt').read_text()
+        pin = re.search(r'^urllib3>=(\d+)\.\d+,<(\d+)', requirements, re.M)
+
+        assert pin is not None
+        assert int(pin.group(1)) <= int(urllib3.__version__.split('.')[0]) < int(pin.group(2))
+        assert hasattr(HTTPConnectionPool, '_get_conn') and hasattr(HTTPConnectionPool, '_put_conn')
+
+    def test_no_cached_address_is_a_resolution_error(self, local_site, sessions, monkeypatch):
+        """Test a host the DNS cache has no address for fails as a connection error"""
+        cache = DnsCache()
+        monkeypatch.setattr(SessionPool, 'dns_cache', cache)
+        monkeypatch.setattr(cache, 'resolve', lambda host, port: [])
+
+        with pytest.raises(requests.ConnectionError):
+            SessionPool.get(1).get(f"http://localhost:{local_site.port}/p", timeout=5)
@@ -254,7 +254,7 @@ class TestEmDownloaderFetch:
                 await downloader._fetch(mock_session, mock_item, callback)
 
         # Verify
-        mock_encoding.assert_called_once_with(mock_item, b"\xe4\xb8\xad\xe6\x96\x87")
+        mock_encoding.assert_called_once_with(mock_item, b"\xe4\xb8\xad\xe6\x96\x87", {})
 
 
 @pytest.mark.unit
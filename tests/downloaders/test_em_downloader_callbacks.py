@@ -0,0 +1,112 @@
+"""
+Tests for EmDownloader callback dispatch off the event loop
+"""
+import asyncio
+import os
+import threading
+import time
+import pytest
+from spider.downloader.callback_stage import CallbackStage
+from spider.downloader.em_downloader import EmDownloader
+
+
+def write_marker(path):
+    """Picklable callback used by the process-pool tests"""
+    with open(path, 'w') as f:
+        f.write(str(os.getpid()))
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestEmDownloaderCallbacks:
+    """Test cases for EmDownloader callback execution"""
+
+    def test_callbacks_run_off_event_loop(self, local_site, make_item):
+        """Test callbacks never run on the event loop thread"""
+        threads = set()
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(10)]
+
+        EmDownloader(items).run(lambda item: threads.add(threading.current_thread()))
+
+        assert threads
+        assert threading.main_thread() not in threads
+
+    def test_slow_callbacks_do_not_stall_downloads(self, local_site, make_item):
+        """Test downloads finish while a slow callback is still processing pages"""
+        download_done_at = []
+        callback_done_at = []
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(6)]
+
+        def slow_callback(item):
+            time.sleep(0.1)
+            callback_done_at.append(time.monotonic())
+            download_done_at.append(len(local_site.requests))
+
+        downloader = EmDownloader(items)
+        downloader.callback_workers = 1
+        downloader.run(slow_callback)
+
+        assert len(callback_done_at) == 6
+        # By the time the first page is processed every page has been fetched
+        assert download_done_at[0] == 6
+
+    def test_callback_errors_are_logged(self, local_site, make_item):
+        """Test a failing callback is logged and the run continues"""
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(3)]
+        seen = []
+
+        def callback(item):
+            if item is items[0]:
+                raise RuntimeError("parse failed")
+            seen.append(item)
+
+        downloader = EmDownloader(items)
+        errors = []
+        downloader._logger = type('Logger', (), {'error': lambda self, msg: errors.append(msg)})()
+        downloader.run(callback)
+
+        assert len(seen) == 2
+        assert any("parse failed" in msg for msg in errors)
+
+    def test_sink_errors_keep_workers_running(self, local_site, make_item):
+        """Test an item whose sink raises is logged and the worker goes on with the queue"""
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(5)]
+        seen = []
+
+        async def sink(item, response):
+            seen.append(item)
+            if item is items[0]:
+                raise RuntimeError("sink failed")
+
+        downloader = EmDownloader(items)
+        downloader.concurrency = 1
+        errors = []
+        downloader._logger = type('Logger', (), {'error': lambda self, msg: errors.append(msg)})()
+        asyncio.run(downloader._download_all(items, sink))
+
+        assert seen == items
+        assert any("sink failed" in msg for msg in errors)
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestCallbackStageProcesses:
+    """Test cases for process-pool callback execution"""
+
+    def test_callbacks_run_in_worker_processes(self, tmp_path):
+        """Test processes=True runs callbacks outside the current process"""
+        paths = [str(tmp_path / f"{i}.txt") for i in range(4)]
+
+        with CallbackStage(write_marker, workers=2, processes=True) as stage:
+            for path in paths:
+                stage.put(path)
+
+        pids = {open(path).read() for path in paths}
+        assert str(os.getpid()) not in pids
+
+    def test_processes_ignored_without_workers(self):
+        """Test inline stages never start a process pool"""
+        stage = CallbackStage(lambda item: None, workers=0, processes=True)
+        with stage:
+            stage.put(1)
+        assert stage.processes is False
@@ -0,0 +1,95 @@
+"""
+Tests for EmDownloader global and per-host concurrency limits
+"""
+import pytest
+from unittest.mock import Mock
+from spider.downloader import Downloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestDownloaderConcurrencySettings:
+    """Test cases for the base concurrency settings"""
+
+    def test_max_host_concurrency_uses_site_settings(self):
+        """Test per-host limit comes from SiteSettings"""
+        downloader = Downloader()
+        assert downloader.max_host_concurrency('tmall') == Downloader.SiteSettings['tmall']['host_concurrency']
+
+    def test_max_host_concurrency_defaults_to_global_limit(self):
+        """Test unknown sites fall back to max_concurrency()"""
+        downloader = Downloader()
+        assert downloader.max_host_concurrency('unknown') == downloader.max_concurrency()
+
+    def test_max_host_concurrency_never_exceeds_global_limit(self):
+        """Test per-host limit is capped by max_concurrency()"""
+        class SmallDownloader(Downloader):
+            def max_concurrency(self):
+                return 2
+
+        assert SmallDownloader().max_host_concurrency('dangdang') == 2
+
+    def test_host_of(self):
+        """Test host extraction from URLs"""
+        assert Downloader.host_of("http://List.Tmall.com/search?q=1") == "list.tmall.com"
+        assert Downloader.host_of(None) == ''
+        assert Downloader.host_of(Mock()) == ''
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestEmDownloaderConcurrency:
+    """Test cases for EmDownloader bounded concurrency against a local site"""
+
+    def test_downloads_every_item(self, local_site, make_item):
+        """Test all items are downloaded and passed to callback"""
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(25)]
+        done = []
+
+        EmDownloader(items).run(done.append)
+
+        assert sorted(i.url for i in done) == sorted(i.url for i in items)
+        assert all(i.html.startswith("<html>") for i in done)
+
+    def test_global_limit(self, local_site, make_item):
+        """Test in-flight requests never exceed max_concurrency()"""
+        class LimitedDownloader(EmDownloader):
+            def max_concurrency(self):
+                return 3
+
+        local_site.delay = 0.05
+        items = [make_item(local_site.url(f"/p{i}"), kind='unknown') for i in range(12)]
+        done = []
+
+        LimitedDownloader(items).run(done.append)
+
+        assert len(done) == 12
+        assert 1 <= local_site.max_in_flight <= 3
+
+    def test_per_host_limit(self, local_site, make_item, monkeypatch):
+        """Test in-flight requests per host never exceed the site's host_concurrency"""
+        monkeypatch.setitem(Downloader.SiteSettings, 'dangdang', {'host_concurrency': 2})
+        local_site.delay = 0.05
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(10)]
+        done = []
+
+        EmDownloader(items).run(done.append)
+
+        assert len(done) == 10
+        assert local_site.max_in_flight <= 2
+
+    def test_items_consumed_lazily(self, local_site, make_item):
+        """Test items are pulled from a generator rather than materialized up front"""
+        pulled = []
+
+        def generate():
+            for i in range(5):
+                pulled.append(i)
+                yield make_item(local_site.url(f"/p{i}"))
+
+        done = []
+        EmDownloader(generate()).run(done.append)
+
+        assert len(done) == 5
+        assert pulled == list(range(5))
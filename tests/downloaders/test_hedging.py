@@ -0,0 +1,181 @@
+"""
+Tests for hedged requests
+"""
+import io
+import threading
+import time
+import pytest
+from spider.downloader.hedging import Hedger
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+PAGE = b"<html><head><title>Test</title></head><body>Test</body></html>"
+
+
+class RecordingStream:
+    """Stand-in for a StreamingParse, recording the body it is fed"""
+
+    def __init__(self, item, headers):
+        self.fed = b""
+        self.closed = False
+        self.cancelled = False
+
+    def feed(self, chunk):
+        self.fed += chunk
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+def send_in_parts(handler, wait_headers, parts, wait_parts):
+    """Write a 200 response for PAGE by hand: headers after wait_headers, then parts wait_parts apart"""
+    time.sleep(wait_headers)
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/html')
+    handler.send_header('Content-Length', str(len(PAGE)))
+    handler.end_headers()
+    for i, part in enumerate(parts):
+        if i:
+            time.sleep(wait_parts)
+        handler.wfile.write(part)
+        handler.wfile.flush()
+    # The response is written: what LocalSite sends after it goes nowhere
+    handler.wfile = io.BytesIO()
+    return PAGE
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestHedger:
+    """Test cases for latency tracking and the hedge budget"""
+
+    def test_no_delay_until_enough_samples(self):
+        """Test hosts are not hedged before MIN_SAMPLES latencies are known"""
+        hedger = Hedger()
+        for _ in range(Hedger.MIN_SAMPLES - 1):
+            hedger.record('a.com', 0.1)
+        assert hedger.delay('a.com') is None
+
+    def test_delay_is_p95(self):
+        """Test the hedge delay is the host's 95th percentile latency"""
+        hedger = Hedger()
+        for i in range(100):
+            hedger.record('a.com', i / 100)
+        assert hedger.delay('a.com') == pytest.approx(0.95)
+
+    def test_budget_caps_hedges(self):
+        """Test hedges never exceed the budget fraction of requests"""
+        hedger = Hedger(budget=0.1)
+        granted = 0
+        for _ in range(100):
+            hedger.delay('a.com')
+            granted += hedger.acquire()
+        assert granted == 10
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [TyDownloader, EmDownloader])
+class TestDownloaderHedging:
+    """Test cases for hedging through the downloaders"""
+
+    def test_straggler_is_hedged(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test a request past the host's p95 is duplicated and the fast copy wins"""
+        hedger = Hedger(budget=1.0)
+        for _ in range(Hedger.MIN_SAMPLES):
+            hedger.record('127.0.0.1', 0.05)
+        monkeypatch.setattr(downloader_class, 'hedger', hedger)
+        calls = []
+        lock = threading.Lock()
+
+        def straggle_once(handler):
+            with lock:
+                calls.append(handler.path)
+                first = len(calls) == 1
+            if first:
+                time.sleep(1.5)
+            return PAGE
+
+        local_site.route('/slow', body=straggle_once)
+        item = make_item(local_site.url('/slow'))
+
+        started = time.monotonic()
+        results = list(downloader_class([item]).iter_results())
+
+        assert time.monotonic() - started < 1.0
+        assert len(calls) == 2
+        assert hedger.hedges == 1
+        assert results[0][0] is item
+
+    def test_no_hedge_without_budget(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test a zero budget never duplicates requests"""
+        hedger = Hedger(budget=0)
+        for _ in range(Hedger.MIN_SAMPLES):
+            hedger.record('127.0.0.1', 0.01)
+        monkeypatch.setattr(downloader_class, 'hedger', hedger)
+        local_site.delay = 0.1
+
+        list(downloader_class([make_item(local_site.url(f"/p{i}")) for i in range(3)]).iter_results())
+
+        assert len(local_site.requests) == 3
+        assert hedger.hedges == 0
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestTyHedgeLatency:
+    """Test cases for the latency TyDownloader reports to the hedger"""
+
+    def test_records_time_to_headers(self, local_site, make_item, monkeypatch):
+        """Test the body read, which a hedge does not race, is left out of the latency"""
+        hedger = Hedger()
+        monkeypatch.setattr(TyDownloader, 'hedger', hedger)
+        read_body = TyDownloader._read_body
+
+        def slow_read_body(self, item, response):
+            time.sleep(0.3)
+            return read_body(self, item, response)
+
+        monkeypatch.setattr(TyDownloader, '_read_body', slow_read_body)
+
+        list(TyDownloader([make_item(local_site.url('/p'))]).iter_results())
+
+        assert len(hedger._latencies['127.0.0.1']) == 1
+        assert hedger._latencies['127.0.0.1'][0] < 0.2
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestEmHedgeStreams:
+    """Test cases for the StreamingParse of hedged EmDownloader requests"""
+
+    def test_winner_stream_kept(self, local_site, make_item, monkeypatch):
+        """Test the item keeps the stream of the attempt that won, not of the one cancelled"""
+        hedger = Hedger(budget=1.0)
+        for _ in range(Hedger.MIN_SAMPLES):
+            hedger.record('127.0.0.1', 0.05)
+        monkeypatch.setattr(EmDownloader, 'hedger', hedger)
+        monkeypatch.setattr(EmDownloader, 'streaming', RecordingStream)
+        calls = []
+        lock = threading.Lock()
+
+        def respond(handler):
+            with lock:
+                calls.append(handler.path)
+                first = len(calls) == 1
+            if first:
+                # Headers come after the backup's, then the body stalls
+                return send_in_parts(handler, 0.3, [PAGE[:20], PAGE[20:]], 2.0)
+            return send_in_parts(handler, 0, [PAGE[:10], PAGE[10:]], 0.6)
+
+        local_site.route('/slow', body=respond)
+        item = make_item(local_site.url('/slow'))
+
+        results = list(EmDownloader([item]).iter_results())
+
+        assert len(calls) == 2
+        assert results[0][0] is item
+        assert item.stream.fed == PAGE
+        assert item.stream.closed
@@ -0,0 +1,93 @@
+"""
+Tests for response body limits
+"""
+import gzip
+from unittest.mock import Mock
+import pytest
+from spider.downloader.limits import BodyLimit, ResponseRejected
+from spider.downloader.retry import RetryScheduler
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+PAGE = b"<html><head><title>Test</title></head><body>" + b"x" * 1000 + b"</body></html>"
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestBodyLimit:
+    """Test cases for header and size checks"""
+
+    @pytest.mark.parametrize('content_type', [None, 'text/html', 'text/html; charset=GBK',
+                                              'application/xhtml+xml', 'TEXT/PLAIN'])
+    def test_page_types_accepted(self, content_type):
+        """Test HTML-like and missing content types pass"""
+        headers = {'Content-Type': content_type} if content_type else {}
+        BodyLimit(100).check_headers(headers)
+
+    @pytest.mark.parametrize('content_type', ['image/jpeg', 'application/pdf', 'application/octet-stream'])
+    def test_other_types_rejected(self, content_type):
+        """Test files are rejected as not_html before their body is read"""
+        with pytest.raises(ResponseRejected) as error:
+            BodyLimit(100).check_headers({'Content-Type': content_type})
+        assert error.value.failure == RetryScheduler.NOT_HTML
+
+    def test_content_length_over_limit(self):
+        """Test an announced oversized body is rejected up front"""
+        with pytest.raises(ResponseRejected) as error:
+            BodyLimit(100).check_headers({'Content-Type': 'text/html', 'Content-Length': '101'})
+        assert error.value.failure == RetryScheduler.TOO_LARGE
+
+    def test_check_size(self):
+        """Test the running size is checked against max_bytes"""
+        limit = BodyLimit(100)
+        limit.check_size(100)
+        with pytest.raises(ResponseRejected):
+            limit.check_size(101)
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderLimits:
+    """Test cases for aborted downloads through every downloader"""
+
+    @pytest.fixture(autouse=True)
+    def retry_scheduler(self, downloader_class, monkeypatch):
+        scheduler = Mock()
+        monkeypatch.setattr(downloader_class, 'retry_scheduler', scheduler)
+        monkeypatch.setattr(downloader_class, 'SiteSettings', {'dangdang': {'max_bytes': 500}})
+        return scheduler
+
+    def test_non_html_rejected(self, downloader_class, local_site, make_item, retry_scheduler):
+        """Test an image is reported as not_html and never reaches the callback"""
+        local_site.route('/logo.jpg', body=b"\xff\xd8\xff" * 10, headers={'Content-Type': 'image/jpeg'})
+        item = make_item(local_site.url('/logo.jpg'))
+
+        assert list(downloader_class([item]).iter_results()) == []
+        retry_scheduler.record_failure.assert_called_once_with(item, RetryScheduler.NOT_HTML)
+
+    def test_announced_oversized_body_rejected(self, downloader_class, local_site, make_item, retry_scheduler):
+        """Test a Content-Length over max_bytes is reported as too_large"""
+        local_site.route('/big', body=PAGE)
+        item = make_item(local_site.url('/big'))
+
+        assert list(downloader_class([item]).iter_results()) == []
+        retry_scheduler.record_failure.assert_called_once_with(item, RetryScheduler.TOO_LARGE)
+
+    def test_body_cut_off_while_streaming(self, downloader_class, local_site, make_item, retry_scheduler):
+        """Test a body that only grows past max_bytes once decompressed is cut off"""
+        local_site.route('/bomb', body=gzip.compress(PAGE), headers={'Content-Encoding': 'gzip'})
+        item = make_item(local_site.url('/bomb'))
+
+        assert list(downloader_class([item]).iter_results()) == []
+        retry_scheduler.record_failure.assert_called_once_with(item, RetryScheduler.TOO_LARGE)
+
+    def test_small_page_accepted(self, downloader_class, local_site, make_item, retry_scheduler):
+        """Test pages within the limit download normally"""
+        local_site.route('/ok', body=PAGE[:60] + b"</body></html>")
+        item = make_item(local_site.url('/ok'))
+
+        assert len(list(downloader_class([item]).iter_results())) == 1
+        retry_scheduler.record_failure.assert_not_called()
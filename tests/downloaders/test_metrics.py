@@ -0,0 +1,124 @@
+"""
+Tests for the Prometheus metrics exporter
+"""
+import urllib.request
+import pytest
+from spider.downloader.metrics import Metrics, MetricsServer, TextfileExporter
+from spider.downloader.timing import Timings
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+PAGE = b"<html><head><title>Counted</title></head><body>Counted</body></html>"
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestMetrics:
+    """Test cases for the registry and its text format"""
+
+    def test_render_counters_and_gauges(self):
+        """Test series are rendered with HELP/TYPE lines and escaped labels"""
+        metrics = Metrics()
+        metrics.inc('spider_items_failed_total', site='tmall', stage='Page', reason='http')
+        metrics.inc('spider_items_failed_total', 2, site='tmall', stage='Page', reason='http')
+        metrics.inc('spider_records_written_total', site='say "hi"\n', model='Page')
+        metrics.gauge('spider_queue_depth', lambda: 7, queue='callback')
+
+        text = metrics.render()
+
+        assert "# TYPE spider_items_failed_total counter" in text
+        assert 'spider_items_failed_total{reason="http",site="tmall",stage="Page"} 3' in text
+        assert 'spider_records_written_total{model="Page",site="say \\"hi\\"\\n"} 1' in text
+        assert 'spider_queue_depth{queue="callback"} 7' in text
+        assert "spider_bytes_downloaded_total" not in text
+        assert text.endswith("\n")
+
+    def test_unknown_metric_rejected(self):
+        """Test only declared metrics can be updated"""
+        with pytest.raises(KeyError):
+            Metrics().inc('spider_typo_total')
+
+    def test_tracking_gauge(self):
+        """Test a tracked block is counted in the gauge while it runs"""
+        metrics = Metrics()
+        with metrics.tracking('spider_requests_in_flight', site='gome'):
+            assert metrics.value('spider_requests_in_flight', site='gome') == 1
+        assert metrics.value('spider_requests_in_flight', site='gome') == 0
+
+    def test_render_histograms(self):
+        """Test phase histograms are rendered as cumulative buckets"""
+        timings = Timings()
+        for seconds in (0.003, 0.02, 0.2, 40):
+            timings.record('tmall', 'Page', 'ttfb', seconds)
+
+        text = Metrics(timings).render()
+
+        labels = 'phase="ttfb",site="tmall",stage="Page"'
+        assert "# TYPE spider_request_phase_seconds histogram" in text
+        assert f'spider_request_phase_seconds_bucket{{{labels},le="0.005"}} 1' in text
+        assert f'spider_request_phase_seconds_bucket{{{labels},le="0.25"}} 3' in text
+        assert f'spider_request_phase_seconds_bucket{{{labels},le="30.0"}} 3' in text
+        assert f'spider_request_phase_seconds_bucket{{{labels},le="+Inf"}} 4' in text
+        assert f'spider_request_phase_seconds_count{{{labels}}} 4' in text
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestExporters:
+    """Test cases for the HTTP endpoint and the textfile"""
+
+    def test_http_endpoint(self):
+        """Test /metrics serves the current values"""
+        metrics = Metrics()
+        server = MetricsServer(metrics, 0)
+        server.start()
+        try:
+            metrics.inc('spider_items_attempted_total', site='gome', stage='Page')
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+                body = response.read().decode('utf-8')
+                content_type = response.headers['Content-Type']
+        finally:
+            server.close()
+
+        assert content_type.startswith('text/plain; version=0.0.4')
+        assert 'spider_items_attempted_total{site="gome",stage="Page"} 1' in body
+
+    def test_textfile_rewritten(self, tmp_path):
+        """Test the textfile is written on start and with the final values on close"""
+        metrics = Metrics()
+        path = tmp_path / 'spider.prom'
+        exporter = TextfileExporter(metrics, str(path), interval=60)
+        exporter.start()
+        assert path.read_text() == "\n"
+
+        metrics.inc('spider_items_attempted_total', site='gome', stage='Page')
+        exporter.close()
+
+        assert 'spider_items_attempted_total{site="gome",stage="Page"} 1' in path.read_text()
+        assert [p.name for p in tmp_path.iterdir()] == ['spider.prom']
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderMetrics:
+    """Test cases for the metrics updated by the downloaders"""
+
+    def test_items_counted(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test attempted, succeeded, failed and bytes are counted per site and stage"""
+        metrics = Metrics()
+        monkeypatch.setattr(downloader_class, 'metrics', metrics)
+        local_site.route('/ok', body=PAGE)
+        local_site.route('/cut', body=b"<html><body>")
+        items = [make_item(local_site.url('/ok')), make_item(local_site.url('/cut'))]
+
+        downloader_class(items).run(lambda item: None)
+
+        labels = {'site': 'dangdang', 'stage': 'Item'}
+        assert metrics.value('spider_items_attempted_total', **labels) == 2
+        assert metrics.value('spider_items_succeeded_total', **labels) == 1
+        assert metrics.value('spider_items_failed_total', reason='bad_html', **labels) == 1
+        assert metrics.value('spider_bytes_downloaded_total', **labels) == len(PAGE) + len(b"<html><body>")
+        assert metrics.value('spider_requests_in_flight', site='dangdang') == 0
@@ -52,7 +52,7 @@ class TestNormalDownloaderBase:
 class TestNormalDownloaderExecution:
     """Test cases for NormalDownloader execution"""
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     @patch('spider.downloader.normal_downloader.Encoding.set_utf8_html')
     @patch('spider.downloader.normal_downloader.Utils.valid_html')
     def test_successful_download_calls_callback(self, mock_valid_html, mock_encoding, mock_get):
@@ -60,6 +60,8 @@ class TestNormalDownloaderExecution:
         # Setup
         mock_response = Mock()
         mock_response.content = b"<html>Test</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_valid_html.return_value = True
 
@@ -73,12 +75,12 @@ class TestNormalDownloaderExecution:
         downloader.run(callback)
 
         # Verify
-        mock_get.assert_called_once_with(mock_item.url, timeout=30)
-        mock_encoding.assert_called_once_with(mock_item, b"<html>Test</html>")
+        mock_get.assert_called_once_with(mock_item.url, timeout=30, stream=True)
+        mock_encoding.assert_called_once_with(mock_item, b"<html>Test</html>", {})
         mock_valid_html.assert_called_once()
         callback.assert_called_once_with(mock_item)
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     @patch('spider.downloader.normal_downloader.Encoding.set_utf8_html')
     @patch('spider.downloader.normal_downloader.Utils.valid_html')
     def test_multiple_items_sequential_processing(self, mock_valid_html, mock_encoding, mock_get):
@@ -86,6 +88,8 @@ class TestNormalDownloaderExecution:
         # Setup
         mock_response = Mock()
         mock_response.content = b"<html>Test</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_valid_html.return_value = True
 
@@ -104,7 +108,28 @@ class TestNormalDownloaderExecution:
         assert callback.call_count == 3
         callback.assert_has_calls([call(item1), call(item2), call(item3)])
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
+    @patch('spider.downloader.normal_downloader.Encoding.set_utf8_html')
+    @patch('spider.downloader.normal_downloader.Utils.valid_html')
+    def test_callbacks_run_on_callback_workers(self, mock_valid_html, mock_encoding, mock_get, monkeypatch):
+        """Test callbacks run on the callback stage's threads, off the download loop"""
+        import threading
+        mock_response = Mock()
+        mock_response.content = b"<html>Test</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
+        mock_get.return_value = mock_response
+        mock_valid_html.return_value = True
+        monkeypatch.setattr(NormalDownloader, 'callback_workers', 2)
+
+        items = [Mock(url=f"http://test{i}.com", kind="dangdang", html="<html></html>") for i in range(4)]
+        threads = []
+        NormalDownloader(items).run(lambda item: threads.append(threading.current_thread()))
+
+        assert len(threads) == 4
+        assert threading.main_thread() not in threads
+
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     def test_timeout_error_handling(self, mock_get):
         """Test timeout error is handled and logged"""
         # Setup
@@ -129,7 +154,7 @@ class TestNormalDownloaderExecution:
         assert "http://test.com" in error_msg
         assert "Connection Error" in error_msg
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     def test_connection_error_handling(self, mock_get):
         """Test connection error is handled and logged"""
         # Setup
@@ -153,7 +178,7 @@ class TestNormalDownloaderExecution:
         assert "jingdong" in error_msg
         assert "Connection Error" in error_msg
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     @patch('spider.downloader.normal_downloader.Encoding.set_utf8_html')
     @patch('spider.downloader.normal_downloader.Utils.valid_html')
     def test_invalid_html_handling(self, mock_valid_html, mock_encoding, mock_get):
@@ -161,6 +186,8 @@ class TestNormalDownloaderExecution:
         # Setup
         mock_response = Mock()
         mock_response.content = b"invalid"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_valid_html.return_value = False  # Invalid HTML
 
@@ -183,7 +210,7 @@ class TestNormalDownloaderExecution:
         assert "tmall" in error_msg
         assert "Bad HTML" in error_msg
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     def test_general_exception_handling(self, mock_get):
         """Test general exception is handled and logged"""
         # Setup
@@ -207,7 +234,7 @@ class TestNormalDownloaderExecution:
         assert "newegg" in error_msg
         assert "Error:" in error_msg
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     @patch('spider.downloader.normal_downloader.Encoding.set_utf8_html')
     @patch('spider.downloader.normal_downloader.Utils.valid_html')
     def test_encoding_conversion_called(self, mock_valid_html, mock_encoding, mock_get):
@@ -215,6 +242,8 @@ class TestNormalDownloaderExecution:
         # Setup
         mock_response = Mock()
         mock_response.content = b"\xe4\xb8\xad\xe6\x96\x87"  # UTF-8 Chinese
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_valid_html.return_value = True
 
@@ -226,9 +255,9 @@ class TestNormalDownloaderExecution:
         downloader.run(callback)
 
         # Verify
-        mock_encoding.assert_called_once_with(mock_item, b"\xe4\xb8\xad\xe6\x96\x87")
+        mock_encoding.assert_called_once_with(mock_item, b"\xe4\xb8\xad\xe6\x96\x87", {})
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     @patch('spider.downloader.normal_downloader.Encoding.set_utf8_html')
     @patch('spider.downloader.normal_downloader.Utils.valid_html')
     def test_one_failure_does_not_stop_others(self, mock_valid_html, mock_encoding, mock_get):
@@ -236,7 +265,8 @@ class TestNormalDownloaderExecution:
         # Setup - first fails, second succeeds
         mock_get.side_effect = [
             requests.Timeout("Timeout"),
-            Mock(content=b"<html>Success</html>")
+            Mock(content=b"<html>Success</html>", headers={},
+                 iter_content=Mock(return_value=[b"<html>Success</html>"]))
         ]
         mock_valid_html.return_value = True
 
@@ -257,7 +287,7 @@ class TestNormalDownloaderExecution:
         callback.assert_called_once_with(item2)
         mock_logger.error.assert_called_once()
 
-    @patch('spider.downloader.normal_downloader.requests.get')
+    @patch('spider.downloader.normal_downloader.requests.Session.get')
     @patch('spider.downloader.normal_downloader.Encoding.set_utf8_html')
     @patch('spider.downloader.normal_downloader.Utils.valid_html')
     def test_request_timeout_parameter(self, mock_valid_html, mock_encoding, mock_get):
@@ -265,6 +295,8 @@ class TestNormalDownloaderExecution:
         # Setup
         mock_response = Mock()
         mock_response.content = b"<html>Test</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_valid_html.return_value = True
 
@@ -276,4 +308,4 @@ class TestNormalDownloaderExecution:
         downloader.run(callback)
 
         # Verify timeout parameter
-        mock_get.assert_called_once_with("http://test.com", timeout=30)
+        mock_get.assert_called_once_with("http://test.com", timeout=30, stream=True)
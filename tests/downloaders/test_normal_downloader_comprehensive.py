@@ -53,7 +53,7 @@ class TestNormalDownloaderComprehensive:
         assert downloader.items[1].url == "http://example2.com"
         assert downloader.items[2].url == "http://example3.com"
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_successful_download(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -61,6 +61,8 @@ class TestNormalDownloaderComprehensive:
         # Setup mocks
         mock_response = Mock()
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = True
@@ -75,18 +77,18 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify encoding was set
-        mock_set_utf8_html.assert_called_once_with(item, mock_response.content)
+        mock_set_utf8_html.assert_called_once_with(item, mock_response.content, {})
         
         # Verify HTML validation
-        mock_valid_html.assert_called_once_with(item.html)
+        mock_valid_html.assert_called_once_with(mock_response.content)
         
         # Verify callback was called
         callback.assert_called_once_with(item)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_invalid_html(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -94,6 +96,8 @@ class TestNormalDownloaderComprehensive:
         # Setup mocks
         mock_response = Mock()
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = False
@@ -108,18 +112,18 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
-        # Verify encoding was set
-        mock_set_utf8_html.assert_called_once_with(item, mock_response.content)
+        # Verify HTML validation ran on the raw body
+        mock_valid_html.assert_called_once_with(mock_response.content)
         
-        # Verify HTML validation
-        mock_valid_html.assert_called_once_with(item.html)
+        # Verify the truncated page was never decoded
+        mock_set_utf8_html.assert_not_called()
         
         # Verify callback was NOT called due to invalid HTML
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_connection_error(self, mock_get):
         """Test download with connection error"""
         # Setup mocks
@@ -135,12 +139,12 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was NOT called due to connection error
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_timeout_error(self, mock_get):
         """Test download with timeout error"""
         # Setup mocks
@@ -156,12 +160,12 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was NOT called due to timeout error
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_general_exception(self, mock_get):
         """Test download with general exception"""
         # Setup mocks
@@ -177,21 +181,23 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was NOT called due to general error
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_multiple_items_mixed_results(self, mock_valid_html, mock_set_utf8_html, mock_get):
         """Test download with multiple items having mixed results"""
         # Setup mocks
-        def mock_get_side_effect(url, timeout):
+        def mock_get_side_effect(url, timeout, stream):
             if "success" in url:
                 response = Mock()
                 response.content = b"<html>Valid content</html>"
+                response.headers = {}
+                response.iter_content.return_value = [response.content]
                 return response
             elif "timeout" in url:
                 raise requests.Timeout("Timeout")
@@ -223,7 +229,7 @@ class TestNormalDownloaderComprehensive:
         callback.assert_any_call(items[0])  # success1
         callback.assert_any_call(items[2])  # success2
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_encoding_error(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -231,6 +237,8 @@ class TestNormalDownloaderComprehensive:
         # Setup mocks
         mock_response = Mock()
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.side_effect = Exception("Encoding error")
         mock_valid_html.return_value = True
@@ -245,10 +253,10 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify encoding was attempted
-        mock_set_utf8_html.assert_called_once_with(item, mock_response.content)
+        mock_set_utf8_html.assert_called_once_with(item, mock_response.content, {})
         
         # Verify callback was NOT called due to encoding error
         callback.assert_not_called()
@@ -372,7 +380,7 @@ class TestNormalDownloaderComprehensive:
             assert hasattr(downloader, 'items')
             assert len(downloader.items) == 1
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_callback_exception(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -380,6 +388,8 @@ class TestNormalDownloaderComprehensive:
         # Setup mocks
         mock_response = Mock()
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = True
@@ -394,7 +404,7 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was called despite exception
         callback.assert_called_once_with(item)
@@ -414,13 +424,13 @@ class TestNormalDownloaderComprehensive:
         callback = Mock()
         
         # Should handle gracefully
-        with patch('requests.get', side_effect=AttributeError("'Mock' object has no attribute 'url'")):
+        with patch('requests.Session.get', side_effect=AttributeError("'Mock' object has no attribute 'url'")):
             downloader.run(callback)
         
         # Callback should not be called
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_with_different_timeout_values(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -428,6 +438,8 @@ class TestNormalDownloaderComprehensive:
         # Setup mocks
         mock_response = Mock()
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = True
@@ -442,7 +454,7 @@ class TestNormalDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify timeout is 30 seconds
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
 
     def test_downloader_logger_initialization(self):
         """Test that logger is properly initialized"""
@@ -452,7 +464,7 @@ class TestNormalDownloaderComprehensive:
         assert hasattr(downloader, 'logger')
         assert downloader.logger is not None
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_with_empty_items_list(self, mock_valid_html, mock_set_utf8_html, mock_get):
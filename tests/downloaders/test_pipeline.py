@@ -0,0 +1,120 @@
+# encoding: utf-8
+"""
+Tests for spider.downloader.pipeline
+"""
+import pickle
+from functools import partial
+import pytest
+from unittest.mock import Mock
+from spider.downloader.pipeline import PageSnapshot, ParsePipeline, extract_product, extract_product_urls
+from spider.downloader.ty_downloader import TyDownloader
+from spider.digger.dangdang_digger import DangdangDigger
+from spider.parser.dangdang_parser import DangdangParser
+
+
+LISTING = """<html><body><div class="mode_goods">
+<div class="name"><a href="http://product.dangdang.com/1.html">商品1</a></div>
+<div class="name"><a href="http://product.dangdang.com/2.html">商品2</a></div>
+</div></body></html>""".encode('GB18030')
+
+PRODUCT = """<html><body><div class="crumb"><a href="http://category.dangdang.com/list?cat=1">图书</a></div>
+<div class="dp_wrap"><h1>测试商品</h1></div><span id="salePriceTag">￥25.00</span>
+</body></html>""".encode('GB18030')
+
+
+def failing_extract(snapshot):
+    raise ValueError("bad page")
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestPageSnapshot:
+    """Test cases for PageSnapshot"""
+
+    def test_snapshot_keeps_raw_bytes(self):
+        """Test the snapshot carries the raw body rather than decoded text"""
+        item = Mock(url="http://a.com", kind="dangdang", id=7, raw_html=LISTING, html="ignored")
+        snapshot = PageSnapshot(item)
+        assert snapshot.raw_html == LISTING
+        assert snapshot.id == 7
+        assert snapshot._html is None  # Decoded only when read
+
+    def test_snapshot_falls_back_to_html(self):
+        """Test items without raw bytes ship their decoded html"""
+        item = Mock(url="http://a.com", kind="dangdang", id=7, raw_html=None, html="<html></html>")
+        assert PageSnapshot(item).raw_html == "<html></html>"
+
+    def test_snapshot_is_picklable(self):
+        """Test snapshots can be sent to worker processes"""
+        item = Mock(url="http://a.com", kind="dangdang", id=7, raw_html=LISTING)
+        copy = pickle.loads(pickle.dumps(PageSnapshot(item)))
+        assert copy.url == "http://a.com"
+        assert copy.raw_html == LISTING
+
+    def test_decode_uses_site_encoding(self):
+        """Test decode converts raw bytes with the site's encoding"""
+        item = Mock(url="http://a.com", kind="dangdang", id=7, raw_html=PRODUCT)
+        assert "测试商品" in PageSnapshot(item).decode().html
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestExtractors:
+    """Test cases for the worker-side extract functions"""
+
+    def test_extract_product_urls(self):
+        """Test digger results come back as a plain dict"""
+        item = Mock(url="http://list.dangdang.com", kind="dangdang", id=1, raw_html=LISTING)
+        result = extract_product_urls(DangdangDigger, PageSnapshot(item))
+        assert result == {'product_urls': ["http://product.dangdang.com/1.html",
+                                           "http://product.dangdang.com/2.html"]}
+
+    def test_extract_product(self):
+        """Test parser results include categories and attributes"""
+        item = Mock(url="http://product.dangdang.com/1.html", kind="dangdang", id=3, raw_html=PRODUCT)
+        result = extract_product(DangdangParser, PageSnapshot(item))
+        assert result['categories'] == [{'name': "图书", 'url': "http://category.dangdang.com/list?cat=1"}]
+        assert result['attributes']['title'] == "测试商品"
+        assert result['attributes']['price'] == 25
+        assert result['attributes']['product_url_id'] == 3
+        pickle.dumps(result)
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestParsePipeline:
+    """Test cases for ParsePipeline"""
+
+    def test_pipeline_with_downloader(self, local_site, make_item):
+        """Test pages are downloaded, parsed in workers and persisted in this process"""
+        for i in range(6):
+            local_site.route(f"/list{i}", LISTING)
+        items = [make_item(local_site.url(f"/list{i}")) for i in range(6)]
+        for item in items:
+            item.id = None
+        saved = []
+
+        with ParsePipeline(partial(extract_product_urls, DangdangDigger),
+                           lambda item, result: saved.append((item, result)), workers=2) as pipeline:
+            downloader = TyDownloader(items)
+            downloader.callback_workers = pipeline.workers
+            downloader.run(pipeline)
+
+        assert sorted(item.url for item, _ in saved) == sorted(item.url for item in items)
+        assert all(len(result['product_urls']) == 2 for _, result in saved)
+
+    def test_extract_errors_are_logged(self):
+        """Test a failing parse is logged and nothing is persisted"""
+        logger = Mock()
+        persist = Mock()
+        item = Mock(url="http://a.com", kind="dangdang", id=1, raw_html=LISTING)
+
+        with ParsePipeline(failing_extract, persist, workers=1, logger=logger) as pipeline:
+            pipeline(item)
+
+        persist.assert_not_called()
+        assert "bad page" in logger.error.call_args[0][0]
+
+    def test_default_workers(self):
+        """Test worker count defaults to the CPU count"""
+        assert ParsePipeline(Mock(), Mock()).workers >= 1
@@ -0,0 +1,104 @@
+"""
+Tests for the egress proxy pool
+"""
+import socket
+from unittest.mock import patch
+import pytest
+from spider.downloader.proxy import ProxyPool
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+@pytest.fixture
+def dead_proxy():
+    """URL of a local port nothing listens on"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestProxyPool:
+    """Test cases for routing, scoring and quarantine"""
+
+    def test_untried_proxies_first(self):
+        """Test every proxy gets a first request for a host before scoring kicks in"""
+        pool = ProxyPool(['http://a:1', 'http://b:1', 'http://c:1'])
+        chosen = set()
+        for _ in range(3):
+            proxy = pool.choose('list.tmall.com')
+            pool.feedback(proxy, 'list.tmall.com', True, 0.1)
+            chosen.add(proxy)
+        assert chosen == set(pool.proxies)
+
+    def test_fastest_proxy_preferred(self):
+        """Test requests go to the proxy with the lowest latency for the host"""
+        pool = ProxyPool(['http://fast:1', 'http://slow:1'])
+        pool.feedback('http://fast:1', 'a.com', True, 0.1)
+        pool.feedback('http://slow:1', 'a.com', True, 2.0)
+        assert {pool.choose('a.com') for _ in range(20)} == {'http://fast:1'}
+
+    def test_failing_proxy_avoided(self):
+        """Test a proxy that has only failed loses against a working one"""
+        pool = ProxyPool(['http://good:1', 'http://bad:1'])
+        pool.feedback('http://good:1', 'a.com', True, 1.0)
+        pool.feedback('http://bad:1', 'a.com', False)
+        assert {pool.choose('a.com') for _ in range(20)} == {'http://good:1'}
+
+    def test_quarantine_and_release(self):
+        """Test consecutive failures quarantine a proxy until the quarantine is over"""
+        pool = ProxyPool(['http://good:1', 'http://bad:1'], quarantine=60)
+        pool.feedback('http://good:1', 'b.com', True, 5.0)
+        with patch('spider.downloader.proxy.time.monotonic', return_value=1000):
+            for _ in range(ProxyPool.MAX_FAILURES):
+                pool.feedback('http://bad:1', 'a.com', False)
+            # Quarantined for every host, not only the failing one
+            assert {pool.choose('b.com') for _ in range(20)} == {'http://good:1'}
+        with patch('spider.downloader.proxy.time.monotonic', return_value=1061):
+            assert 'http://bad:1' in {pool.choose('b.com') for _ in range(20)}
+
+    def test_quarantine_doubles(self):
+        """Test a proxy failing again after release stays out twice as long"""
+        pool = ProxyPool(['http://bad:1'], quarantine=60)
+        with patch('spider.downloader.proxy.time.monotonic', return_value=1000):
+            for _ in range(ProxyPool.MAX_FAILURES):
+                pool.feedback('http://bad:1', 'a.com', False)
+        with patch('spider.downloader.proxy.time.monotonic', return_value=1100):
+            for _ in range(ProxyPool.MAX_FAILURES):
+                pool.feedback('http://bad:1', 'a.com', False)
+        assert pool.stats('http://bad:1').quarantined_until == 1220
+
+    def test_from_option(self, tmp_path):
+        """Test proxies are read from a comma-separated list or a file"""
+        assert ProxyPool.from_option('http://a:1, http://b:1').proxies == ['http://a:1', 'http://b:1']
+        path = tmp_path / 'proxies.txt'
+        path.write_text("# egress\nhttp://a:1\n\nhttp://b:1\n")
+        assert ProxyPool.from_option(str(path)).proxies == ['http://a:1', 'http://b:1']
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderProxy:
+    """Test cases for routing downloads through local stand-in proxies"""
+
+    def test_requests_routed_around_dead_proxy(self, downloader_class, local_site, dead_proxy,
+                                               make_item, monkeypatch):
+        """Test a dead proxy is tried at most once and the live one serves the batch"""
+        proxy = f"http://127.0.0.1:{local_site.port}"
+        pool = ProxyPool([proxy, dead_proxy])
+        monkeypatch.setattr(downloader_class, 'proxy_pool', pool)
+        monkeypatch.setattr(downloader_class, 'concurrency', 1)
+        items = [make_item(f"http://shop.example.test/p{i}") for i in range(10)]
+
+        results = list(downloader_class(items).iter_results())
+
+        assert len(results) >= 9
+        # The stand-in proxy received absolute-form requests for the target host
+        assert all(path.startswith("http://shop.example.test/") for path, _ in local_site.requests)
+        assert pool.stats(dead_proxy, 'shop.example.test').samples <= 1
+        assert pool.stats(proxy, 'shop.example.test').latency is not None
@@ -0,0 +1,105 @@
+"""
+Tests for adaptive per-host rate limiting
+"""
+import time
+import pytest
+from spider.downloader.rate_limit import AdaptiveTokenBucket, RateLimiter
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestAdaptiveTokenBucket:
+    """Test cases for AIMD token bucket"""
+
+    def test_reserve_spaces_requests(self):
+        """Test requests beyond the burst wait 1/rate seconds each"""
+        bucket = AdaptiveTokenBucket(rate=10, max_rate=10)
+        waits = [bucket.reserve() for _ in range(3)]
+
+        assert waits[0] == 0
+        assert waits[1] == pytest.approx(0.1, abs=0.01)
+        assert waits[2] == pytest.approx(0.2, abs=0.01)
+
+    def test_additive_increase(self):
+        """Test healthy responses raise the rate up to max_rate"""
+        bucket = AdaptiveTokenBucket(rate=1, max_rate=1.25, increase=0.1)
+        bucket.success()
+        assert bucket.rate == pytest.approx(1.1)
+        bucket.success()
+        bucket.success()
+        assert bucket.rate == 1.25
+
+    def test_multiplicative_decrease_once_per_cooldown(self):
+        """Test a burst of failures halves the rate once, never below min_rate"""
+        bucket = AdaptiveTokenBucket(rate=8, max_rate=8, min_rate=1, cooldown=60)
+        bucket.failure()
+        bucket.failure()
+        assert bucket.rate == 4
+
+        bucket = AdaptiveTokenBucket(rate=8, max_rate=8, min_rate=3, cooldown=0)
+        bucket.failure()
+        bucket.failure()
+        assert bucket.rate == 3
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestRateLimiter:
+    """Test cases for per-host buckets and feedback"""
+
+    def test_buckets_use_site_settings(self):
+        """Test each host gets a bucket configured from its site's settings"""
+        limiter = RateLimiter({'tmall': {'rate': 2, 'max_rate': 4}})
+        bucket = limiter.bucket('list.tmall.com', 'tmall')
+
+        assert bucket.rate == 2
+        assert bucket.max_rate == 4
+        assert limiter.bucket('other.com').rate == RateLimiter.DEFAULT_RATE
+
+    @pytest.mark.parametrize('status', [None, 429, 500, 503])
+    def test_failures_cut_rate(self, status):
+        """Test timeouts, 429 and 5xx cut the rate"""
+        limiter = RateLimiter({})
+        limiter.feedback('a.com', status, 0.1)
+        assert limiter.rates()['a.com'] < RateLimiter.DEFAULT_RATE
+
+    def test_slow_success_holds_rate(self):
+        """Test a healthy but slow response does not raise the rate"""
+        limiter = RateLimiter({'tmall': {'rate': 2, 'latency_target': 1.0}})
+        limiter.bucket('a.com', 'tmall')
+        limiter.feedback('a.com', 200, 3.0)
+        assert limiter.rates()['a.com'] == 2
+        limiter.feedback('a.com', 404, 0.2)
+        assert limiter.rates()['a.com'] > 2
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderRateLimit:
+    """Test cases for pacing through every downloader"""
+
+    def test_requests_are_paced(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test requests to a host are spread out at the bucket's rate"""
+        limiter = RateLimiter({'dangdang': {'rate': 20, 'max_rate': 20}})
+        monkeypatch.setattr(downloader_class, 'rate_limiter', limiter)
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(6)]
+
+        started = time.monotonic()
+        list(downloader_class(items).iter_results())
+
+        # First request uses the burst token, the other five wait 1/20s each
+        assert time.monotonic() - started >= 0.2
+
+    def test_server_errors_slow_host_down(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test 503 answers cut the host's rate"""
+        limiter = RateLimiter({'dangdang': {'rate': 50, 'max_rate': 50}})
+        monkeypatch.setattr(downloader_class, 'rate_limiter', limiter)
+        local_site.route('/busy', status=503)
+
+        list(downloader_class([make_item(local_site.url('/busy'))]).iter_results())
+
+        assert limiter.rates()['127.0.0.1'] == 25
@@ -0,0 +1,109 @@
+"""
+Tests for the persistent retry scheduler
+"""
+from datetime import datetime, timedelta
+import pytest
+from mongoengine import connect, disconnect
+from spider.downloader.retry import RetryScheduler
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+from spider.models.page import Page
+
+
+@pytest.fixture
+def db():
+    """mongomock-backed database with an empty pages collection"""
+    connect('testdb', host='localhost', mongo_client_class=__import__('mongomock').MongoClient, alias='default')
+    Page.drop_collection()
+    yield
+    Page.drop_collection()
+    disconnect(alias='default')
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestRetryScheduler:
+    """Test cases for failure recording and backoff"""
+
+    def test_backoff_doubles_with_jitter(self):
+        """Test the delay doubles per attempt and stays within its jitter band"""
+        scheduler = RetryScheduler(base_delay=100, max_delay=1000)
+        for attempt, delay in [(1, 100), (2, 200), (3, 400), (5, 1000)]:
+            for _ in range(20):
+                assert delay / 2 <= scheduler.backoff(attempt) <= delay
+
+    def test_record_failure_schedules_retry(self, db):
+        """Test a failure increments retry_time and sets retry_at in the future"""
+        page = Page(url="http://test.com/p", kind="dangdang").save()
+
+        RetryScheduler(max_attempts=3).record_failure(page, RetryScheduler.TIMEOUT)
+
+        page.reload()
+        assert page.retry_time == 1
+        assert page.failure == 'timeout'
+        assert page.retry_at > datetime.utcnow()
+        assert page.dead is False
+
+    def test_dead_letter_after_max_attempts(self, db):
+        """Test the item is dead-lettered on its last allowed failure"""
+        page = Page(url="http://test.com/p", kind="dangdang", retry_time=2).save()
+
+        RetryScheduler(max_attempts=3).record_failure(page, RetryScheduler.HTTP)
+
+        page.reload()
+        assert page.retry_time == 3
+        assert page.dead is True
+
+    def test_due_query_skips_waiting_and_dead_items(self, db):
+        """Test work queries only select items that are due"""
+        now = datetime.utcnow()
+        Page(url="http://test.com/new", kind="dangdang").save()
+        Page(url="http://test.com/due", kind="dangdang", retry_at=now - timedelta(minutes=1)).save()
+        Page(url="http://test.com/later", kind="dangdang", retry_at=now + timedelta(hours=1)).save()
+        Page(url="http://test.com/dead", kind="dangdang", dead=True).save()
+
+        urls = {page.url for page in Page.from_kind("dangdang").filter(RetryScheduler.due(), completed=False)}
+
+        assert urls == {"http://test.com/new", "http://test.com/due"}
+
+    def test_is_due(self):
+        """Test the in-memory check used by run_paginater"""
+        now = datetime.utcnow()
+        assert RetryScheduler.is_due(Page(url="http://test.com/a"))
+        assert not RetryScheduler.is_due(Page(url="http://test.com/b", retry_at=now + timedelta(hours=1)))
+        assert not RetryScheduler.is_due(Page(url="http://test.com/c", dead=True))
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [TyDownloader, EmDownloader])
+class TestDownloaderRetry:
+    """Test cases for failures recorded by the downloaders"""
+
+    @pytest.mark.parametrize('status, body, failure', [
+        (500, b"<html></html>", 'http'),
+        (200, b"<html><body>cut off", 'bad_html'),
+    ])
+    def test_failure_is_recorded(self, downloader_class, local_site, db, monkeypatch, status, body, failure):
+        """Test a failed download is saved with its failure class"""
+        monkeypatch.setattr(downloader_class, 'retry_scheduler', RetryScheduler(max_attempts=5))
+        local_site.route('/p', body=body, status=status)
+        page = Page(url=local_site.url('/p'), kind="dangdang").save()
+
+        downloader_class([page]).run(lambda item: None)
+
+        page.reload()
+        assert page.retry_time == 1
+        assert page.failure == failure
+        assert page.retry_at is not None
+
+    def test_success_records_nothing(self, downloader_class, local_site, db, monkeypatch):
+        """Test successful downloads leave the retry state untouched"""
+        monkeypatch.setattr(downloader_class, 'retry_scheduler', RetryScheduler(max_attempts=5))
+        page = Page(url=local_site.url('/ok'), kind="dangdang").save()
+
+        downloader_class([page]).run(lambda item: None)
+
+        page.reload()
+        assert page.retry_time == 0
+        assert page.retry_at is None
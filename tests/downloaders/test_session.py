@@ -0,0 +1,87 @@
+"""
+Tests for spider.downloader.session
+"""
+import pytest
+import requests
+from spider.downloader.session import SessionPool
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader import Downloader
+
+
+@pytest.fixture(autouse=True)
+def fresh_sessions():
+    """Drop shared sessions between tests"""
+    SessionPool.close_all()
+    yield
+    SessionPool.close_all()
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestSessionPool:
+    """Test cases for SessionPool"""
+
+    def test_get_returns_session(self):
+        """Test get returns a requests.Session"""
+        assert isinstance(SessionPool.get(4), requests.Session)
+
+    def test_get_reuses_session_for_same_pool_size(self):
+        """Test the same session is shared for a given pool size"""
+        assert SessionPool.get(4) is SessionPool.get(4)
+        assert SessionPool.get(4) is not SessionPool.get(8)
+
+    def test_pool_sized_to_workers(self):
+        """Test adapters keep up to pool_size connections per host and block when exhausted"""
+        adapter = SessionPool.get(7).get_adapter('http://example.com/')
+        assert adapter._pool_maxsize == 7
+        assert adapter._pool_block is True
+
+    def test_keep_alive_header(self):
+        """Test sessions ask for keep-alive connections"""
+        assert SessionPool.get(1).headers['Connection'] == 'keep-alive'
+
+    def test_close_all_drops_sessions(self):
+        """Test close_all forgets existing sessions"""
+        session = SessionPool.get(2)
+        SessionPool.close_all()
+        assert SessionPool.get(2) is not session
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+class TestSessionReuse:
+    """Test cases for connection reuse against a local site"""
+
+    def test_normal_downloader_reuses_connection(self, local_site, make_item):
+        """Test sequential downloads share one TCP connection"""
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(10)]
+        done = []
+
+        NormalDownloader(items).run(done.append)
+
+        assert len(done) == 10
+        assert len(local_site.connections) == 1
+
+    def test_ty_downloader_bounds_connections(self, local_site, make_item):
+        """Test threaded downloads reuse at most max_workers connections"""
+        items = [make_item(local_site.url(f"/p{i}"), kind='unknown') for i in range(60)]
+        done = []
+
+        downloader = TyDownloader(items)
+        downloader.run(done.append)
+
+        assert len(done) == 60
+        assert len(local_site.connections) <= downloader.max_workers
+
+    def test_ty_downloader_per_host_limit(self, local_site, make_item, monkeypatch):
+        """Test in-flight requests per host respect the site's host_concurrency"""
+        monkeypatch.setitem(Downloader.SiteSettings, 'dangdang', {'host_concurrency': 3})
+        local_site.delay = 0.03
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(15)]
+        done = []
+
+        TyDownloader(items).run(done.append)
+
+        assert len(done) == 15
+        assert local_site.max_in_flight <= 3
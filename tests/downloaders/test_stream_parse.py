@@ -0,0 +1,183 @@
+"""
+Tests for parsing product pages while they download
+"""
+import pytest
+from spider.parser import Parser, StreamingParse
+from spider.engine import LxmlDocument
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+HEAD = ("<html><head><meta charset='gbk'><title>Product</title></head><body>"
+        "<div id='crumb'><a href='/c/1'>手机</a><a href='/c/2'>Smart</a></div>"
+        "<h1 id='name'>Phone X</h1><span id='price'>1999</span>").encode('gbk')
+TAIL = b"</body></html>"
+PAGE = HEAD + b"<p>" + b"x" * 1048576 + b"</p><div id='comments'>Great</div>" + TAIL
+
+
+def feed(stream, body, size=4096):
+    """Feed a body in chunks, returning the bytes fed until the stream was cancellable"""
+    for start in range(0, len(body), size):
+        if stream.feed(body[start:start + size]):
+            return start + size
+    stream.close()
+    return len(body)
+
+
+class ProductParser(Parser):
+    """Parser of the test page, streaming every field it reads"""
+
+    ENGINE = 'lxml'
+    STREAM_FIELDS = {
+        "title": "#name",
+        "price": "#price",
+        "belongs_to_categories": "#crumb",
+        "product_code": None, "price_url": None, "stock": None, "image_url": None, "score": None,
+        "desc": None, "standard": None, "comments": None, "end_product": None, "merchant": None,
+        "brand": None, "brand_type": None
+    }
+
+    def title(self):
+        elem = self.doc.select_one("#name")
+        return elem.get_text(strip=True) if elem else None
+
+    def price(self):
+        elem = self.doc.select_one("#price")
+        return float(elem.get_text(strip=True)) if elem else None
+
+    def belongs_to_categories(self):
+        return [{'name': a.get_text(), 'url': a.get('href')} for a in self.doc.select("#crumb a")]
+
+    def product_code(self):
+        return None
+
+    price_url = stock = image_url = score = desc = standard = end_product = merchant = brand = \
+        brand_type = product_code
+
+    def comments(self):
+        return []
+
+
+class TopParser(ProductParser):
+    """Parser streaming the top of the page, but reading comments from its end"""
+
+    STREAM_FIELDS = {"title": "#name", "price": "#price"}
+
+    def comments(self):
+        return [elem.get_text() for elem in self.doc.select("#comments")]
+
+
+@pytest.mark.unit
+@pytest.mark.parser
+class TestStreamingParse:
+    """Test cases for resolving fields from the part of a page received"""
+
+    def test_resolves_before_end(self, make_item, monkeypatch):
+        """Test fields are extracted as soon as their elements are complete"""
+        monkeypatch.setattr(StreamingParse, 'SEARCH_BYTES', 1024)
+        stream = StreamingParse(ProductParser, make_item('http://shop.test/p/1'))
+
+        assert feed(stream, PAGE) < len(PAGE) / 100
+        assert stream.encoding == 'gb18030'     # GBK is read as its superset
+        assert stream.values['title'] == "Phone X"
+        assert stream.values['price'] == 1999.0
+        assert stream.values['belongs_to_categories'] == \
+            [{'name': "手机", 'url': "/c/1"}, {'name': "Smart", 'url': "/c/2"}]
+        assert stream.values['comments'] == []
+
+    def test_open_element_not_resolved(self, make_item, monkeypatch):
+        """Test an element not yet closed in the part received is not read"""
+        monkeypatch.setattr(StreamingParse, 'SEARCH_BYTES', 0)
+        item = make_item('http://shop.test/p/1')
+        padded = HEAD[:-len("9</span>")].replace(b"<body>", b"<body>" + b" " * 4096)
+
+        stream = StreamingParse(ProductParser, item)
+        assert not stream.feed(padded)
+        assert stream.feed(b"9</span>")
+        assert stream.values['price'] == 1999.0
+
+    def test_partial_fields_never_cancel(self, make_item, monkeypatch):
+        """Test a page is read to its end when STREAM_FIELDS misses fields the parser reads"""
+        monkeypatch.setattr(StreamingParse, 'SEARCH_BYTES', 1024)
+        item = make_item('http://shop.test/p/1')
+        item.stream = StreamingParse(TopParser, item)
+
+        assert feed(item.stream, PAGE) == len(PAGE)
+        assert item.stream.values == {'title': "Phone X", 'price': 1999.0}
+        assert item.stream.closed and not item.stream.cancellable
+
+        item.raw_html, item.encoding = PAGE, 'gbk'
+        parser = TopParser(item)
+        assert isinstance(parser.doc, LxmlDocument)
+        assert parser.field('price') == 1999.0
+        assert parser.field('comments') == ["Great"]
+
+    def test_parser_reuses_cut_short_document(self, make_item):
+        """Test a parser of a page cut short uses the streamed tree and values"""
+        item = make_item('http://shop.test/p/1')
+        item.stream = StreamingParse(ProductParser, item)
+        feed(item.stream, PAGE)
+        item.stream.cancelled = True
+
+        parser = ProductParser(item)
+        assert parser.doc.element is item.stream.root
+        assert parser.field('title') == "Phone X"
+
+    def test_other_charset_parsed_again(self, make_item):
+        """Test the streamed tree is not used when the page was decoded with another charset"""
+        item = make_item('http://shop.test/p/1')
+        item.stream = StreamingParse(TopParser, item)
+        feed(item.stream, PAGE)
+        item.raw_html, item.encoding = PAGE, 'utf-8'
+
+        assert item.stream.document(item) is None
+
+    def test_for_parser(self, monkeypatch):
+        """Test which parsers can be streamed"""
+        assert StreamingParse.for_parser(Parser) is None
+        assert StreamingParse.for_parser(ProductParser) is not None
+
+        monkeypatch.setattr(TopParser, 'STREAM_FIELDS', {"title": "#crumb a:last-child"})
+        with pytest.raises(ValueError):
+            StreamingParse.for_parser(TopParser)
+
+        monkeypatch.setattr(ProductParser, 'ENGINE', 'bs4')
+        assert StreamingParse.for_parser(ProductParser) is None
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderStreaming:
+    """Test cases for downloaders feeding bodies to a StreamingParse"""
+
+    def test_cancel_once_every_field_extracted(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test the download stops once every field is parsed"""
+        monkeypatch.setattr(downloader_class, 'streaming', StreamingParse.for_parser(ProductParser))
+        monkeypatch.setattr(downloader_class, 'stream_cancel', True)
+        local_site.route('/p/1', body=PAGE)
+        item = make_item(local_site.url('/p/1'))
+
+        results = list(downloader_class([item]).iter_results())
+
+        assert len(results) == 1
+        assert item.stream.cancelled
+        assert len(item.raw_html) < len(PAGE)
+        assert ProductParser(item).field('price') == 1999.0
+
+    def test_no_cancel_without_every_field(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test a page is read to its end, and parsed once, when not every field is streamed"""
+        monkeypatch.setattr(downloader_class, 'streaming', StreamingParse.for_parser(TopParser))
+        monkeypatch.setattr(downloader_class, 'stream_cancel', True)
+        local_site.route('/p/1', body=PAGE)
+        item = make_item(local_site.url('/p/1'))
+
+        results = list(downloader_class([item]).iter_results())
+
+        assert len(results) == 1
+        assert not item.stream.cancelled
+        assert item.raw_html == PAGE
+        parser = TopParser(item)
+        assert parser.doc.element is item.stream.root
+        assert parser.field('comments') == ["Great"]
@@ -0,0 +1,72 @@
+"""
+Tests for the iter_results()/aiter_results() streaming API
+"""
+import asyncio
+import time
+import pytest
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+from spider.downloader.response import Response
+
+
+DOWNLOADERS = [NormalDownloader, TyDownloader, EmDownloader]
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', DOWNLOADERS)
+class TestStreaming:
+    """Test cases shared by every downloader"""
+
+    def test_iter_results_yields_item_and_response(self, downloader_class, local_site, make_item):
+        """Test each successful download is yielded with its Response"""
+        local_site.route('/truncated', body=b"<html><body>cut off")
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(5)]
+        items.append(make_item(local_site.url('/truncated')))
+
+        results = list(downloader_class(items).iter_results())
+
+        assert {id(item) for item, _ in results} == {id(item) for item in items[:5]}
+        for item, response in results:
+            assert isinstance(response, Response)
+            assert response.status == 200
+            assert response.url == item.url
+            assert b"<title>Test</title>" in response.body
+            assert item.html is not None
+
+    def test_iter_results_pulls_items_lazily(self, downloader_class, local_site, make_item):
+        """Test a slow consumer holds back reads from the item iterable"""
+        pulled = []
+        items = (pulled.append(i) or make_item(local_site.url(f"/p{i}")) for i in range(200))
+
+        results = downloader_class(None).iter_results(items)
+        next(results)
+        time.sleep(0.2)
+
+        assert len(pulled) < 200
+        results.close()
+
+    def test_early_break_stops_downloading(self, downloader_class, local_site, make_item):
+        """Test abandoning the iterator stops further requests"""
+        items = [make_item(local_site.url(f"/p{i}")) for i in range(200)]
+
+        for _ in downloader_class(items).iter_results():
+            break
+        time.sleep(0.1)
+
+        assert len(local_site.requests) < 200
+
+    def test_aiter_results_with_async_items(self, downloader_class, local_site, make_item):
+        """Test aiter_results accepts an async iterable of items"""
+        async def items():
+            for i in range(5):
+                await asyncio.sleep(0)
+                yield make_item(local_site.url(f"/p{i}"))
+
+        async def collect():
+            return [item.url async for item, response in downloader_class(None).aiter_results(items())]
+
+        urls = asyncio.run(collect())
+
+        assert sorted(urls) == sorted(local_site.url(f"/p{i}") for i in range(5))
@@ -0,0 +1,122 @@
+"""
+Tests for per-request timing histograms
+"""
+import pytest
+from spider.downloader.timing import Histogram, RequestTimer, Timings
+from spider.downloader.callback_stage import CallbackStage
+from spider.downloader.normal_downloader import NormalDownloader
+from spider.downloader.ty_downloader import TyDownloader
+from spider.downloader.em_downloader import EmDownloader
+
+
+PAGE = b"<html><head><title>Timed</title></head><body>Timed</body></html>"
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestHistogram:
+    """Test cases for the log-linear histogram"""
+
+    def test_percentiles_within_one_percent(self):
+        """Test percentiles over a wide range are within the bucket precision"""
+        histogram = Histogram()
+        for micros in range(1, 1000001, 7):
+            histogram.record(micros / 1000000)
+
+        for percentile in (50, 90, 99, 99.9):
+            expected = percentile / 100
+            assert histogram.percentile(percentile) == pytest.approx(expected, rel=0.01)
+        assert histogram.percentile(100) == histogram.max
+        assert histogram.count == len(range(1, 1000001, 7))
+
+    def test_small_values_exact(self):
+        """Test durations below the sub-bucket range are counted exactly"""
+        histogram = Histogram()
+        for micros in (3, 5, 200):
+            histogram.record(micros / 1000000)
+
+        assert histogram.percentile(50) == 5 / 1000000
+        assert histogram.percentile(100) == 200 / 1000000
+
+    def test_empty_and_merge(self):
+        """Test an empty histogram has no percentiles and merging adds samples"""
+        first, second = Histogram(), Histogram()
+        assert first.percentile(50) is None
+        first.record(0.001)
+        second.record(0.5)
+
+        first.merge(second)
+
+        assert first.count == 2
+        assert first.max == 0.5
+        assert first.percentile(100) == 0.5
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestTimings:
+    """Test cases for the (site, stage, phase) registry"""
+
+    def test_percentiles_keyed_by_site_stage_phase(self, make_item):
+        """Test phases are reported apart per site and item class"""
+        timings = Timings()
+        timings.record('tmall', 'Page', 'ttfb', 0.1)
+        timings.record_item(make_item('http://a', kind='gome'), 'decode', 0.002)
+
+        stats = timings.percentiles()
+
+        assert set(stats) == {('tmall', 'Page', 'ttfb'), ('gome', 'Item', 'decode')}
+        assert stats[('tmall', 'Page', 'ttfb')]['count'] == 1
+        assert stats[('tmall', 'Page', 'ttfb')]['p99'] == pytest.approx(0.1, rel=0.01)
+        assert "tmall" in timings.summary() and "p99 ms" in timings.summary()
+
+        timings.reset()
+        assert timings.summary() == ''
+
+    def test_request_phases(self):
+        """Test time to first byte excludes the DNS and connect time"""
+        timer = RequestTimer()
+        timer.add('dns', 0.01)
+        timer.add('connect', 0.02)
+        timer.first_byte = timer.started + 0.1
+        timer.finished = timer.started + 0.4
+
+        durations = timer.durations()
+
+        assert durations['ttfb'] == pytest.approx(0.07)
+        assert durations['transfer'] == pytest.approx(0.3)
+
+    def test_callback_stage_records_callbacks(self, make_item):
+        """Test callbacks are timed, also when they raise"""
+        timings = Timings()
+
+        def callback(item):
+            raise ValueError("parse error")
+
+        with CallbackStage(callback, workers=1, timings=timings) as stage:
+            stage.put(make_item('http://a'))
+
+        assert timings.histogram('dangdang', 'Item', 'callback').count == 1
+
+
+@pytest.mark.integration
+@pytest.mark.downloader
+@pytest.mark.parametrize('downloader_class', [NormalDownloader, TyDownloader, EmDownloader])
+class TestDownloaderTimings:
+    """Test cases for phases recorded by the downloaders"""
+
+    def test_phases_recorded(self, downloader_class, local_site, make_item, monkeypatch):
+        """Test a download records its connect, ttfb, transfer and decode time"""
+        timings = Timings()
+        monkeypatch.setattr(downloader_class, 'timings', timings)
+        for i in range(3):
+            local_site.route(f'/page{i}', body=PAGE)
+        items = [make_item(local_site.url(f'/page{i}')) for i in range(3)]
+
+        downloader_class(items).run(lambda item: None)
+
+        stats = timings.percentiles()
+        for phase in ('connect', 'ttfb', 'transfer', 'decode'):
+            assert ('dangdang', 'Item', phase) in stats
+        assert stats[('dangdang', 'Item', 'ttfb')]['count'] == 3
+        assert stats[('dangdang', 'Item', 'callback')]['count'] == 3
@@ -57,7 +57,7 @@ class TestTyDownloaderComprehensive:
         assert downloader.items[2].url == "http://example3.com"
         assert downloader.max_workers == 20
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_successful_download(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -66,6 +66,8 @@ class TestTyDownloaderComprehensive:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = True
@@ -80,18 +82,18 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify encoding was set
-        mock_set_utf8_html.assert_called_once_with(item, mock_response.content)
+        mock_set_utf8_html.assert_called_once_with(item, mock_response.content, {})
         
         # Verify HTML validation
-        mock_valid_html.assert_called_once_with(item.html)
+        mock_valid_html.assert_called_once_with(mock_response.content)
         
         # Verify callback was called
         callback.assert_called_once_with(item)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_invalid_html(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -100,6 +102,8 @@ class TestTyDownloaderComprehensive:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = False
@@ -114,18 +118,18 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
-        # Verify encoding was set
-        mock_set_utf8_html.assert_called_once_with(item, mock_response.content)
+        # Verify HTML validation ran on the raw body
+        mock_valid_html.assert_called_once_with(mock_response.content)
         
-        # Verify HTML validation
-        mock_valid_html.assert_called_once_with(item.html)
+        # Verify the truncated page was never decoded
+        mock_set_utf8_html.assert_not_called()
         
         # Verify callback was NOT called due to invalid HTML
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_connection_error(self, mock_get):
         """Test download with connection error"""
         # Setup mocks
@@ -141,12 +145,12 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was NOT called due to connection error
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_timeout_error(self, mock_get):
         """Test download with timeout error"""
         # Setup mocks
@@ -162,12 +166,12 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was NOT called due to timeout error
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_general_exception(self, mock_get):
         """Test download with general exception"""
         # Setup mocks
@@ -183,17 +187,19 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was NOT called due to general error
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_http_error_status(self, mock_get):
         """Test download with HTTP error status"""
         # Setup mocks
         mock_response = Mock()
         mock_response.status_code = 404
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = []
         mock_get.return_value = mock_response
         
         # Create test data
@@ -206,22 +212,24 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was NOT called due to HTTP error
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_multiple_items_mixed_results(self, mock_valid_html, mock_set_utf8_html, mock_get):
         """Test download with multiple items having mixed results"""
         # Setup mocks
-        def mock_get_side_effect(url, timeout):
+        def mock_get_side_effect(url, timeout, stream):
             if "success" in url:
                 response = Mock()
                 response.status_code = 200
                 response.content = b"<html>Valid content</html>"
+                response.headers = {}
+                response.iter_content.return_value = [response.content]
                 return response
             elif "timeout" in url:
                 raise requests.Timeout("Timeout")
@@ -230,6 +238,8 @@ class TestTyDownloaderComprehensive:
             else:
                 response = Mock()
                 response.status_code = 404
+                response.headers = {}
+                response.iter_content.return_value = []
                 return response
         
         mock_get.side_effect = mock_get_side_effect
@@ -258,7 +268,7 @@ class TestTyDownloaderComprehensive:
         callback.assert_any_call(items[0])  # success1
         callback.assert_any_call(items[2])  # success2
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_encoding_error(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -267,6 +277,8 @@ class TestTyDownloaderComprehensive:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.side_effect = Exception("Encoding error")
         mock_valid_html.return_value = True
@@ -281,10 +293,10 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify encoding was attempted
-        mock_set_utf8_html.assert_called_once_with(item, mock_response.content)
+        mock_set_utf8_html.assert_called_once_with(item, mock_response.content, {})
         
         # Verify callback was NOT called due to encoding error
         callback.assert_not_called()
@@ -411,7 +423,7 @@ class TestTyDownloaderComprehensive:
             assert hasattr(downloader, 'items')
             assert len(downloader.items) == 1
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_callback_exception(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -420,6 +432,8 @@ class TestTyDownloaderComprehensive:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = True
@@ -434,7 +448,7 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify requests.get was called
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
         
         # Verify callback was called despite exception
         callback.assert_called_once_with(item)
@@ -454,13 +468,13 @@ class TestTyDownloaderComprehensive:
         callback = Mock()
         
         # Should handle gracefully
-        with patch('requests.get', side_effect=AttributeError("'Mock' object has no attribute 'url'")):
+        with patch('requests.Session.get', side_effect=AttributeError("'Mock' object has no attribute 'url'")):
             downloader.run(callback)
         
         # Callback should not be called
         callback.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_with_different_timeout_values(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -469,6 +483,8 @@ class TestTyDownloaderComprehensive:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = True
@@ -483,7 +499,7 @@ class TestTyDownloaderComprehensive:
         downloader.run(callback)
         
         # Verify timeout is 30 seconds
-        mock_get.assert_called_once_with(item.url, timeout=30)
+        mock_get.assert_called_once_with(item.url, timeout=30, stream=True)
 
     def test_downloader_logger_initialization(self):
         """Test that logger is properly initialized"""
@@ -493,7 +509,7 @@ class TestTyDownloaderComprehensive:
         assert hasattr(downloader, 'logger')
         assert downloader.logger is not None
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_run_with_empty_items_list(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -539,7 +555,7 @@ class TestTyDownloaderComprehensive:
         # This is a design choice - max_workers is set during initialization
         assert downloader.max_workers == 20
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('spider.encoding.Encoding.set_utf8_html')
     @patch('spider.utils.utils.Utils.valid_html')
     def test_concurrent_execution(self, mock_valid_html, mock_set_utf8_html, mock_get):
@@ -548,6 +564,8 @@ class TestTyDownloaderComprehensive:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         mock_set_utf8_html.return_value = None
         mock_valid_html.return_value = True
@@ -577,13 +595,15 @@ class TestTyDownloaderComprehensive:
         # Test that items are stored correctly
         assert downloader.items == items
 
-    @patch('requests.get')
-    def test_fetch_method_return_values(self, mock_get):
-        """Test _fetch method return values"""
+    @patch('requests.Session.get')
+    def test_download_method_return_values(self, mock_get):
+        """Test _download method return values"""
         # Setup mocks
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.content = b"<html>Test content</html>"
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [mock_response.content]
         mock_get.return_value = mock_response
         
         # Create test data
@@ -594,17 +614,19 @@ class TestTyDownloaderComprehensive:
         # Test successful fetch
         with patch('spider.encoding.Encoding.set_utf8_html'), \
              patch('spider.utils.utils.Utils.valid_html', return_value=True):
-            result = downloader._fetch(item)
-            assert result is True
+            result = downloader._download(item)
+            assert result is not None
         
         # Test failed fetch due to invalid HTML
         with patch('spider.encoding.Encoding.set_utf8_html'), \
              patch('spider.utils.utils.Utils.valid_html', return_value=False):
-            result = downloader._fetch(item)
-            assert result is False
+            result = downloader._download(item)
+            assert result is None
         
         # Test failed fetch due to HTTP error
         mock_response.status_code = 404
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = []
         with patch('spider.encoding.Encoding.set_utf8_html'):
-            result = downloader._fetch(item)
-            assert result is False
+            result = downloader._download(item)
+            assert result is None
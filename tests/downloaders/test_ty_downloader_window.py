@@ -0,0 +1,89 @@
+"""
+Tests for TyDownloader sliding-window submission
+"""
+import pytest
+import mongomock
+from unittest.mock import Mock, patch
+from mongoengine import connect, disconnect
+from spider.models.product_url import ProductUrl
+from spider.downloader.ty_downloader import TyDownloader
+
+
+@pytest.mark.unit
+@pytest.mark.downloader
+class TestTyDownloaderWindow:
+    """Test cases for the bounded in-flight window"""
+
+    def test_window_default(self):
+        """Test window defaults to twice the worker count"""
+        assert TyDownloader([]).window == 40
+
+    @patch.object(TyDownloader, '_download', return_value=Mock())
+    def test_in_flight_items_bounded_by_window(self, mock_download):
+        """Test items are pulled from the iterable only as futures complete"""
+        pulled = []
+        handled = []
+        outstanding = []
+        downloader = TyDownloader(None)
+        downloader.callback_workers = 0
+        downloader.items = (pulled.append(i) or Mock(url=f"http://test.com/{i}", kind="dangdang")
+                            for i in range(1000))
+
+        def callback(item):
+            handled.append(item)
+            outstanding.append(len(pulled) - len(handled))
+
+        downloader.run(callback)
+
+        # Never more than `window` items pulled but not yet handled
+        assert max(outstanding) < downloader.window
+        assert len(pulled) == 1000
+        assert len(handled) == 1000
+
+    @patch.object(TyDownloader, '_download', return_value=Mock())
+    def test_first_callback_before_all_items_pulled(self, mock_download):
+        """Test callbacks start before the whole iterable has been consumed"""
+        pulled = []
+        seen_at_first_callback = []
+        downloader = TyDownloader(None)
+        downloader.items = (pulled.append(i) or Mock(url=f"http://test.com/{i}", kind="dangdang")
+                            for i in range(500))
+
+        def callback(item):
+            if not seen_at_first_callback:
+                seen_at_first_callback.append(len(pulled))
+
+        downloader.run(callback)
+
+        assert seen_at_first_callback[0] <= downloader.window
+        assert mock_download.call_count == 500
+
+    @patch.object(TyDownloader, '_download', return_value=None)
+    def test_failed_items_release_window(self, mock_download):
+        """Test failed downloads free their slot for the next item"""
+        callback = Mock()
+        downloader = TyDownloader([Mock(url=f"http://test.com/{i}", kind="dangdang") for i in range(100)])
+
+        downloader.run(callback)
+
+        assert mock_download.call_count == 100
+        callback.assert_not_called()
+
+    @patch.object(TyDownloader, '_download', return_value=Mock())
+    def test_selected_cursor_is_streamed(self, mock_download):
+        """Test the items a stage selects are read from a cursor that keeps no documents"""
+        connect('testdb', host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+        try:
+            for i in range(60):
+                ProductUrl(url=f"http://test.com/{i}", kind='dangdang', completed=i % 2 == 0).save()
+            items = TyDownloader.select(ProductUrl.from_kind('dangdang'), 25)
+            handled = []
+
+            TyDownloader(items).run(handled.append)
+
+            assert len(handled) == 25
+            assert not items._result_cache     # Read as a cursor, nothing kept
+            assert not any(item.completed for item in handled)
+        finally:
+            ProductUrl.drop_collection()
+            disconnect()
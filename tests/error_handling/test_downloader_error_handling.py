@@ -16,7 +16,7 @@ class TestDownloaderErrorHandling:
         downloader = NormalDownloader([])
         mock_callback = Mock()
         
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_get.side_effect = ConnectionError("Connection failed")
             downloader.run(mock_callback)
             # Should not call callback on error
@@ -29,7 +29,7 @@ class TestDownloaderErrorHandling:
         downloader = NormalDownloader([])
         mock_callback = Mock()
         
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_get.side_effect = TimeoutError("Request timeout")
             downloader.run(mock_callback)
             mock_callback.assert_not_called()
@@ -41,7 +41,7 @@ class TestDownloaderErrorHandling:
         downloader = NormalDownloader([])
         mock_callback = Mock()
         
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_response = Mock()
             mock_response.status_code = 500
             mock_response.raise_for_status.side_effect = Exception("HTTP 500")
@@ -57,7 +57,7 @@ class TestDownloaderErrorHandling:
         downloader = NormalDownloader([])
         mock_callback = Mock()
         
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_get.side_effect = Exception("General error")
             downloader.run(mock_callback)
             mock_callback.assert_not_called()
@@ -69,7 +69,7 @@ class TestDownloaderErrorHandling:
         downloader = NormalDownloader([])
         mock_callback = Mock()
         
-        with patch('requests.get') as mock_get:
+        with patch('requests.Session.get') as mock_get:
             mock_get.side_effect = SystemExit("System exit")
             # SystemExit should be caught by the general exception handler
             downloader.run(mock_callback)
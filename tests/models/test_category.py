@@ -3,7 +3,8 @@ Comprehensive unit tests for spider.models.category
 """
 import pytest
 from datetime import datetime
-from mongoengine import connect, disconnect
+from mongoengine import connect, disconnect, QuerySet
+from mongoengine.errors import NotUniqueError
 from spider.models.category import Category
 
 
@@ -209,3 +210,37 @@ class TestCategoryModel:
 
         assert cat.parent is None
         assert cat.parent_id is None
+
+    def test_category_find_or_create(self):
+        """Test Category find_or_create creates a category once and then finds it"""
+        cat = Category.find_or_create("http://test.com", "dangdang", name="Test")
+        assert cat.id is not None
+        assert cat.name == "Test"
+        assert cat.completed is False
+        assert cat.retry_time == 0
+
+        again = Category.find_or_create("http://test.com", "dangdang", name="Renamed")
+        assert again.id == cat.id
+        assert again.name == "Test"
+        assert Category.objects(url="http://test.com").count() == 1
+
+    def test_category_find_or_create_other_kind(self):
+        """Test Category find_or_create finds a URL saved under another kind instead of failing"""
+        cat = Category.find_or_create("http://test.com", "dangdang", name="Test")
+
+        again = Category.find_or_create("http://test.com", "jingdong", name="Other")
+        assert again.id == cat.id
+        assert again.kind == "dangdang"
+        assert Category.objects(url="http://test.com").count() == 1
+
+    def test_category_find_or_create_lost_race(self, monkeypatch):
+        """Test Category find_or_create reads the category another worker created when its upsert collides"""
+        cat = Category(url="http://test.com", name="Test", kind="dangdang")
+        cat.save()
+
+        def collide(self, *args, **kwargs):
+            raise NotUniqueError("E11000 duplicate key error")
+
+        monkeypatch.setattr(QuerySet, 'modify', collide)
+        again = Category.find_or_create("http://test.com", "dangdang", name="Test")
+        assert again.id == cat.id
@@ -206,3 +206,129 @@ class TestEncodingComprehensive:
         result = Encoding.set_utf8_html(item, b"test string")
         assert result is item
         assert item.html is not None
+
+
+@pytest.mark.unit
+class TestCharsetDetection:
+    """Tests for header/meta charset hints, guessing and per-host learning"""
+
+    PAGE = "<html><head><title>中文</title></head><body>价格 99元</body></html>"
+
+    class MockItem:
+        def __init__(self, kind, url="http://item.example.com/1"):
+            self.kind = kind
+            self.url = url
+            self.html = None
+
+    @pytest.fixture(autouse=True)
+    def hosts(self, monkeypatch):
+        """Start every test without learned charsets"""
+        from spider.encoding import Encoding
+        monkeypatch.setattr(Encoding, 'Hosts', {})
+        return Encoding.Hosts
+
+    def test_header_charset_wins_over_map(self):
+        """Test the Content-Type charset is used on a UTF-8 site"""
+        from spider.encoding import Encoding
+        item = Encoding.set_utf8_html(self.MockItem("suning"), self.PAGE.encode('gbk'),
+                                      {'Content-Type': 'text/html; charset=GBK'})
+        assert item.html == self.PAGE
+        assert item.encoding == 'gb18030'
+
+    def test_meta_charset_sniffed(self):
+        """Test a <meta charset> in the head is honoured without headers"""
+        from spider.encoding import Encoding
+        page = self.PAGE.replace("<head>", '<head><meta http-equiv="Content-Type" content="text/html; charset=gb2312">')
+        item = Encoding.set_utf8_html(self.MockItem("gome"), page.encode('gb2312'))
+        assert item.html == page
+
+    def test_utf8_page_on_gb18030_site(self):
+        """Test an undeclared UTF-8 page of a GB18030 site is not garbled"""
+        from spider.encoding import Encoding
+        item = Encoding.set_utf8_html(self.MockItem("dangdang"), self.PAGE.encode('utf-8'))
+        assert item.html == self.PAGE
+        assert item.encoding == 'utf-8'
+
+    def test_ascii_fast_path(self):
+        """Test pure ASCII bodies decode without guessing"""
+        from spider.encoding import Encoding
+        item = Encoding.set_utf8_html(self.MockItem("dangdang"), b"<html>plain</html>")
+        assert item.html == "<html>plain</html>"
+
+    def test_host_charset_learned(self, hosts):
+        """Test a host's declared charset is used for its undeclared pages"""
+        from spider.encoding import Encoding
+        Encoding.set_utf8_html(self.MockItem("gome"), self.PAGE.encode('big5', errors='ignore'),
+                               {'Content-Type': 'text/html; charset=big5'})
+        assert hosts == {'item.example.com': 'big5'}
+
+        page = "<html><body>繁體</body></html>"
+        item = Encoding.set_utf8_html(self.MockItem("gome"), page.encode('big5'))
+        assert item.html == page
+
+    def test_undefined_bytes_replaced_while_decoding(self):
+        """Test invalid byte sequences become '?' in the decoded page"""
+        from spider.encoding import Encoding
+        body = self.PAGE.encode('gb18030').replace("价".encode('gb18030'), b"\x81")
+        item = Encoding.set_utf8_html(self.MockItem("dangdang"), body)
+        assert '\ufffd' not in item.html
+        assert "<title>中文</title>" in item.html
+        assert "?" in item.html
+
+
+@pytest.mark.unit
+class TestRawMarkup:
+    """Tests for parsing raw bytes with their charset and lazy html"""
+
+    LISTING = ('<html><head><meta charset="gbk"></head><body><div class="mode_goods">'
+               '<div class="name"><a href="http://product.dangdang.com/1.html">商品1</a></div>'
+               '</div></body></html>')
+
+    def test_markup_is_raw_bytes(self):
+        """Test downloaded pages are handed to the parser undecoded"""
+        from spider.encoding import Encoding
+        from spider.models.page import Page
+        page = Encoding.set_utf8_html(Page(url="http://category.dangdang.com/1", kind="dangdang"),
+                                      self.LISTING.encode('gbk'))
+        assert Encoding.markup(page) == (self.LISTING.encode('gbk'), 'gb18030')
+        assert page._html is None
+
+    def test_utf8_markup_not_checked(self):
+        """Test UTF-8 pages are handed over without scanning them for invalid bytes"""
+        from spider.encoding import Encoding
+        from spider.models.page import Page
+        body = self.LISTING.replace('gbk', 'utf-8').encode('utf-8')
+        page = Encoding.set_utf8_html(Page(url="http://category.dangdang.com/1", kind="dangdang"), body)
+        with patch.object(Encoding, 'decodes_cleanly') as decodes_cleanly:
+            assert Encoding.markup(page) == (body, 'utf-8')
+        decodes_cleanly.assert_not_called()
+
+    def test_html_decoded_on_first_access(self):
+        """Test a model decodes raw_html only when its html is read"""
+        from spider.encoding import Encoding
+        from spider.models.product_url import ProductUrl
+        product = Encoding.set_utf8_html(ProductUrl(url="http://product.dangdang.com/1", kind="dangdang"),
+                                         self.LISTING.encode('gbk'))
+        assert product.html == self.LISTING
+        assert product._html == self.LISTING
+
+    def test_broken_bytes_fall_back_to_html(self):
+        """Test pages libxml2 would abort on are parsed from the decoded string"""
+        from spider.encoding import Encoding
+        body = self.LISTING.encode('gbk').replace("商".encode('gbk'), b"\x80")
+        item = Mock(spec=['kind', 'url', 'html', 'raw_html', 'encoding'],
+                    kind="dangdang", url="http://category.dangdang.com/1", html=None)
+        Encoding.set_utf8_html(item, body)
+        markup, encoding = Encoding.markup(item)
+        assert encoding is None
+        assert markup == item.html
+
+    def test_digger_parses_raw_bytes(self):
+        """Test a digger finds links in an undecoded GBK page"""
+        from spider.encoding import Encoding
+        from spider.digger.dangdang_digger import DangdangDigger
+        from spider.models.page import Page
+        page = Encoding.set_utf8_html(Page(url="http://category.dangdang.com/1", kind="dangdang"),
+                                      self.LISTING.encode('gbk'))
+        assert DangdangDigger(page).product_list() == ["http://product.dangdang.com/1.html"]
+        assert page._html is None
@@ -0,0 +1,166 @@
+"""
+Tests for the HTML engines behind parser, digger and paginater documents
+"""
+import pytest
+from types import SimpleNamespace
+from bs4 import BeautifulSoup
+from spider.engine import HtmlEngine, LxmlDocument, CssXPath, UnsupportedSelector
+from spider.parser.jingdong_parser import JingdongParser
+from spider.digger.jingdong_digger import JingdongDigger
+
+
+PAGE = """<html><head><meta charset="gbk"><title>Test</title></head><body>
+<div class="crumb"><a href="/products/1.html">电脑</a> &gt; <a href="http://x.com/abc.html">笔记本</a></div>
+<div id="name"><h1> ThinkPad <span>X1</span> </h1></div>
+<strong class="price"><img src="/price.png"></strong>
+<div id="stocktext">现货，发货<!-- cached --><script>var stock = 1;</script></div>
+<ul id="summary"><li><span>商品编号：123</span></li><li><span>other</span></li></ul>
+<div id="star1"><div class=" star  sa4 ">*</div></div>
+<div id="plist"><ul class="list-h">
+<li><div class="p-img"><a href="/p1.html">1</a></div></li>
+<li><div class="p-img"><a href="/p2.html">2</a></div></li>
+<li><div class="p-img other"><a>3</a></div></li>
+</ul></div>
+</body></html>"""
+
+
+def page_item(page=PAGE):
+    raw_html = page.encode('gbk')
+    return SimpleNamespace(url='http://jd.test/1', kind='jingdong', html=page,
+                           raw_html=raw_html, encoding='gbk')
+
+
+SELECTORS = [
+    "#name h1", "div#name > h1", ".crumb a", "a[href^=\"products\"]", "a[href^='/products']",
+    "a[href$='.html']", "a[href*=x]", "div[class~=sa4]", "li:first-child span", "li:last-child span",
+    "#plist li:nth-child(2) a", "ul#summary li + li span", "#summary li ~ li", "div.p-img.other a",
+    "img, h1", "*", "div[id^=star] div:first-child", "[class|=p]", "li:only-child"
+]
+
+
+@pytest.mark.unit
+@pytest.mark.parser
+class TestLxmlDocument:
+    """Test cases for the lxml engine's BeautifulSoup-compatible document"""
+
+    @pytest.mark.parametrize('selector', SELECTORS)
+    def test_select_matches_beautifulsoup(self, selector):
+        """Test selectors match the same elements, in the same order, as BeautifulSoup"""
+        soup = BeautifulSoup(PAGE, 'lxml')
+        doc = LxmlDocument(PAGE)
+
+        assert [str(tag.name) + tag.get_text() for tag in doc.select(selector)] == \
+            [tag.name + tag.get_text() for tag in soup.select(selector)]
+
+    def test_select_from_element_sees_outer_ancestors(self):
+        """Test a selector from an element may match through ancestors outside it"""
+        soup = BeautifulSoup(PAGE, 'lxml')
+        doc = LxmlDocument(PAGE)
+
+        element = doc.select_one("ul.list-h")
+        assert [a.get('href') for a in element.select("#plist .p-img a")] == \
+            [a.get('href') for a in soup.select_one("ul.list-h").select("#plist .p-img a")]
+        assert element.select_one("li:first-child a").get('href') == '/p1.html'
+
+    def test_element_interface(self):
+        """Test text, attributes and names read as with BeautifulSoup"""
+        soup = BeautifulSoup(PAGE, 'lxml')
+        doc = LxmlDocument(PAGE)
+
+        for selector in ("#stocktext", "#name h1", "body"):
+            assert doc.select_one(selector).get_text() == soup.select_one(selector).get_text()
+            assert doc.select_one(selector).get_text('|', strip=True) == \
+                soup.select_one(selector).get_text('|', strip=True)
+        star = doc.select_one("#star1 div")
+        assert star.get('class') == ['star', 'sa4']
+        assert star.get('title', 'none') == 'none'
+        assert star.name == 'div'
+        assert star.text == "*"
+        assert doc.select_one("#missing") is None
+        assert str(doc.select_one("#star1")) == str(soup.select_one("#star1"))
+
+    def test_decode_contents_matches_beautifulsoup(self):
+        """Test the inner markup of an element serializes as BeautifulSoup's"""
+        soup = BeautifulSoup(PAGE, 'lxml')
+        doc = LxmlDocument(PAGE)
+
+        for selector in ("#summary", "#name h1", "#stocktext", "ul.list-h li"):
+            assert doc.select_one(selector).decode_contents() == soup.select_one(selector).decode_contents()
+        assert LxmlDocument("<p>a &amp; b<br>c</p>").select_one("p").decode_contents() == "a &amp; b<br/>c"
+
+    def test_str_matches_beautifulsoup(self):
+        """Test elements serialize as BeautifulSoup's, void elements included"""
+        page = ("<table class='Ptable' id=\"t\"><tr><th>品牌</th><td title='say \"hi\"'>华为<br>Mate &amp; "
+                "<img src=a.png></td></tr></table><div id='s'><!-- x --><script>a < b</script><hr></div>")
+        pages = ((PAGE, ("#stocktext", ".crumb", "strong.price", "body")), (page, (".Ptable", "#s")))
+        for markup, selectors in pages:
+            soup = BeautifulSoup(markup, 'lxml')
+            doc = LxmlDocument(markup)
+            for selector in selectors:
+                assert str(doc.select_one(selector)) == str(soup.select_one(selector))
+        doc = LxmlDocument(page)
+        assert str(doc.select_one("td")) == '<td title=\'say "hi"\'>华为<br/>Mate &amp; <img src="a.png"/></td>'
+        assert str(LxmlDocument("<input checked>").select_one("input")) == '<input checked="checked"/>'
+
+    def test_unsupported_calls_raise(self):
+        """Test CSS and BeautifulSoup calls outside the supported subset raise instead of falling back"""
+        doc = LxmlDocument(PAGE)
+
+        with pytest.raises(UnsupportedSelector):
+            doc.select("a:not([href$='.html'])")
+        with pytest.raises(UnsupportedSelector):
+            doc.select_one("#summary").select_one("span:hover")
+        with pytest.raises(AttributeError):
+            doc.select_one("#summary").find('span')
+        with pytest.raises(AttributeError):
+            doc.find('title')
+
+    def test_bytes_and_empty_markup(self):
+        """Test pages are decoded with their charset and empty pages parse"""
+        doc = LxmlDocument(PAGE.encode('gbk'), 'gbk')
+
+        assert doc.select_one("#name span").get_text() == "X1"
+        assert LxmlDocument("").select("div") == []
+
+    def test_unsupported_selector(self):
+        """Test CSS outside the translated subset is reported"""
+        with pytest.raises(UnsupportedSelector):
+            CssXPath.translate("a:hover")
+        with pytest.raises(UnsupportedSelector):
+            CssXPath.translate("")
+
+
+@pytest.mark.unit
+@pytest.mark.parser
+class TestHtmlEngine:
+    """Test cases for selecting the engine"""
+
+    def test_site_engine_and_run_default(self, monkeypatch):
+        """Test a site's ENGINE wins over the run-wide default"""
+        monkeypatch.setattr(HtmlEngine, 'default', 'bs4')
+        assert isinstance(JingdongParser(page_item()).doc, BeautifulSoup)
+
+        HtmlEngine.configure({'engine': 'lxml'})
+        assert isinstance(JingdongParser(page_item()).doc, LxmlDocument)
+
+        monkeypatch.setattr(JingdongParser, 'ENGINE', 'bs4')
+        assert isinstance(JingdongParser(page_item()).doc, BeautifulSoup)
+
+    def test_unknown_engine(self):
+        """Test an unknown engine name is rejected"""
+        with pytest.raises(ValueError):
+            HtmlEngine.parse(page_item(), 'html5')
+
+    def test_site_results_match(self):
+        """Test a site parser and digger give the same results with either engine"""
+        results = {}
+        for engine in HtmlEngine.ENGINES:
+            parser = JingdongParser(page_item(), engine=engine)
+            results[engine] = (
+                parser.title(), parser.price_url(), parser.stock(), parser.product_code(),
+                parser.score(), parser.belongs_to_categories(),
+                JingdongDigger(page_item(), engine=engine).product_list()
+            )
+
+        assert results['lxml'] == results['bs4']
+        assert results['lxml'][0] == "ThinkPadX1"
@@ -68,20 +68,12 @@ class TestMissingCoverageSimple:
         """Test Utils.decompress_gzip with string input"""
         from spider.utils.utils import Utils
         
-        # Test with string input (should be encoded to bytes)
-        test_string = "test string"
-        
-        # Mock gzip.GzipFile to return decompressed data
-        with patch('spider.utils.utils.gzip.GzipFile') as mock_gzip:
-            mock_gz_file = Mock()
-            mock_gz_file.read.return_value = b'decompressed data'
-            mock_gzip.return_value.__enter__.return_value = mock_gz_file
-            mock_gzip.return_value.__exit__.return_value = None
-            
-            result = Utils.decompress_gzip(test_string)
-            
-            # Verify that the string was encoded to bytes
-            assert result == 'decompressed data'
+        # A str payload is refused: only the raw response bytes can be decompressed
+        import gzip
+        test_string = gzip.compress('测试'.encode('gbk')).decode('latin-1')
+
+        with pytest.raises(TypeError):
+            Utils.decompress_gzip(test_string)
 
     def test_utils_load_mongo_with_credentials(self):
         """Test Utils.load_mongo with username and password"""
@@ -995,11 +995,11 @@ class TestUtils:
         original_text = "Hello, World!"
         compressed_data = gzip.compress(original_text.encode('utf-8'))
         decompressed = utils.decompress_gzip(compressed_data)
-        assert decompressed == original_text
+        assert decompressed == original_text.encode('utf-8')
         
-        # Test with string input (encode back to bytes)
-        decompressed = utils.decompress_gzip(compressed_data.decode('latin-1').encode('latin-1'))
-        assert decompressed == original_text
+        # A str has lost its original bytes and is refused
+        with pytest.raises(TypeError):
+            utils.decompress_gzip(compressed_data.decode('latin-1'))
 
     def test_utils_string_representation(self):
         """Test Utils string representation"""
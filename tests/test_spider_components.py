@@ -115,6 +115,21 @@ class TestSpiderComponents:
         is_valid = utils.valid_html(None)
         assert is_valid is False
 
+    def test_utils_valid_html_raw_bytes(self):
+        """Test Utils.valid_html checks the tail of undecoded bodies"""
+        utils = Utils()
+
+        # Trailing whitespace and comments (also multi-line) are skipped
+        assert utils.valid_html("<html><body>中文</body></HTML>\n<!-- cache\nhit -->  \n".encode('gbk')) is True
+        assert utils.valid_html(b"<html></html>" + b" " * 5000) is True
+        assert utils.valid_html("<html></html>".encode('utf-16')) is True
+
+        # Truncated or trailing content is rejected
+        assert utils.valid_html(b"<html><body>" + b"x" * 5000) is False
+        assert utils.valid_html(b"<html></html><div>") is False
+        assert utils.valid_html(b"<!-- </html> -->") is False
+        assert utils.valid_html(b"") is False
+
     def test_utils_query2hash(self):
         """Test Utils.query2hash method"""
         utils = Utils()
@@ -163,11 +178,11 @@ class TestSpiderComponents:
         original_text = "Hello, World!"
         compressed_data = gzip.compress(original_text.encode('utf-8'))
         decompressed = utils.decompress_gzip(compressed_data)
-        assert decompressed == original_text
+        assert decompressed == original_text.encode('utf-8')
         
-        # Test with string input (encode back to bytes)
-        decompressed = utils.decompress_gzip(compressed_data.decode('latin-1').encode('latin-1'))
-        assert decompressed == original_text
+        # A str has lost its original bytes and is refused
+        with pytest.raises(TypeError):
+            utils.decompress_gzip(compressed_data.decode('latin-1'))
 
     def test_digger_with_mock_page(self):
         """Test Digger with mock page data"""